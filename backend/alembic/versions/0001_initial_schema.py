@@ -0,0 +1,159 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 09:00:00.000000
+
+Tables as created by Base.metadata.create_all before migrations were
+introduced. Databases created that way should be marked with
+`alembic stamp 0001` and then upgraded.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('hashed_password', sa.String(), nullable=False),
+        sa.Column('role', sa.Enum('ADMIN', 'PHARMACIST', 'STAFF', 'CUSTOMER', name='userrole'), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('avatar_url', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_users_id', 'users', ['id'])
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+
+    op.create_table(
+        'medicines',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('stock', sa.Integer(), nullable=True),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('manufacturer', sa.String(), nullable=False),
+        sa.Column('dosage', sa.String(), nullable=True),
+        sa.Column('prescription_required', sa.Boolean(), nullable=True),
+        sa.Column('min_stock_level', sa.Integer(), nullable=True),
+        sa.Column('max_stock_level', sa.Integer(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_medicines_id', 'medicines', ['id'])
+    op.create_index('ix_medicines_name', 'medicines', ['name'])
+
+    op.create_table(
+        'orders',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('order_number', sa.String(), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'CONFIRMED', 'PROCESSING', 'SHIPPED', 'DELIVERED', 'CANCELLED', name='orderstatus'), nullable=True),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.Column('shipping_address', sa.String(), nullable=False),
+        sa.Column('notes', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['customer_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_orders_id', 'orders', ['id'])
+    op.create_index('ix_orders_order_number', 'orders', ['order_number'], unique=True)
+    op.create_index('ix_orders_created_at', 'orders', ['created_at'])
+    op.create_index('ix_orders_customer_id_created_at', 'orders', ['customer_id', 'created_at'])
+    op.create_index('ix_orders_status_created_at', 'orders', ['status', 'created_at'])
+
+    op.create_table(
+        'order_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('medicine_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit_price', sa.Float(), nullable=False),
+        sa.Column('total_price', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['medicine_id'], ['medicines.id']),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_order_items_id', 'order_items', ['id'])
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'])
+    op.create_index('ix_order_items_medicine_id_order_id', 'order_items', ['medicine_id', 'order_id'])
+
+    op.create_table(
+        'activities',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('medicine_id', sa.Integer(), nullable=True),
+        sa.Column('activity_type', sa.String(), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('extra_data', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['medicine_id'], ['medicines.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_activities_id', 'activities', ['id'])
+
+    op.create_table(
+        'sales',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sale_number', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('customer_name', sa.String(), nullable=True),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.Column('payment_method', sa.String(), nullable=False),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_sales_id', 'sales', ['id'])
+    op.create_index('ix_sales_sale_number', 'sales', ['sale_number'], unique=True)
+    op.create_index('ix_sales_created_at', 'sales', ['created_at'])
+    op.create_index('ix_sales_user_id_created_at', 'sales', ['user_id', 'created_at'])
+    op.create_index('ix_sales_payment_method_created_at', 'sales', ['payment_method', 'created_at'])
+    opclass = ' text_pattern_ops' if op.get_bind().dialect.name == 'postgresql' else ''
+    op.create_index('ix_sales_customer_name_prefix', 'sales', [sa.text(f'lower(customer_name){opclass}')])
+
+    op.create_table(
+        'sale_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sale_id', sa.Integer(), nullable=False),
+        sa.Column('medicine_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit_price', sa.Float(), nullable=False),
+        sa.Column('total_price', sa.Float(), nullable=False),
+        sa.Column('discount', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['medicine_id'], ['medicines.id']),
+        sa.ForeignKeyConstraint(['sale_id'], ['sales.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_sale_items_id', 'sale_items', ['id'])
+    op.create_index('ix_sale_items_sale_id', 'sale_items', ['sale_id'])
+    op.create_index('ix_sale_items_medicine_id_sale_id', 'sale_items', ['medicine_id', 'sale_id'])
+
+
+def downgrade() -> None:
+    op.drop_table('sale_items')
+    op.drop_table('sales')
+    op.drop_table('activities')
+    op.drop_table('order_items')
+    op.drop_table('orders')
+    op.drop_table('medicines')
+    op.drop_table('users')
+    sa.Enum(name='orderstatus').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='userrole').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,46 @@
+"""Add created_at to sale and order items
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:10:00.000000
+
+Items carry their sale's/order's timestamp so they can be partitioned by
+month alongside it. Existing items are backfilled from their parent, and
+activities.created_at becomes NOT NULL (it is the partition key).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    for items, parents, key in (('sale_items', 'sales', 'sale_id'), ('order_items', 'orders', 'order_id')):
+        op.add_column(items, sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+        op.execute(
+            f"UPDATE {items} SET created_at = COALESCE("
+            f"(SELECT {parents}.created_at FROM {parents} WHERE {parents}.id = {items}.{key}), CURRENT_TIMESTAMP)"
+        )
+        with op.batch_alter_table(items) as batch:
+            batch.alter_column(
+                'created_at', existing_type=sa.DateTime(timezone=True),
+                nullable=False, server_default=sa.func.now(),
+            )
+
+    op.execute("UPDATE activities SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    with op.batch_alter_table('activities') as batch:
+        batch.alter_column('created_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('activities') as batch:
+        batch.alter_column('created_at', existing_type=sa.DateTime(timezone=True), nullable=True)
+    with op.batch_alter_table('order_items') as batch:
+        batch.drop_column('created_at')
+    with op.batch_alter_table('sale_items') as batch:
+        batch.drop_column('created_at')
@@ -0,0 +1,184 @@
+"""Partition history tables by month (optional, Postgres only)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 09:20:00.000000
+
+Converts activities, sales, sale_items, orders and order_items into tables
+range-partitioned on created_at, one partition per month plus a default
+partition, and copies the existing rows across. Only runs when enabled with
+DB_PARTITIONING=true or `alembic -x partitioning=true upgrade head`;
+otherwise the revision is recorded without changing anything. To partition
+a database that passed this revision unpartitioned, downgrade to 0002 and
+upgrade again with partitioning enabled.
+
+Postgres requires primary keys and unique constraints on a partitioned table
+to include the partition key, so:
+
+- primary keys become (id, created_at)
+- sale_number / order_number are unique together with created_at
+- items reference their sale/order through (sale_id, created_at) /
+  (order_id, created_at), since items share their parent's created_at
+"""
+from alembic import context, op
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.partitions import ensure_partitions, is_partitioned
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# (name, columns or expression, unique) per table. Indexes created on the
+# partitioned parent are inherited by every partition.
+PARTITIONED_INDEXES = {
+    'activities': [],
+    'sales': [
+        ('ix_sales_sale_number', 'sale_number, created_at', True),
+        ('ix_sales_created_at', 'created_at', False),
+        ('ix_sales_user_id_created_at', 'user_id, created_at', False),
+        ('ix_sales_payment_method_created_at', 'payment_method, created_at', False),
+        ('ix_sales_customer_name_prefix', 'lower(customer_name) text_pattern_ops', False),
+    ],
+    'sale_items': [
+        ('ix_sale_items_sale_id', 'sale_id', False),
+        ('ix_sale_items_medicine_id_sale_id', 'medicine_id, sale_id', False),
+    ],
+    'orders': [
+        ('ix_orders_order_number', 'order_number, created_at', True),
+        ('ix_orders_created_at', 'created_at', False),
+        ('ix_orders_customer_id_created_at', 'customer_id, created_at', False),
+        ('ix_orders_status_created_at', 'status, created_at', False),
+    ],
+    'order_items': [
+        ('ix_order_items_order_id', 'order_id', False),
+        ('ix_order_items_medicine_id_order_id', 'medicine_id, order_id', False),
+    ],
+}
+
+# The same tables as left by revision 0002
+PLAIN_INDEXES = {
+    'activities': [
+        ('ix_activities_id', 'id', False),
+    ],
+    'sales': [
+        ('ix_sales_id', 'id', False),
+        ('ix_sales_sale_number', 'sale_number', True),
+        ('ix_sales_created_at', 'created_at', False),
+        ('ix_sales_user_id_created_at', 'user_id, created_at', False),
+        ('ix_sales_payment_method_created_at', 'payment_method, created_at', False),
+        ('ix_sales_customer_name_prefix', 'lower(customer_name) text_pattern_ops', False),
+    ],
+    'sale_items': [
+        ('ix_sale_items_id', 'id', False),
+        ('ix_sale_items_sale_id', 'sale_id', False),
+        ('ix_sale_items_medicine_id_sale_id', 'medicine_id, sale_id', False),
+    ],
+    'orders': [
+        ('ix_orders_id', 'id', False),
+        ('ix_orders_order_number', 'order_number', True),
+        ('ix_orders_created_at', 'created_at', False),
+        ('ix_orders_customer_id_created_at', 'customer_id, created_at', False),
+        ('ix_orders_status_created_at', 'status, created_at', False),
+    ],
+    'order_items': [
+        ('ix_order_items_id', 'id', False),
+        ('ix_order_items_order_id', 'order_id', False),
+        ('ix_order_items_medicine_id_order_id', 'medicine_id, order_id', False),
+    ],
+}
+
+# (table, columns, referenced table and columns)
+PARTITIONED_FOREIGN_KEYS = [
+    ('activities', 'user_id', 'users (id)'),
+    ('activities', 'medicine_id', 'medicines (id)'),
+    ('sales', 'user_id', 'users (id)'),
+    ('sale_items', 'medicine_id', 'medicines (id)'),
+    ('sale_items', 'sale_id, created_at', 'sales (id, created_at)'),
+    ('orders', 'customer_id', 'users (id)'),
+    ('order_items', 'medicine_id', 'medicines (id)'),
+    ('order_items', 'order_id, created_at', 'orders (id, created_at)'),
+]
+
+PLAIN_FOREIGN_KEYS = [
+    ('activities', 'user_id', 'users (id)'),
+    ('activities', 'medicine_id', 'medicines (id)'),
+    ('sales', 'user_id', 'users (id)'),
+    ('sale_items', 'medicine_id', 'medicines (id)'),
+    ('sale_items', 'sale_id', 'sales (id)'),
+    ('orders', 'customer_id', 'users (id)'),
+    ('order_items', 'medicine_id', 'medicines (id)'),
+    ('order_items', 'order_id', 'orders (id)'),
+]
+
+# Parents before the items referencing them
+TABLES = ['activities', 'sales', 'sale_items', 'orders', 'order_items']
+
+
+def _enabled() -> bool:
+    option = context.get_x_argument(as_dictionary=True).get('partitioning')
+    enabled = settings.DB_PARTITIONING if option is None else option.lower() in ('1', 'true', 'yes', 'on')
+    return enabled and op.get_bind().dialect.name == 'postgresql'
+
+
+def _create_indexes(table: str, indexes: list) -> None:
+    for name, columns, unique in indexes:
+        op.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({columns})")
+
+
+def _add_foreign_keys(foreign_keys: list) -> None:
+    for table, columns, target in foreign_keys:
+        name = f"{table}_{columns.split(',')[0]}_fkey"
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({columns}) REFERENCES {target}")
+
+
+def _rebuild(table: str, partitioned: bool) -> None:
+    """Recreate `table` (partitioned or plain) with its current rows and id sequence"""
+    conn = op.get_bind()
+    old = f"{table}_old"
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+
+    if partitioned:
+        op.execute(f"UPDATE {old} SET created_at = now() WHERE created_at IS NULL")
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        first = conn.execute(text(f"SELECT min(created_at) FROM {old}")).scalar()
+        ensure_partitions(conn, table, settings.PARTITION_MONTHS_AHEAD, first_month=first.date() if first else None)
+    else:
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)")
+
+    op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+
+    # Keep the id sequence: detach it from the old table before dropping that
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": old}).scalar()
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    op.execute(f"DROP TABLE {old} CASCADE")
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+
+    if partitioned:
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)")
+        _create_indexes(table, PARTITIONED_INDEXES[table])
+    else:
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+        _create_indexes(table, PLAIN_INDEXES[table])
+
+
+def upgrade() -> None:
+    if not _enabled():
+        return
+    for table in TABLES:
+        _rebuild(table, partitioned=True)
+    _add_foreign_keys(PARTITIONED_FOREIGN_KEYS)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql' or not is_partitioned(conn, 'sales'):
+        return
+    for table in reversed(TABLES):
+        _rebuild(table, partitioned=False)
+    _add_foreign_keys(PLAIN_FOREIGN_KEYS)
@@ -0,0 +1,36 @@
+"""Indexes for the activity feed
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 10:00:00.000000
+
+GET /activities/ pages newest first with a (created_at, id) keyset, per
+user, per medicine, per type or across everything. Each index ends in
+(created_at, id) so a page is one index range scan whatever the table size.
+Works on both the plain and the partitioned layout.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_activities_created_at_id', ['created_at', 'id']),
+    ('ix_activities_user_id_created_at', ['user_id', 'created_at', 'id']),
+    ('ix_activities_medicine_id_created_at', ['medicine_id', 'created_at', 'id']),
+    ('ix_activities_activity_type_created_at', ['activity_type', 'created_at', 'id']),
+]
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES:
+        op.create_index(name, 'activities', columns)
+
+
+def downgrade() -> None:
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='activities')
@@ -0,0 +1,76 @@
+"""Medicine lots with expiry dates
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 11:00:00.000000
+
+Stock is tracked per lot (lot number, expiry date, quantity) and
+medicines.stock becomes the total of a medicine's lots. Existing stock goes
+into one UNTRACKED lot per medicine with no expiry date, sold after every
+dated lot. order_lot_allocations records which lots an order took units
+from; open orders placed before this revision are recorded against the
+UNTRACKED lot so cancelling them still restores stock.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'medicine_lots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('medicine_id', sa.Integer(), sa.ForeignKey('medicines.id'), nullable=False),
+        sa.Column('lot_number', sa.String(), nullable=False),
+        sa.Column('expiry_date', sa.Date(), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('medicine_id', 'lot_number', name='uq_medicine_lots_medicine_id_lot_number'),
+    )
+    op.create_index('ix_medicine_lots_id', 'medicine_lots', ['id'])
+    op.create_index('ix_medicine_lots_medicine_id_expiry_date', 'medicine_lots', ['medicine_id', 'expiry_date'])
+    op.create_index('ix_medicine_lots_expiry_date', 'medicine_lots', ['expiry_date'])
+
+    op.create_table(
+        'order_lot_allocations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('medicine_id', sa.Integer(), sa.ForeignKey('medicines.id'), nullable=False),
+        sa.Column('lot_id', sa.Integer(), sa.ForeignKey('medicine_lots.id'), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_order_lot_allocations_id', 'order_lot_allocations', ['id'])
+    op.create_index('ix_order_lot_allocations_order_id', 'order_lot_allocations', ['order_id'])
+
+    op.execute(
+        "INSERT INTO medicine_lots (medicine_id, lot_number, expiry_date, quantity) "
+        "SELECT id, 'UNTRACKED', NULL, COALESCE(stock, 0) FROM medicines"
+    )
+    op.execute(
+        "INSERT INTO order_lot_allocations (order_id, medicine_id, lot_id, quantity) "
+        "SELECT order_items.order_id, order_items.medicine_id, medicine_lots.id, SUM(order_items.quantity) "
+        "FROM order_items "
+        "JOIN orders ON orders.id = order_items.order_id "
+        "JOIN medicine_lots ON medicine_lots.medicine_id = order_items.medicine_id "
+        "AND medicine_lots.lot_number = 'UNTRACKED' "
+        "WHERE orders.status IN ('PENDING', 'CONFIRMED', 'PROCESSING') "
+        "GROUP BY order_items.order_id, order_items.medicine_id, medicine_lots.id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_order_lot_allocations_order_id', table_name='order_lot_allocations')
+    op.drop_index('ix_order_lot_allocations_id', table_name='order_lot_allocations')
+    op.drop_table('order_lot_allocations')
+    op.drop_index('ix_medicine_lots_expiry_date', table_name='medicine_lots')
+    op.drop_index('ix_medicine_lots_medicine_id_expiry_date', table_name='medicine_lots')
+    op.drop_index('ix_medicine_lots_id', table_name='medicine_lots')
+    op.drop_table('medicine_lots')
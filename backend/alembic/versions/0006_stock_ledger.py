@@ -0,0 +1,87 @@
+"""Stock movement ledger and snapshots
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 12:00:00.000000
+
+stock_movements records every change of medicines.stock (delta, reason,
+sale/order and user); stock_snapshots holds periodic per-medicine totals so
+stock at a past time is read without scanning the ledger. Current stock is
+recorded as one 'opening' movement per medicine. On PostgreSQL a trigger
+makes stock_movements append-only.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stock_movements',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('medicine_id', sa.Integer(), sa.ForeignKey('medicines.id'), nullable=False),
+        sa.Column('change', sa.Integer(), nullable=False),
+        sa.Column('reason', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('sale_id', sa.Integer(), nullable=True),
+        sa.Column('order_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_stock_movements_id', 'stock_movements', ['id'])
+    op.create_index('ix_stock_movements_medicine_id_id', 'stock_movements', ['medicine_id', 'id'])
+    op.create_index('ix_stock_movements_created_at', 'stock_movements', ['created_at'])
+    op.create_index('ix_stock_movements_sale_id', 'stock_movements', ['sale_id'])
+    op.create_index('ix_stock_movements_order_id', 'stock_movements', ['order_id'])
+
+    op.create_table(
+        'stock_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('medicine_id', sa.Integer(), sa.ForeignKey('medicines.id'), nullable=False),
+        sa.Column('movement_id', sa.Integer(), nullable=False),
+        sa.Column('stock', sa.Integer(), nullable=False),
+        sa.Column('taken_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_stock_snapshots_id', 'stock_snapshots', ['id'])
+    op.create_index('ix_stock_snapshots_medicine_id_movement_id', 'stock_snapshots', ['medicine_id', 'movement_id'], unique=True)
+    op.create_index('ix_stock_snapshots_taken_at_movement_id', 'stock_snapshots', ['taken_at', 'movement_id'])
+
+    op.execute(
+        "INSERT INTO stock_movements (medicine_id, change, reason) "
+        "SELECT id, stock, 'opening' FROM medicines WHERE stock IS NOT NULL AND stock <> 0"
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "CREATE FUNCTION stock_movements_append_only() RETURNS trigger AS $$ "
+            "BEGIN RAISE EXCEPTION 'stock_movements is append-only'; END "
+            "$$ LANGUAGE plpgsql"
+        )
+        op.execute(
+            "CREATE TRIGGER stock_movements_append_only "
+            "BEFORE UPDATE OR DELETE OR TRUNCATE ON stock_movements "
+            "FOR EACH STATEMENT EXECUTE FUNCTION stock_movements_append_only()"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TRIGGER IF EXISTS stock_movements_append_only ON stock_movements")
+        op.execute("DROP FUNCTION IF EXISTS stock_movements_append_only()")
+    op.drop_index('ix_stock_snapshots_taken_at_movement_id', table_name='stock_snapshots')
+    op.drop_index('ix_stock_snapshots_medicine_id_movement_id', table_name='stock_snapshots')
+    op.drop_index('ix_stock_snapshots_id', table_name='stock_snapshots')
+    op.drop_table('stock_snapshots')
+    op.drop_index('ix_stock_movements_order_id', table_name='stock_movements')
+    op.drop_index('ix_stock_movements_sale_id', table_name='stock_movements')
+    op.drop_index('ix_stock_movements_created_at', table_name='stock_movements')
+    op.drop_index('ix_stock_movements_medicine_id_id', table_name='stock_movements')
+    op.drop_index('ix_stock_movements_id', table_name='stock_movements')
+    op.drop_table('stock_movements')
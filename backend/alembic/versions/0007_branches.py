@@ -0,0 +1,149 @@
+"""Branches with per-branch stock
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 13:00:00.000000
+
+Stock moves from medicines.stock to branch_stock, one row per (branch,
+medicine), so sales in different branches never lock the same row. Existing
+stock, lots, ledger rows, sales and orders are assigned to a MAIN branch
+(id 1), which DEFAULT_BRANCH_CODE points at; staff and pharmacists are
+assigned to it as well. Downgrading folds every branch's stock back into
+medicines.stock.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'branches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('code', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('address', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_branches_id', 'branches', ['id'])
+    op.create_index('ix_branches_code', 'branches', ['code'], unique=True)
+    op.execute("INSERT INTO branches (id, code, name, is_active) VALUES (1, 'MAIN', 'Main branch', true)")
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("SELECT setval(pg_get_serial_sequence('branches', 'id'), 1)")
+
+    op.create_table(
+        'branch_stock',
+        sa.Column('branch_id', sa.Integer(), sa.ForeignKey('branches.id'), nullable=False),
+        sa.Column('medicine_id', sa.Integer(), sa.ForeignKey('medicines.id'), nullable=False),
+        sa.Column('stock', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('branch_id', 'medicine_id'),
+    )
+    op.create_index('ix_branch_stock_medicine_id', 'branch_stock', ['medicine_id'])
+    op.execute(
+        "INSERT INTO branch_stock (branch_id, medicine_id, stock) "
+        "SELECT 1, id, COALESCE(stock, 0) FROM medicines"
+    )
+    with op.batch_alter_table('medicines') as batch:
+        batch.drop_column('stock')
+
+    with op.batch_alter_table('users') as batch:
+        batch.add_column(sa.Column('branch_id', sa.Integer(), nullable=True))
+        batch.create_foreign_key('fk_users_branch_id', 'branches', ['branch_id'], ['id'])
+    op.execute("UPDATE users SET branch_id = 1 WHERE role IN ('PHARMACIST', 'STAFF')")
+
+    with op.batch_alter_table('medicine_lots') as batch:
+        batch.add_column(sa.Column('branch_id', sa.Integer(), nullable=False, server_default='1'))
+        batch.create_foreign_key('fk_medicine_lots_branch_id', 'branches', ['branch_id'], ['id'])
+        batch.drop_constraint('uq_medicine_lots_medicine_id_lot_number', type_='unique')
+        batch.create_unique_constraint(
+            'uq_medicine_lots_branch_id_medicine_id_lot_number', ['branch_id', 'medicine_id', 'lot_number']
+        )
+    op.drop_index('ix_medicine_lots_medicine_id_expiry_date', table_name='medicine_lots')
+    op.create_index(
+        'ix_medicine_lots_branch_id_medicine_id_expiry_date', 'medicine_lots', ['branch_id', 'medicine_id', 'expiry_date']
+    )
+
+    # No foreign keys on sales and orders (see the models); the default
+    # fills existing rows without rewriting the tables on PostgreSQL 11+
+    for table in ('sales', 'orders'):
+        op.add_column(table, sa.Column('branch_id', sa.Integer(), nullable=False, server_default='1'))
+        op.create_index(f'ix_{table}_branch_id_created_at', table, ['branch_id', 'created_at'])
+
+    for table in ('stock_movements', 'stock_snapshots'):
+        with op.batch_alter_table(table) as batch:
+            batch.add_column(sa.Column('branch_id', sa.Integer(), nullable=False, server_default='1'))
+            batch.create_foreign_key(f'fk_{table}_branch_id', 'branches', ['branch_id'], ['id'])
+    op.create_index('ix_stock_movements_branch_id_id', 'stock_movements', ['branch_id', 'id'])
+    op.drop_index('ix_stock_snapshots_medicine_id_movement_id', table_name='stock_snapshots')
+    op.create_index(
+        'ix_stock_snapshots_medicine_id_branch_id_movement_id', 'stock_snapshots',
+        ['medicine_id', 'branch_id', 'movement_id'], unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stock_snapshots_medicine_id_branch_id_movement_id', table_name='stock_snapshots')
+    # Snapshots of other branches would collide on (medicine_id, movement_id)
+    op.execute("DELETE FROM stock_snapshots WHERE branch_id <> 1")
+    op.create_index('ix_stock_snapshots_medicine_id_movement_id', 'stock_snapshots', ['medicine_id', 'movement_id'], unique=True)
+    op.drop_index('ix_stock_movements_branch_id_id', table_name='stock_movements')
+    for table in ('stock_snapshots', 'stock_movements'):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_constraint(f'fk_{table}_branch_id', type_='foreignkey')
+            batch.drop_column('branch_id')
+
+    for table in ('orders', 'sales'):
+        op.drop_index(f'ix_{table}_branch_id_created_at', table_name=table)
+        op.drop_column(table, 'branch_id')
+
+    op.drop_index('ix_medicine_lots_branch_id_medicine_id_expiry_date', table_name='medicine_lots')
+    op.create_index('ix_medicine_lots_medicine_id_expiry_date', 'medicine_lots', ['medicine_id', 'expiry_date'])
+    # Lots of other branches are merged into the matching MAIN lots
+    op.execute(
+        "UPDATE medicine_lots SET quantity = quantity + ("
+        "SELECT COALESCE(SUM(other.quantity), 0) FROM medicine_lots other "
+        "WHERE other.branch_id <> 1 AND other.medicine_id = medicine_lots.medicine_id "
+        "AND other.lot_number = medicine_lots.lot_number) "
+        "WHERE branch_id = 1"
+    )
+    op.execute(
+        "UPDATE medicine_lots SET branch_id = 1 WHERE branch_id <> 1 AND NOT EXISTS ("
+        "SELECT 1 FROM medicine_lots main WHERE main.branch_id = 1 "
+        "AND main.medicine_id = medicine_lots.medicine_id AND main.lot_number = medicine_lots.lot_number)"
+    )
+    op.execute(
+        "UPDATE order_lot_allocations SET lot_id = ("
+        "SELECT main.id FROM medicine_lots main JOIN medicine_lots other "
+        "ON other.medicine_id = main.medicine_id AND other.lot_number = main.lot_number "
+        "WHERE other.id = order_lot_allocations.lot_id AND main.branch_id = 1)"
+    )
+    op.execute("DELETE FROM medicine_lots WHERE branch_id <> 1")
+    with op.batch_alter_table('medicine_lots') as batch:
+        batch.drop_constraint('uq_medicine_lots_branch_id_medicine_id_lot_number', type_='unique')
+        batch.create_unique_constraint('uq_medicine_lots_medicine_id_lot_number', ['medicine_id', 'lot_number'])
+        batch.drop_constraint('fk_medicine_lots_branch_id', type_='foreignkey')
+        batch.drop_column('branch_id')
+
+    with op.batch_alter_table('users') as batch:
+        batch.drop_constraint('fk_users_branch_id', type_='foreignkey')
+        batch.drop_column('branch_id')
+
+    with op.batch_alter_table('medicines') as batch:
+        batch.add_column(sa.Column('stock', sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE medicines SET stock = (SELECT COALESCE(SUM(stock), 0) FROM branch_stock "
+        "WHERE branch_stock.medicine_id = medicines.id)"
+    )
+    op.drop_index('ix_branch_stock_medicine_id', table_name='branch_stock')
+    op.drop_table('branch_stock')
+    op.drop_index('ix_branches_code', table_name='branches')
+    op.drop_index('ix_branches_id', table_name='branches')
+    op.drop_table('branches')
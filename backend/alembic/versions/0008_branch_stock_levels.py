@@ -0,0 +1,29 @@
+"""Per-branch reorder thresholds
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 16:00:00.000000
+
+branch_stock gets min_stock_level and max_stock_level, set from each
+branch's own demand forecast. NULL falls back to the medicine's levels,
+which stay the catalog-wide defaults.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('branch_stock', sa.Column('min_stock_level', sa.Integer(), nullable=True))
+    op.add_column('branch_stock', sa.Column('max_stock_level', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('branch_stock', 'max_stock_level')
+    op.drop_column('branch_stock', 'min_stock_level')
@@ -1,11 +1,17 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, medicines, orders, users, sales
+from app.api.v1.endpoints import auth, branches, medicines, orders, users, sales, events, activities, profiler, forecasts, stock_movements
 
 api_router = APIRouter()
 
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
+api_router.include_router(branches.router, prefix="/branches", tags=["branches"])
 api_router.include_router(medicines.router, prefix="/medicines", tags=["medicines"])
 api_router.include_router(orders.router, prefix="/orders", tags=["orders"])
 api_router.include_router(sales.router, prefix="/sales", tags=["sales"])
+api_router.include_router(activities.router, prefix="/activities", tags=["activities"])
+api_router.include_router(forecasts.router, prefix="/forecasts", tags=["forecasts"])
+api_router.include_router(stock_movements.router, prefix="/stock-movements", tags=["stock movements"])
+api_router.include_router(profiler.router, prefix="/profiler", tags=["profiler"])
 
+api_router.include_router(events.router, prefix="/events", tags=["events"])
@@ -0,0 +1,93 @@
+import base64
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query as OrmQuery, Session
+
+from app.core.auth import get_current_active_user
+from app.core.database import get_db
+from app.core.events import STAFF_ROLES
+from app.models.activity import Activity
+from app.models.user import User
+from app.schemas.activity import ActivityFilter, ActivityPage
+
+router = APIRouter()
+
+ACTIVITY_COLUMNS = (
+    Activity.id,
+    Activity.user_id,
+    Activity.medicine_id,
+    Activity.activity_type,
+    Activity.message,
+    Activity.extra_data,
+    Activity.created_at,
+)
+
+
+def encode_cursor(created_at: datetime, activity_id: int) -> str:
+    """Opaque cursor pointing just after the given activity"""
+    raw = f"{created_at.isoformat()}|{activity_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, activity_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(activity_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def apply_activity_filters(query: OrmQuery, filters: ActivityFilter) -> OrmQuery:
+    """Apply ActivityFilter to a query over Activity"""
+    if filters.user_id is not None:
+        query = query.filter(Activity.user_id == filters.user_id)
+    if filters.medicine_id is not None:
+        query = query.filter(Activity.medicine_id == filters.medicine_id)
+    if filters.activity_type:
+        query = query.filter(Activity.activity_type == filters.activity_type)
+    if filters.created_from:
+        query = query.filter(Activity.created_at >= filters.created_from)
+    if filters.created_to:
+        query = query.filter(Activity.created_at <= filters.created_to)
+    return query
+
+
+@router.get("/", response_model=ActivityPage)
+def get_activities(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    filters: ActivityFilter = Depends(),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Activity feed, newest first, with optional filtering.
+
+    Staff can read every user's activity; other users only their own.
+    Pages are keyed on (created_at, id) rather than an offset: pass the
+    returned `next_cursor` as `cursor` to continue. Each page is a single
+    range scan on the (user_id | medicine_id | activity_type, created_at, id)
+    index matching the filter, so deep pages cost the same as the first.
+    """
+    if current_user.role.value not in STAFF_ROLES:
+        if filters.user_id not in (None, current_user.id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+        filters.user_id = current_user.id
+
+    query = apply_activity_filters(db.query(*ACTIVITY_COLUMNS), filters)
+    if cursor:
+        query = query.filter(tuple_(Activity.created_at, Activity.id) < decode_cursor(cursor))
+
+    # One extra row tells whether there is a next page
+    rows = query.order_by(Activity.created_at.desc(), Activity.id.desc()).limit(limit + 1).all()
+    items = [dict(row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
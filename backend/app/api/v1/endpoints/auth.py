@@ -3,6 +3,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
+from app.core.activity_log import activity_log
 from app.core.database import get_db
 from app.core.security import verify_password, create_access_token, get_password_hash
 from app.core.config import settings
@@ -45,6 +46,8 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     user = db.query(User).filter(User.email == form_data.username).first()
     
     if not user or not verify_password(form_data.password, user.hashed_password):
+        activity_log.log("login_failed", "Failed login attempt", user_id=user.id if user else None,
+                         extra_data={"email": form_data.username})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -62,6 +65,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
         data={"sub": user.email}, expires_delta=access_token_expires
     )
     
+    activity_log.log("user_login", f"{user.name} logged in", user_id=user.id)
     return {"access_token": access_token, "token_type": "bearer", "user": user}
 
 
@@ -71,6 +75,8 @@ def login_json(user_credentials: UserLogin, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == user_credentials.email).first()
     
     if not user or not verify_password(user_credentials.password, user.hashed_password):
+        activity_log.log("login_failed", "Failed login attempt", user_id=user.id if user else None,
+                         extra_data={"email": user_credentials.email})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -88,5 +94,6 @@ def login_json(user_credentials: UserLogin, db: Session = Depends(get_db)):
         data={"sub": user.email}, expires_delta=access_token_expires
     )
     
+    activity_log.log("user_login", f"{user.name} logged in", user_id=user.id)
     return {"access_token": access_token, "token_type": "bearer", "user": user}
 
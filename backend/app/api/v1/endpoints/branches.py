@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+
+from app.core.database import get_db
+from app.core.auth import get_current_active_user, require_role
+from app.models.user import User
+from app.models.branch import Branch
+from app.schemas.branch import Branch as BranchSchema, BranchCreate, BranchUpdate
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[BranchSchema])
+def get_branches(
+    include_inactive: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get all branches"""
+    query = db.query(Branch)
+    if not include_inactive:
+        query = query.filter(Branch.is_active == True)
+    return query.order_by(Branch.code).all()
+
+
+@router.post("/", response_model=BranchSchema)
+def create_branch(
+    branch: BranchCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin"))
+):
+    """Create a new branch (admin only). It starts with no stock."""
+    if db.query(Branch.id).filter(Branch.code == branch.code).first():
+        raise HTTPException(status_code=400, detail="Branch code already exists")
+    db_branch = Branch(**branch.dict())
+    db.add(db_branch)
+    db.commit()
+    db.refresh(db_branch)
+    return db_branch
+
+
+@router.put("/{branch_id}", response_model=BranchSchema)
+def update_branch(
+    branch_id: int,
+    branch_update: BranchUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin"))
+):
+    """Update a branch (admin only)"""
+    branch = db.query(Branch).filter(Branch.id == branch_id).first()
+    if not branch:
+        raise HTTPException(status_code=404, detail="Branch not found")
+    
+    for field, value in branch_update.dict(exclude_unset=True).items():
+        setattr(branch, field, value)
+    
+    db.commit()
+    db.refresh(branch)
+    return branch
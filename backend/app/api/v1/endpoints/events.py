@@ -0,0 +1,109 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketState
+from typing import Optional
+
+from app.core.auth import authenticate_token, get_stream_user
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.events import broker
+from app.models.user import User
+
+router = APIRouter()
+
+
+def _event_types(types: Optional[str]) -> Optional[set]:
+    """Parse a comma separated `types` filter, e.g. "order.created,stock.low" """
+    if not types:
+        return None
+    return {t.strip() for t in types.split(",") if t.strip()}
+
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    types: Optional[str] = Query(None, description="Comma separated event types to receive"),
+    current_user: User = Depends(get_stream_user)
+):
+    """Server-Sent Events stream of order, sale and stock events.
+
+    Events are filtered by role: admin, pharmacist and staff receive all
+    operational events, customers only events about their own orders. A
+    `lagged` event tells the client it missed events and should refetch.
+    """
+    subscriber = broker.subscribe(current_user.role.value, current_user.id, _event_types(types))
+
+    async def event_source():
+        try:
+            yield "retry: 3000\n\n"
+            while not subscriber.closed:
+                event = await subscriber.get(timeout=settings.EVENTS_KEEPALIVE_SECONDS)
+                if await request.is_disconnected():
+                    break
+                dropped = subscriber.take_dropped()
+                if dropped:
+                    yield f"event: lagged\ndata: {{\"dropped\": {dropped}}}\n\n"
+                if event is None:
+                    if subscriber.closed:
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event.id}\nevent: {event.type}\ndata: {event.json}\n\n"
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _authenticate(token: str) -> User:
+    with SessionLocal() as db:
+        return authenticate_token(token, db)
+
+
+@router.websocket("/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    token: str = Query(...),
+    types: Optional[str] = Query(None)
+):
+    """WebSocket stream of the same events as /stream, one JSON message per event"""
+    try:
+        current_user = await run_in_threadpool(_authenticate, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscriber = broker.subscribe(current_user.role.value, current_user.id, _event_types(types))
+
+    async def pump():
+        while not subscriber.closed:
+            event = await subscriber.get(timeout=settings.EVENTS_KEEPALIVE_SECONDS)
+            dropped = subscriber.take_dropped()
+            if dropped:
+                await websocket.send_text(f"{{\"type\": \"lagged\", \"data\": {{\"dropped\": {dropped}}}}}")
+            if event is not None:
+                await websocket.send_text(event.json)
+
+    async def drain():
+        # Clients are not expected to send anything; this only notices disconnects
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(pump()), asyncio.create_task(drain())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Collect WebSocketDisconnect and cancellation from the finished tasks
+        await asyncio.gather(*tasks, return_exceptions=True)
+        broker.unsubscribe(subscriber)
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close()
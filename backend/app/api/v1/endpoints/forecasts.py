@@ -0,0 +1,146 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime, timezone
+
+from app.core.database import get_db
+from app.core.auth import require_role
+from app.core.branches import get_current_branch
+from app.core.activity_log import activity_log
+from app.core.cache import response_cache
+from app.models.user import User
+from app.models.branch import BranchStock
+from app.models.medicine import Medicine
+from app.schemas.forecast import ForecastApplyResult, ForecastResponse
+from app.services.inventory import branch_max_stock, branch_min_stock, branch_stock
+from app.services.inventory_summary import inventory_summary
+from app.services.forecasting import (
+    ForecastSettings,
+    apply_reorder_points,
+    forecast_catalog,
+    forecast_medicines,
+    history_bounds,
+)
+
+router = APIRouter()
+
+FORECAST_COLUMNS = (
+    Medicine.id,
+    Medicine.name,
+    Medicine.category,
+    branch_stock.label("stock"),
+    branch_min_stock.label("min_stock_level"),
+    branch_max_stock.label("max_stock_level"),
+)
+
+
+def forecast_settings(
+    history_days: Optional[int] = Query(None, ge=7, le=1096),
+    window_days: Optional[int] = Query(None, ge=1, le=365, description="Moving average and variability window"),
+    smoothing: Optional[float] = Query(None, gt=0, le=1, description="Exponential smoothing factor"),
+    lead_time_days: Optional[float] = Query(None, gt=0, le=365),
+    review_days: Optional[float] = Query(None, gt=0, le=365, description="Days of demand one order covers"),
+    service_level: Optional[float] = Query(None, gt=0.5, lt=1),
+) -> ForecastSettings:
+    """Forecast parameters from the query string; unset ones come from the FORECAST_* settings"""
+    return ForecastSettings.resolve(
+        history_days=history_days,
+        window_days=window_days,
+        smoothing=smoothing,
+        lead_time_days=lead_time_days,
+        review_days=review_days,
+        service_level=service_level,
+    )
+
+
+@router.get("/", response_model=ForecastResponse)
+def get_forecast(
+    skip: int = 0,
+    limit: int = 100,
+    category: Optional[str] = None,
+    needs_reorder: bool = False,
+    config: ForecastSettings = Depends(forecast_settings),
+    branch_id: int = Depends(get_current_branch),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("pharmacist"))
+):
+    """Forecast the branch's demand and recommend reorder points for active medicines (pharmacist only).
+
+    `needs_reorder` keeps only medicines whose stock in the branch is at or
+    below the recommended reorder point.
+    """
+    query = db.query(*FORECAST_COLUMNS).outerjoin(
+        BranchStock, (BranchStock.medicine_id == Medicine.id) & (BranchStock.branch_id == branch_id)
+    ).filter(Medicine.is_active == True)
+    if category:
+        query = query.filter(Medicine.category == category)
+    medicines = query.order_by(Medicine.id).all()
+    forecast = forecast_medicines(db, [medicine.id for medicine in medicines], config, branch_id=branch_id)
+
+    selected = range(len(medicines))
+    if needs_reorder:
+        selected = [i for i in selected if medicines[i].stock <= forecast.reorder_point[i]]
+
+    items = []
+    for i in list(selected)[skip:skip + limit]:
+        medicine = medicines[i]
+        reorder_point = int(forecast.reorder_point[i])
+        items.append({
+            "medicine_id": medicine.id,
+            "name": medicine.name,
+            "category": medicine.category,
+            "stock": medicine.stock,
+            "moving_average": round(float(forecast.moving_average[i]), 3),
+            "smoothed_demand": round(float(forecast.smoothed_demand[i]), 3),
+            "demand_std": round(float(forecast.demand_std[i]), 3),
+            "safety_stock": int(forecast.safety_stock[i]),
+            "reorder_point": reorder_point,
+            "order_quantity": int(forecast.order_quantity[i]),
+            "min_stock_level": medicine.min_stock_level,
+            "max_stock_level": medicine.max_stock_level,
+            "needs_reorder": medicine.stock <= reorder_point,
+        })
+
+    history_start, history_end = history_bounds(config.history_days)
+    # Items are already in the response shape; skip re-validating them
+    return ORJSONResponse({
+        "generated_at": datetime.now(timezone.utc),
+        "history_start": history_start,
+        "history_end": history_end,
+        "window_days": config.window_days,
+        "smoothing": config.smoothing,
+        "lead_time_days": config.lead_time_days,
+        "review_days": config.review_days,
+        "service_level": config.service_level,
+        "total": len(selected),
+        "items": items,
+    })
+
+
+@router.post("/apply", response_model=ForecastApplyResult)
+def apply_forecast(
+    config: ForecastSettings = Depends(forecast_settings),
+    branch_id: int = Depends(get_current_branch),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin"))
+):
+    """Set the branch's min/max stock levels of every active medicine from its forecast (admin only).
+
+    Medicines without sales in the branch in the history window keep their
+    current levels there.
+    """
+    forecast = forecast_catalog(db, config, branch_id)
+    updated = apply_reorder_points(db, forecast, branch_id)
+    db.commit()
+    
+    response_cache.invalidate("medicines")
+    inventory_summary.invalidate()
+    skipped = len(forecast.medicine_ids) - updated
+    activity_log.log(
+        "reorder_points_updated",
+        f"Reorder points updated for {updated} medicines",
+        user_id=current_user.id,
+        extra_data={"updated": updated, "skipped": skipped, "branch_id": branch_id},
+    )
+    return {"updated": updated, "skipped": skipped}
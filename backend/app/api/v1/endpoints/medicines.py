@@ -1,27 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import date, timedelta
 
 from app.core.database import get_db
 from app.core.auth import get_current_active_user, require_role
+from app.core.branches import get_current_branch
+from app.core.cache import response_cache
+from app.core.events import broker
+from app.core.singleflight import singleflight
 from app.models.user import User
-from app.models.medicine import Medicine
-from app.schemas.medicine import Medicine as MedicineSchema, MedicineCreate, MedicineUpdate, StockUpdate
+from app.models.branch import Branch, BranchStock
+from app.models.medicine import Medicine, MedicineLot
+from app.schemas.medicine import (
+    Medicine as MedicineSchema,
+    MedicineBatch,
+    MedicineBatchRequest,
+    MEDICINE_BATCH_MAX_IDS,
+    MedicineCreate,
+    MedicineUpdate,
+    StockUpdate,
+    InventorySummary,
+    MedicineLot as MedicineLotSchema,
+    ExpiringLot,
+)
+from app.schemas.branch import BranchStockLevel
+from app.services.inventory import (
+    adjust_stock,
+    branch_min_stock,
+    branch_stock,
+    lock_branch_stock,
+    log_stock_changes,
+    low_stock_event,
+    medicines_in_branch,
+)
+from app.services.inventory_summary import inventory_summary, stock_change
 
 router = APIRouter()
 
+# Shared by get_medicine and the batch lookup, which reads and fills its entries
+MEDICINE_CACHE_TAGS = ("medicine:{medicine_id}", "medicines")
+
 
 @router.get("/", response_model=List[MedicineSchema])
+@singleflight.coalesced(List[MedicineSchema])
 def get_medicines(
     skip: int = 0,
     limit: int = 100,
     category: Optional[str] = None,
     search: Optional[str] = None,
+    branch_id: int = Depends(get_current_branch),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get all medicines with optional filtering"""
-    query = db.query(Medicine).filter(Medicine.is_active == True)
+    """Get all medicines with optional filtering, with the branch's stock"""
+    query = medicines_in_branch(db, branch_id).filter(Medicine.is_active == True)
     
     if category:
         query = query.filter(Medicine.category == category)
@@ -33,86 +67,267 @@ def get_medicines(
     return medicines
 
 
-@router.get("/{medicine_id}", response_model=MedicineSchema)
-def get_medicine(
-    medicine_id: int,
+@router.get("/summary/", response_model=InventorySummary)
+def get_inventory_summary(
+    branch_id: int = Depends(get_current_branch),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("pharmacist"))
+):
+    """Stock value and stock health of the branch, by category and by manufacturer (pharmacist only)"""
+    return inventory_summary.get(db, branch_id)
+
+
+@router.get("/expiring/", response_model=List[ExpiringLot])
+def get_expiring_lots(
+    days: int = Query(30, ge=0, le=3650),
+    skip: int = 0,
+    limit: int = 100,
+    branch_id: int = Depends(get_current_branch),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("pharmacist"))
+):
+    """The branch's lots in stock that expire within `days` days or have expired, soonest first (pharmacist only)"""
+    today = date.today()
+    rows = (
+        db.query(MedicineLot, Medicine.name)
+        .join(Medicine, Medicine.id == MedicineLot.medicine_id)
+        .filter(
+            MedicineLot.branch_id == branch_id,
+            MedicineLot.expiry_date <= today + timedelta(days=days),
+            MedicineLot.quantity > 0,
+            Medicine.is_active == True,
+        )
+        .order_by(MedicineLot.expiry_date, MedicineLot.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return [
+        {
+            **MedicineLotSchema.model_validate(lot).model_dump(),
+            "medicine_name": name,
+            "expired": lot.expiry_date < today,
+        }
+        for lot, name in rows
+    ]
+
+
+def _medicine_batch(db: Session, branch_id: int, ids: List[int]) -> Response:
+    """Medicines by id in request order, from get_medicine's cache entries or one IN query for the rest"""
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="At least one id is required")
+    if len(ids) > MEDICINE_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MEDICINE_BATCH_MAX_IDS} ids per request")
+
+    def load(calls):
+        wanted = [call["medicine_id"] for call in calls]
+        found = {medicine.id: medicine for medicine in medicines_in_branch(db, branch_id).filter(Medicine.id.in_(wanted))}
+        return [found.get(medicine_id) for medicine_id in wanted]
+
+    bodies = response_cache.cached_items(
+        get_medicine,
+        MedicineSchema,
+        [{"medicine_id": medicine_id, "branch_id": branch_id} for medicine_id in ids],
+        load,
+        tags=MEDICINE_CACHE_TAGS,
+        scope="shared",
+    )
+    missing = [medicine_id for medicine_id, body in zip(ids, bodies) if body is None]
+    # Entries are already serialized; splice them in rather than re-validating
+    items = b",".join(body for body in bodies if body is not None)
+    return Response(
+        b'{"items":[' + items + b'],"missing":' + orjson.dumps(missing) + b"}",
+        media_type="application/json",
+    )
+
+
+@router.get("/batch", response_model=MedicineBatch)
+def get_medicine_batch(
+    # Not required: FastAPI 0.104 fails to report a missing list parameter
+    ids: List[int] = Query([], description="Repeat for each medicine: ?ids=1&ids=2"),
+    branch_id: int = Depends(get_current_branch),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get a specific medicine by ID"""
-    medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
+    """Get several medicines by ID in one request, with the branch's stock.
+
+    Items come back in request order; ids with no medicine are listed in
+    `missing`. Use POST for lists too long for a URL.
+    """
+    return _medicine_batch(db, branch_id, ids)
+
+
+@router.post("/batch", response_model=MedicineBatch)
+def post_medicine_batch(
+    batch: MedicineBatchRequest,
+    branch_id: int = Depends(get_current_branch),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Same as GET /batch, with the ids in the request body"""
+    return _medicine_batch(db, branch_id, batch.ids)
+
+
+def _medicine_in_branch(db: Session, branch_id: int, medicine_id: int):
+    medicine = medicines_in_branch(db, branch_id).filter(Medicine.id == medicine_id).first()
     if not medicine:
         raise HTTPException(status_code=404, detail="Medicine not found")
     return medicine
 
 
+@router.get("/{medicine_id}", response_model=MedicineSchema)
+@response_cache.cached(MedicineSchema, tags=MEDICINE_CACHE_TAGS, scope="shared")
+def get_medicine(
+    medicine_id: int,
+    branch_id: int = Depends(get_current_branch),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get a specific medicine by ID, with the branch's stock"""
+    return _medicine_in_branch(db, branch_id, medicine_id)
+
+
 @router.post("/", response_model=MedicineSchema)
 def create_medicine(
     medicine: MedicineCreate,
+    branch_id: int = Depends(get_current_branch),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_role("admin"))
 ):
-    """Create a new medicine (admin only)"""
-    db_medicine = Medicine(**medicine.dict())
+    """Create a new medicine (admin only); `stock` is the branch's opening stock"""
+    db_medicine = Medicine(**medicine.dict(exclude={"stock"}))
     db.add(db_medicine)
+    db.flush()
+    rows = lock_branch_stock(db, branch_id, [db_medicine.id], create=True)
+    adjust_stock(db, rows[db_medicine.id], medicine.stock, current_user.id, reason="initial")
     db.commit()
-    db.refresh(db_medicine)
-    return db_medicine
+    inventory_summary.invalidate()
+    return _medicine_in_branch(db, branch_id, db_medicine.id)
 
 
 @router.put("/{medicine_id}", response_model=MedicineSchema)
 def update_medicine(
     medicine_id: int,
     medicine_update: MedicineUpdate,
+    branch_id: int = Depends(get_current_branch),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_role("admin"))
 ):
-    """Update a medicine (admin only)"""
-    medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
+    """Update a medicine (admin only); `stock` sets the branch's stock"""
+    update_data = medicine_update.dict(exclude_unset=True)
+    stock = update_data.pop("stock", None)
+    query = db.query(Medicine).filter(Medicine.id == medicine_id)
+    if update_data:
+        query = query.with_for_update()
+    medicine = query.first()
     if not medicine:
         raise HTTPException(status_code=404, detail="Medicine not found")
     
-    update_data = medicine_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(medicine, field, value)
+    if stock is not None:
+        row = lock_branch_stock(db, branch_id, [medicine_id], create=True)[medicine_id]
+        adjust_stock(db, row, stock - row.stock, current_user.id)
     
     db.commit()
-    db.refresh(medicine)
-    return medicine
+    response_cache.invalidate(f"medicine:{medicine_id}")
+    inventory_summary.invalidate()
+    return _medicine_in_branch(db, branch_id, medicine_id)
 
 
 @router.patch("/{medicine_id}/stock", response_model=MedicineSchema)
 def update_stock(
     medicine_id: int,
     stock_update: StockUpdate,
+    branch_id: int = Depends(get_current_branch),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_role("pharmacist"))
 ):
-    """Update medicine stock (pharmacist only)"""
-    medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
-    if not medicine:
-        raise HTTPException(status_code=404, detail="Medicine not found")
+    """Update the branch's stock of a medicine (pharmacist only).
+
+    Only the branch's stock row is locked, never the medicine itself. Added
+    units go to the lot given by lot_number/expiry_date (the UNTRACKED lot
+    if none); subtracted units are written off the soonest-expiring lots.
+    """
+    medicine = _medicine_in_branch(db, branch_id, medicine_id)
+    if stock_update.operation not in ("add", "subtract"):
+        raise HTTPException(status_code=400, detail="Invalid operation")
     
+    row = lock_branch_stock(db, branch_id, [medicine_id], create=True)[medicine_id]
+    previous_stock = row.stock
     if stock_update.operation == "add":
-        medicine.stock += stock_update.quantity
-    elif stock_update.operation == "subtract":
-        medicine.stock = max(0, medicine.stock - stock_update.quantity)
+        adjust_stock(
+            db, row, stock_update.quantity, current_user.id,
+            lot_number=stock_update.lot_number, expiry_date=stock_update.expiry_date,
+        )
     else:
-        raise HTTPException(status_code=400, detail="Invalid operation")
+        adjust_stock(db, row, -min(stock_update.quantity, max(row.stock, 0)), current_user.id)
+    
+    stock = row.stock
+    crossed_low_stock = previous_stock > medicine.min_stock_level >= stock
+    summary_change = stock_change(medicine, branch_id, previous_stock, stock)
+    low_stock = low_stock_event(medicine, branch_id, stock) if crossed_low_stock else None
     
     db.commit()
-    db.refresh(medicine)
-    return medicine
+    response_cache.invalidate(f"medicine:{medicine_id}")
+    inventory_summary.stock_changed([summary_change])
+    
+    if low_stock:
+        broker.publish("stock.low", low_stock)
+    if stock != previous_stock:
+        log_stock_changes(
+            current_user.id, {medicine_id: stock - previous_stock}, {medicine_id: stock},
+            "adjustment", branch_id=branch_id,
+        )
+    return _medicine_in_branch(db, branch_id, medicine_id)
+
+
+@router.get("/{medicine_id}/lots", response_model=List[MedicineLotSchema])
+def get_medicine_lots(
+    medicine_id: int,
+    include_empty: bool = False,
+    branch_id: int = Depends(get_current_branch),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("pharmacist"))
+):
+    """The branch's lots of a medicine in the order they are sold, first expiry first (pharmacist only)"""
+    if not db.query(Medicine.id).filter(Medicine.id == medicine_id).first():
+        raise HTTPException(status_code=404, detail="Medicine not found")
+    query = db.query(MedicineLot).filter(MedicineLot.branch_id == branch_id, MedicineLot.medicine_id == medicine_id)
+    if not include_empty:
+        query = query.filter(MedicineLot.quantity > 0)
+    return query.order_by(MedicineLot.expiry_date.asc().nulls_last(), MedicineLot.id).all()
+
+
+@router.get("/{medicine_id}/branches", response_model=List[BranchStockLevel])
+def get_medicine_branch_stock(
+    medicine_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("pharmacist"))
+):
+    """Stock of a medicine in every active branch, by branch code (pharmacist only)"""
+    if not db.query(Medicine.id).filter(Medicine.id == medicine_id).first():
+        raise HTTPException(status_code=404, detail="Medicine not found")
+    return (
+        db.query(Branch.id.label("branch_id"), Branch.code, Branch.name, branch_stock.label("stock"))
+        .outerjoin(BranchStock, (BranchStock.branch_id == Branch.id) & (BranchStock.medicine_id == medicine_id))
+        .filter(Branch.is_active == True)
+        .order_by(Branch.code)
+        .all()
+    )
 
 
 @router.get("/low-stock/", response_model=List[MedicineSchema])
+@singleflight.coalesced(List[MedicineSchema])
 def get_low_stock_medicines(
+    branch_id: int = Depends(get_current_branch),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_role("pharmacist"))
 ):
-    """Get medicines with low stock (pharmacist only)"""
-    medicines = db.query(Medicine).filter(
-        Medicine.stock <= Medicine.min_stock_level,
+    """Get medicines with low stock in the branch (pharmacist only)"""
+    medicines = medicines_in_branch(db, branch_id).filter(
+        branch_stock <= branch_min_stock,
         Medicine.is_active == True
     ).all()
     return medicines
@@ -131,5 +346,7 @@ def delete_medicine(
     
     medicine.is_active = False
     db.commit()
+    response_cache.invalidate(f"medicine:{medicine_id}")
+    inventory_summary.invalidate()
     return {"message": "Medicine deleted successfully"}
 
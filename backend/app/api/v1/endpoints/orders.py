@@ -1,192 +1,373 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Query, Session
+from typing import List, Optional
+from collections import defaultdict
+from datetime import datetime, timezone
 
 from app.core.database import get_db
 from app.core.auth import get_current_active_user, require_role
+from app.core.activity_log import activity_log
+from app.core.branches import get_branch_scope, get_current_branch
+from app.core.cache import response_cache
+from app.core.partitions import is_partitioned_cached
+from app.core.events import broker
 from app.models.user import User
-from app.models.order import Order, OrderItem, OrderStatus
+from app.models.order import Order, OrderItem, OrderStatus, allowed_previous_statuses
 from app.models.medicine import Medicine
+from app.schemas.order import (
+    OrderFilter,
+    OrderCreate,
+    OrderResponse,
+    OrderCreateResponse,
+    OrderStatusUpdate,
+    BulkOrderStatusUpdate,
+    BulkOrderStatusResponse,
+)
+from app.services.inventory import (
+    reserve_stock,
+    record_order_allocations,
+    restore_order_stock,
+    low_stock_crossings,
+    log_stock_changes,
+)
+from app.services.inventory_summary import inventory_summary, stock_change
+from app.services.stock_ledger import record_movements
 
 router = APIRouter()
 
+ORDER_COLUMNS = (
+    Order.id,
+    Order.order_number,
+    Order.branch_id,
+    Order.status,
+    Order.total_amount,
+    Order.shipping_address,
+    Order.notes,
+    Order.created_at,
+    Order.updated_at,
+)
 
-@router.get("/", response_model=List[dict])
+ORDER_ITEM_FIELDS = ("medicine_id", "medicine_name", "quantity", "unit_price", "total_price")
+ORDER_ITEM_COLUMNS = (
+    OrderItem.order_id,
+    OrderItem.medicine_id,
+    Medicine.name,
+    OrderItem.quantity,
+    OrderItem.unit_price,
+    OrderItem.total_price,
+)
+
+
+def apply_order_filters(query: Query, filters: OrderFilter) -> Query:
+    """Apply list filters to an Order query.
+
+    Each filter is written so it can be answered from one of the indexes
+    declared on Order/OrderItem (see app/models/order.py).
+    """
+    if filters.status:
+        query = query.filter(Order.status == filters.status)
+    if filters.created_from is not None:
+        query = query.filter(Order.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.filter(Order.created_at < filters.created_to)
+    if filters.customer_id is not None:
+        query = query.filter(Order.customer_id == filters.customer_id)
+    if filters.branch_id is not None:
+        query = query.filter(Order.branch_id == filters.branch_id)
+    if filters.medicine_id is not None:
+        query = query.filter(
+            Order.id.in_(
+                select(OrderItem.order_id).where(OrderItem.medicine_id == filters.medicine_id)
+            )
+        )
+    if filters.min_total is not None:
+        query = query.filter(Order.total_amount >= filters.min_total)
+    if filters.max_total is not None:
+        query = query.filter(Order.total_amount <= filters.max_total)
+    return query
+
+
+def _orders_with_items(db: Session, query: Query) -> List[dict]:
+    """Run an Order column query and attach items, building plain dicts from rows.
+
+    Items for every order on the page come back in one joined query instead
+    of a lazy load per order and per item.
+    """
+    orders = [dict(row._mapping) for row in query]
+    by_id = {}
+    for order in orders:
+        order["items"] = []
+        by_id[order["id"]] = order
+
+    if by_id:
+        items = (
+            db.query(*ORDER_ITEM_COLUMNS)
+            .join(Medicine, Medicine.id == OrderItem.medicine_id)
+            .filter(OrderItem.order_id.in_(by_id))
+            .order_by(OrderItem.id)
+        )
+        # Partitioned items reference their order by (id, created_at), so they
+        # share its created_at; bounding it lets Postgres skip monthly
+        # partitions outside the page. Unpartitioned items may not match.
+        created = [order["created_at"] for order in orders if order["created_at"] is not None]
+        if len(created) == len(orders) and is_partitioned_cached(db.connection(), "order_items"):
+            items = items.filter(OrderItem.created_at.between(min(created), max(created)))
+        for order_id, *values in items:
+            by_id[order_id]["items"].append(dict(zip(ORDER_ITEM_FIELDS, values)))
+
+    return orders
+
+
+@router.get("/", response_model=List[OrderResponse])
 def get_orders(
     skip: int = 0,
     limit: int = 100,
-    status: OrderStatus = None,
+    filters: OrderFilter = Depends(),
+    branch_scope: Optional[int] = Depends(get_branch_scope),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get orders for current user or all orders (admin/pharmacist)"""
-    if current_user.role.value in ["admin", "pharmacist"]:
-        query = db.query(Order)
-    else:
-        query = db.query(Order).filter(Order.customer_id == current_user.id)
-    
-    if status:
-        query = query.filter(Order.status == status)
+    """Get orders for current user or all orders of the branch (admin/pharmacist), newest first"""
+    query = db.query(*ORDER_COLUMNS)
+    if current_user.role.value not in ["admin", "pharmacist"]:
+        query = query.filter(Order.customer_id == current_user.id)
     
-    orders = query.offset(skip).limit(limit).all()
-    
-    # Format orders with items
-    result = []
-    for order in orders:
-        order_data = {
-            "id": order.id,
-            "order_number": order.order_number,
-            "status": order.status,
-            "total_amount": order.total_amount,
-            "shipping_address": order.shipping_address,
-            "notes": order.notes,
-            "created_at": order.created_at,
-            "updated_at": order.updated_at,
-            "items": []
-        }
-        
-        for item in order.order_items:
-            order_data["items"].append({
-                "medicine_id": item.medicine_id,
-                "medicine_name": item.medicine.name,
-                "quantity": item.quantity,
-                "unit_price": item.unit_price,
-                "total_price": item.total_price
-            })
-        
-        result.append(order_data)
+    query = apply_order_filters(query, filters.model_copy(update={"branch_id": branch_scope}))
+    query = query.order_by(Order.created_at.desc()).offset(skip).limit(limit)
     
-    return result
+    # Rows are already in the response shape; skip re-validating every order
+    return ORJSONResponse(_orders_with_items(db, query))
 
 
-@router.get("/{order_id}", response_model=dict)
+@router.get("/{order_id}", response_model=OrderResponse)
+@response_cache.cached(OrderResponse, tags=("order:{order_id}",))
 def get_order(
     order_id: int,
+    branch_scope: Optional[int] = Depends(get_branch_scope),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get a specific order"""
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
+    """Get a specific order; staff only see their branch's"""
+    query = db.query(*ORDER_COLUMNS, Order.customer_id).filter(Order.id == order_id)
+    if branch_scope is not None:
+        query = query.filter(Order.branch_id == branch_scope)
+    orders = _orders_with_items(db, query)
+    if not orders:
         raise HTTPException(status_code=404, detail="Order not found")
     
+    order = orders[0]
+    
     # Check if user can access this order
-    if current_user.role.value not in ["admin", "pharmacist"] and order.customer_id != current_user.id:
+    if current_user.role.value not in ["admin", "pharmacist"] and order["customer_id"] != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    order_data = {
-        "id": order.id,
-        "order_number": order.order_number,
-        "status": order.status,
-        "total_amount": order.total_amount,
-        "shipping_address": order.shipping_address,
-        "notes": order.notes,
-        "created_at": order.created_at,
-        "updated_at": order.updated_at,
-        "items": []
-    }
-    
-    for item in order.order_items:
-        order_data["items"].append({
-            "medicine_id": item.medicine_id,
-            "medicine_name": item.medicine.name,
-            "quantity": item.quantity,
-            "unit_price": item.unit_price,
-            "total_price": item.total_price
-        })
-    
-    return order_data
+    return order
 
 
-@router.post("/", response_model=dict)
+@router.post("/", response_model=OrderCreateResponse)
 def create_order(
-    order_data: dict,
+    order_data: OrderCreate,
+    branch_id: int = Depends(get_current_branch),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Create a new order"""
+    """Create a new order.
+
+    The order, its items and the stock decrements are written in a single
+    transaction: medicines are locked in id order, items go in as one bulk
+    INSERT and stock is decremented with one UPDATE. Units come from the
+    soonest-expiring unexpired lots, and the allocations are recorded so a
+    cancellation returns them to the same lots.
+    """
     # Generate order number
     order_number = f"ORD-{datetime.now().strftime('%Y%m%d%H%M%S')}-{current_user.id}"
+    created_at = datetime.now(timezone.utc)
     
-    # Calculate total amount
-    total_amount = 0
-    items = order_data.get("items", [])
-    
-    for item in items:
-        medicine = db.query(Medicine).filter(Medicine.id == item["medicine_id"]).first()
-        if not medicine:
-            raise HTTPException(status_code=404, detail=f"Medicine {item['medicine_id']} not found")
-        
-        if medicine.stock < item["quantity"]:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient stock for {medicine.name}. Available: {medicine.stock}"
-            )
-        
-        item_total = medicine.price * item["quantity"]
-        total_amount += item_total
+    # The same medicine may appear on several lines
+    quantities = defaultdict(int)
+    for item in order_data.items:
+        quantities[item.medicine_id] += item.quantity
+    
+    medicines, stock, allocations = reserve_stock(db, branch_id, quantities)
+    low_stock = low_stock_crossings(medicines, branch_id, stock, quantities)
+    
+    item_rows = [
+        {
+            "medicine_id": item.medicine_id,
+            "quantity": item.quantity,
+            "unit_price": medicines[item.medicine_id].price,
+            "total_price": medicines[item.medicine_id].price * item.quantity,
+            "created_at": created_at,
+        }
+        for item in order_data.items
+    ]
     
     # Create order
     order = Order(
         customer_id=current_user.id,
+        branch_id=branch_id,
         order_number=order_number,
         status=OrderStatus.PENDING,
-        total_amount=total_amount,
-        shipping_address=order_data["shipping_address"],
-        notes=order_data.get("notes")
+        total_amount=sum(row["total_price"] for row in item_rows),
+        shipping_address=order_data.shipping_address,
+        notes=order_data.notes,
+        created_at=created_at
     )
     
     db.add(order)
-    db.commit()
-    db.refresh(order)
-    
-    # Create order items and update stock
-    for item in items:
-        medicine = db.query(Medicine).filter(Medicine.id == item["medicine_id"]).first()
-        
-        order_item = OrderItem(
-            order_id=order.id,
-            medicine_id=item["medicine_id"],
-            quantity=item["quantity"],
-            unit_price=medicine.price,
-            total_price=medicine.price * item["quantity"]
-        )
-        
-        db.add(order_item)
-        
-        # Update stock
-        medicine.stock -= item["quantity"]
+    db.flush()  # Get the order ID without committing
     
-    db.commit()
+    for row in item_rows:
+        row["order_id"] = order.id
+    db.execute(insert(OrderItem), item_rows)
+    record_order_allocations(db, order.id, allocations)
+    record_movements(
+        db, branch_id, {medicine_id: -quantity for medicine_id, quantity in quantities.items()}, "order",
+        user_id=current_user.id, order_id=order.id, created_at=created_at,
+    )
     
-    return {
+    created = {
         "id": order.id,
         "order_number": order.order_number,
         "status": order.status,
         "total_amount": order.total_amount,
-        "message": "Order created successfully"
     }
+    summary_changes = [
+        stock_change(medicine, branch_id, stock[medicine_id] + quantities[medicine_id], stock[medicine_id])
+        for medicine_id, medicine in medicines.items()
+    ]
+    
+    db.commit()
+    
+    response_cache.invalidate(*(f"medicine:{medicine_id}" for medicine_id in quantities))
+    inventory_summary.stock_changed(summary_changes)
+    broker.publish("order.created", {**created, "customer_id": current_user.id, "items": len(item_rows)}, user_id=current_user.id)
+    for payload in low_stock:
+        broker.publish("stock.low", payload)
+    
+    activity_log.log(
+        "order_created",
+        f"Order {order_number} placed",
+        user_id=current_user.id,
+        extra_data={"order_id": created["id"], "total_amount": created["total_amount"], "items": len(item_rows)},
+    )
+    log_stock_changes(
+        current_user.id, {medicine_id: -quantity for medicine_id, quantity in quantities.items()}, stock,
+        "order", order_id=created["id"], branch_id=branch_id,
+    )
+    
+    return {**created, "message": "Order created successfully"}
+
+
+def _change_order_status(
+    db: Session, order_ids: List[int], new_status: OrderStatus, changed_by: int, branch_scope: Optional[int]
+) -> List[dict]:
+    """Move orders to `new_status` where the transition rules allow it.
+
+    All eligible orders are switched with one UPDATE ... WHERE status IN
+    (allowed previous statuses), so concurrent requests cannot apply the same
+    transition twice. Orders outside `branch_scope` (None: every branch) are
+    reported as not found. Cancelled orders have their stock restored in the
+    same transaction. Returns one result per requested order id, in request order.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    in_scope = [Order.id.in_(order_ids)]
+    if branch_scope is not None:
+        in_scope.append(Order.branch_id == branch_scope)
+    
+    customers = dict(db.execute(
+        update(Order)
+        .where(*in_scope, Order.status.in_(allowed_previous_statuses(new_status)))
+        .values(status=new_status)
+        .returning(Order.id, Order.customer_id),
+        execution_options={"synchronize_session": False},
+    ).all())
+    updated_ids = set(customers)
+    
+    restocks = []
+    if new_status == OrderStatus.CANCELLED:
+        restocks = restore_order_stock(db, sorted(updated_ids), changed_by)
+    
+    db.commit()
+    
+    response_cache.invalidate(
+        *(f"order:{order_id}" for order_id in customers),
+        *{f"medicine:{medicine_id}" for _, _, medicine_id, _, _ in restocks},
+    )
+    if restocks:
+        inventory_summary.invalidate()
+    for order_id, branch_id, medicine_id, quantity, stock in restocks:
+        log_stock_changes(
+            changed_by, {medicine_id: quantity}, {medicine_id: stock},
+            "order_cancelled", order_id=order_id, branch_id=branch_id,
+        )
+    
+    for order_id, customer_id in customers.items():
+        broker.publish(
+            "order.status_changed",
+            {"id": order_id, "status": new_status, "customer_id": customer_id},
+            user_id=customer_id,
+        )
+        activity_log.log(
+            "order_status_changed",
+            f"Order {order_id} marked {new_status.value}",
+            user_id=changed_by,
+            extra_data={"order_id": order_id, "status": new_status.value, "stock_restored": new_status == OrderStatus.CANCELLED},
+        )
+    
+    # Explain why the remaining orders were left alone
+    skipped = [order_id for order_id in order_ids if order_id not in updated_ids]
+    current = dict(db.query(Order.id, Order.status).filter(*in_scope, Order.id.in_(skipped))) if skipped else {}
+    
+    results = []
+    for order_id in order_ids:
+        if order_id in updated_ids:
+            results.append({"order_id": order_id, "updated": True, "status": new_status})
+        elif order_id not in current:
+            results.append({"order_id": order_id, "updated": False, "status": None, "detail": "Order not found"})
+        else:
+            status_now = current[order_id]
+            results.append({
+                "order_id": order_id,
+                "updated": False,
+                "status": status_now,
+                "detail": f"Cannot change order status from {status_now.value} to {new_status.value}"
+            })
+    return results
+
+
+@router.patch("/bulk/status", response_model=BulkOrderStatusResponse)
+def bulk_update_order_status(
+    status_data: BulkOrderStatusUpdate,
+    branch_scope: Optional[int] = Depends(get_branch_scope),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("pharmacist"))
+):
+    """Apply one status change to many orders (pharmacist only).
+
+    Orders whose current status does not allow the change, or that belong
+    to another branch than the caller's, are reported in the results rather
+    than failing the whole request.
+    """
+    results = _change_order_status(db, status_data.order_ids, status_data.status, current_user.id, branch_scope)
+    return {"updated": sum(result["updated"] for result in results), "results": results}
 
 
 @router.patch("/{order_id}/status", response_model=dict)
 def update_order_status(
     order_id: int,
-    status_data: dict,
+    status_data: OrderStatusUpdate,
+    branch_scope: Optional[int] = Depends(get_branch_scope),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_role("pharmacist"))
 ):
-    """Update order status (pharmacist only)"""
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
+    """Update order status (pharmacist only); staff only change their branch's orders"""
+    result = _change_order_status(db, [order_id], status_data.status, current_user.id, branch_scope)[0]
+    if result["status"] is None:
         raise HTTPException(status_code=404, detail="Order not found")
+    if not result["updated"]:
+        raise HTTPException(status_code=400, detail=result["detail"])
     
-    new_status = status_data.get("status")
-    if new_status not in [status.value for status in OrderStatus]:
-        raise HTTPException(status_code=400, detail="Invalid status")
-    
-    order.status = new_status
-    db.commit()
-    
-    return {"message": f"Order status updated to {new_status}"}
-
+    return {"message": f"Order status updated to {status_data.status.value}"}
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+
+from app.core.auth import require_role
+from app.core.config import settings
+from app.core.profiler import profiler
+from app.models.user import User
+from app.schemas.profiler import ProfileJob, ProfileJobCreate, ProfilerStatus
+
+router = APIRouter()
+
+
+@router.get("/", response_model=ProfilerStatus)
+def get_profiler_status(current_user: User = Depends(require_role("admin"))):
+    """Armed jobs in this worker and stored profiles (admin only)"""
+    return {
+        "enabled": settings.PROFILER_ENABLED,
+        "jobs": profiler.jobs(),
+        "profiles": profiler.profiles(),
+    }
+
+
+@router.post("/", response_model=ProfileJob, status_code=status.HTTP_201_CREATED)
+def arm_profiler(job: ProfileJobCreate, current_user: User = Depends(require_role("admin"))):
+    """Profile the next requests matching a route and/or X-Profile-Token header (admin only)"""
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Profiler is disabled")
+    return profiler.arm(job.count, job.route, job.method, job.token).to_dict()
+
+
+@router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
+def disarm_profiler(current_user: User = Depends(require_role("admin"))):
+    """Cancel all armed jobs (admin only)"""
+    profiler.disarm()
+
+
+@router.get("/{filename}")
+def download_profile(filename: str, current_user: User = Depends(require_role("admin"))):
+    """Download a stored .pstats or .collapsed file (admin only)"""
+    path = profiler.file(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=filename, media_type="application/octet-stream")
@@ -1,178 +1,255 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Query, Session
+from typing import List, Optional
+from collections import defaultdict
+from datetime import datetime, timezone
 
 from app.core.database import get_db
 from app.core.auth import get_current_active_user
+from app.core.activity_log import activity_log
+from app.core.branches import get_branch_scope, get_current_branch
+from app.core.cache import response_cache
+from app.core.partitions import is_partitioned_cached
+from app.core.metrics import sales_amount, sales_completed
+from app.core.events import broker
 from app.models.user import User
 from app.models.sale import Sale, SaleItem
 from app.models.medicine import Medicine
-from app.schemas.sale import SaleCreate, SaleResponse, SaleItemResponse
+from app.schemas.sale import SaleCreate, SaleResponse, SaleFilter
+from app.services.inventory import reserve_stock, low_stock_crossings, log_stock_changes
+from app.services.inventory_summary import inventory_summary, stock_change
+from app.services.stock_ledger import record_movements
 
 router = APIRouter()
 
 
+SALE_COLUMNS = (
+    Sale.id,
+    Sale.sale_number,
+    Sale.branch_id,
+    Sale.customer_name,
+    Sale.total_amount,
+    Sale.payment_method,
+    Sale.notes,
+    Sale.created_at,
+)
+
+SALE_ITEM_FIELDS = ("id", "medicine_id", "medicine_name", "quantity", "unit_price", "total_price", "discount")
+SALE_ITEM_COLUMNS = (
+    SaleItem.sale_id,
+    SaleItem.id,
+    SaleItem.medicine_id,
+    Medicine.name,
+    SaleItem.quantity,
+    SaleItem.unit_price,
+    SaleItem.total_price,
+    SaleItem.discount,
+)
+
+
+def _sales_with_items(db: Session, query: Query) -> List[dict]:
+    """Run a Sale column query and attach items, building plain dicts from rows.
+
+    Items for every sale on the page come back in one joined query instead
+    of a lazy load per sale and per item.
+    """
+    sales = [dict(row._mapping) for row in query]
+    by_id = {}
+    for sale in sales:
+        sale["items"] = []
+        by_id[sale["id"]] = sale
+
+    if by_id:
+        items = (
+            db.query(*SALE_ITEM_COLUMNS)
+            .join(Medicine, Medicine.id == SaleItem.medicine_id)
+            .filter(SaleItem.sale_id.in_(by_id))
+            .order_by(SaleItem.id)
+        )
+        # Partitioned items reference their sale by (id, created_at), so they
+        # share its created_at; bounding it lets Postgres skip monthly
+        # partitions outside the page. Unpartitioned items may not match.
+        created = [sale["created_at"] for sale in sales if sale["created_at"] is not None]
+        if len(created) == len(sales) and is_partitioned_cached(db.connection(), "sale_items"):
+            items = items.filter(SaleItem.created_at.between(min(created), max(created)))
+        for sale_id, *values in items:
+            by_id[sale_id]["items"].append(dict(zip(SALE_ITEM_FIELDS, values)))
+
+    return sales
+
+
+def _like_prefix(value: str) -> str:
+    """Build a LIKE pattern matching values starting with `value` literally"""
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+def apply_sale_filters(query: Query, filters: SaleFilter) -> Query:
+    """Apply list filters to a Sale query.
+
+    Each filter is written so it can be answered from one of the indexes
+    declared on Sale/SaleItem (see app/models/sale.py).
+    """
+    if filters.created_from is not None:
+        query = query.filter(Sale.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.filter(Sale.created_at < filters.created_to)
+    if filters.payment_method:
+        query = query.filter(Sale.payment_method == filters.payment_method)
+    if filters.user_id is not None:
+        query = query.filter(Sale.user_id == filters.user_id)
+    if filters.branch_id is not None:
+        query = query.filter(Sale.branch_id == filters.branch_id)
+    if filters.customer_name:
+        query = query.filter(
+            func.lower(Sale.customer_name).like(
+                _like_prefix(filters.customer_name.lower()), escape="\\"
+            )
+        )
+    if filters.medicine_id is not None:
+        query = query.filter(
+            Sale.id.in_(
+                select(SaleItem.sale_id).where(SaleItem.medicine_id == filters.medicine_id)
+            )
+        )
+    if filters.min_total is not None:
+        query = query.filter(Sale.total_amount >= filters.min_total)
+    if filters.max_total is not None:
+        query = query.filter(Sale.total_amount <= filters.max_total)
+    return query
+
+
 @router.post("/", response_model=SaleResponse)
 def create_sale(
     sale_data: SaleCreate,
+    branch_id: int = Depends(get_current_branch),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Create a new sale and decrease medicine stock"""
-    
-    # Validate all items have sufficient stock
+    """Create a new sale and decrease medicine stock.
+
+    Medicines are locked and decremented through reserve_stock, which takes
+    the units from the soonest-expiring unexpired lots, and the sale items go
+    in as one bulk INSERT, all in a single transaction.
+    """
+    # The same medicine may appear on several lines
+    quantities = defaultdict(int)
     for item in sale_data.items:
-        medicine = db.query(Medicine).filter(Medicine.id == item.medicine_id).first()
-        if not medicine:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Medicine with ID {item.medicine_id} not found"
-            )
-        
-        if medicine.stock < item.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient stock for {medicine.name}. Available: {medicine.stock}, Requested: {item.quantity}"
-            )
+        quantities[item.medicine_id] += item.quantity
+    
+    medicines, stock, _ = reserve_stock(db, branch_id, quantities)
+    low_stock = low_stock_crossings(medicines, branch_id, stock, quantities)
     
     # Generate sale number
     sale_number = f"SALE-{datetime.now().strftime('%Y%m%d%H%M%S')}-{current_user.id}"
+    created_at = datetime.now(timezone.utc)
     
-    # Calculate total amount
-    total_amount = 0
-    for item in sale_data.items:
-        item_total = (item.unit_price * item.quantity) - item.discount
-        total_amount += item_total
+    item_rows = [
+        {
+            "medicine_id": item.medicine_id,
+            "quantity": item.quantity,
+            "unit_price": item.unit_price,
+            "total_price": (item.unit_price * item.quantity) - item.discount,
+            "discount": item.discount,
+            "created_at": created_at,
+        }
+        for item in sale_data.items
+    ]
     
     # Create sale
     sale = Sale(
         sale_number=sale_number,
         user_id=current_user.id,
+        branch_id=branch_id,
         customer_name=sale_data.customer_name,
-        total_amount=total_amount,
+        total_amount=sum(row["total_price"] for row in item_rows),
         payment_method=sale_data.payment_method,
-        notes=sale_data.notes
+        notes=sale_data.notes,
+        created_at=created_at
     )
     
     db.add(sale)
     db.flush()  # Get the sale ID without committing
     
-    # Create sale items and update stock
-    for item in sale_data.items:
-        medicine = db.query(Medicine).filter(Medicine.id == item.medicine_id).first()
-        
-        sale_item = SaleItem(
-            sale_id=sale.id,
-            medicine_id=item.medicine_id,
-            quantity=item.quantity,
-            unit_price=item.unit_price,
-            total_price=(item.unit_price * item.quantity) - item.discount,
-            discount=item.discount
-        )
-        
-        db.add(sale_item)
-        
-        # Decrease stock
-        medicine.stock -= item.quantity
+    for row in item_rows:
+        row["sale_id"] = sale.id
+    db.execute(insert(SaleItem), item_rows)
+    record_movements(
+        db, branch_id, {medicine_id: -quantity for medicine_id, quantity in quantities.items()}, "sale",
+        user_id=current_user.id, sale_id=sale.id, created_at=created_at,
+    )
     
+    sale_id = sale.id
+    summary_changes = [
+        stock_change(medicine, branch_id, stock[medicine_id] + quantities[medicine_id], stock[medicine_id])
+        for medicine_id, medicine in medicines.items()
+    ]
     db.commit()
-    db.refresh(sale)
+    response_cache.invalidate(*(f"medicine:{medicine_id}" for medicine_id in quantities))
+    inventory_summary.stock_changed(summary_changes)
+    
+    response = _sales_with_items(db, db.query(*SALE_COLUMNS).filter(Sale.id == sale_id))[0]
     
-    # Format response
-    items_response = []
-    for sale_item in sale.sale_items:
-        items_response.append(SaleItemResponse(
-            id=sale_item.id,
-            medicine_id=sale_item.medicine_id,
-            medicine_name=sale_item.medicine.name,
-            quantity=sale_item.quantity,
-            unit_price=sale_item.unit_price,
-            total_price=sale_item.total_price,
-            discount=sale_item.discount
-        ))
+    broker.publish("sale.completed", {
+        "id": sale_id,
+        "sale_number": sale_number,
+        "user_id": current_user.id,
+        "total_amount": response["total_amount"],
+        "payment_method": sale_data.payment_method,
+        "items": len(item_rows),
+    })
+    for payload in low_stock:
+        broker.publish("stock.low", payload)
     
-    return SaleResponse(
-        id=sale.id,
-        sale_number=sale.sale_number,
-        customer_name=sale.customer_name,
-        total_amount=sale.total_amount,
-        payment_method=sale.payment_method,
-        notes=sale.notes,
-        created_at=sale.created_at,
-        items=items_response
+    sales_completed.inc()
+    sales_amount.inc(amount=float(response["total_amount"]))
+    activity_log.log(
+        "sale_completed",
+        f"Sale {sale_number} completed",
+        user_id=current_user.id,
+        extra_data={"sale_id": sale_id, "total_amount": response["total_amount"], "items": len(item_rows)},
+    )
+    log_stock_changes(
+        current_user.id, {medicine_id: -quantity for medicine_id, quantity in quantities.items()}, stock,
+        "sale", sale_id=sale_id, branch_id=branch_id,
     )
+    
+    return response
 
 
 @router.get("/", response_model=List[SaleResponse])
 def get_sales(
     skip: int = 0,
     limit: int = 100,
+    filters: SaleFilter = Depends(),
+    branch_scope: Optional[int] = Depends(get_branch_scope),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get all sales"""
-    sales = db.query(Sale).order_by(Sale.created_at.desc()).offset(skip).limit(limit).all()
-    
-    result = []
-    for sale in sales:
-        items_response = []
-        for sale_item in sale.sale_items:
-            items_response.append(SaleItemResponse(
-                id=sale_item.id,
-                medicine_id=sale_item.medicine_id,
-                medicine_name=sale_item.medicine.name,
-                quantity=sale_item.quantity,
-                unit_price=sale_item.unit_price,
-                total_price=sale_item.total_price,
-                discount=sale_item.discount
-            ))
-        
-        result.append(SaleResponse(
-            id=sale.id,
-            sale_number=sale.sale_number,
-            customer_name=sale.customer_name,
-            total_amount=sale.total_amount,
-            payment_method=sale.payment_method,
-            notes=sale.notes,
-            created_at=sale.created_at,
-            items=items_response
-        ))
+    """Get the branch's sales, newest first, with optional filtering"""
+    filters = filters.model_copy(update={"branch_id": branch_scope})
+    query = apply_sale_filters(db.query(*SALE_COLUMNS), filters)
+    query = query.order_by(Sale.created_at.desc()).offset(skip).limit(limit)
     
-    return result
+    # Rows are already in the response shape; skip re-validating every sale
+    return ORJSONResponse(_sales_with_items(db, query))
 
 
 @router.get("/{sale_id}", response_model=SaleResponse)
+@response_cache.cached(SaleResponse, tags=("sale:{sale_id}",), scope="shared")
 def get_sale(
     sale_id: int,
+    branch_scope: Optional[int] = Depends(get_branch_scope),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get a specific sale by ID"""
-    sale = db.query(Sale).filter(Sale.id == sale_id).first()
-    if not sale:
+    """Get a specific sale by ID; staff only see their branch's"""
+    query = db.query(*SALE_COLUMNS).filter(Sale.id == sale_id)
+    if branch_scope is not None:
+        query = query.filter(Sale.branch_id == branch_scope)
+    sales = _sales_with_items(db, query)
+    if not sales:
         raise HTTPException(status_code=404, detail="Sale not found")
-    
-    items_response = []
-    for sale_item in sale.sale_items:
-        items_response.append(SaleItemResponse(
-            id=sale_item.id,
-            medicine_id=sale_item.medicine_id,
-            medicine_name=sale_item.medicine.name,
-            quantity=sale_item.quantity,
-            unit_price=sale_item.unit_price,
-            total_price=sale_item.total_price,
-            discount=sale_item.discount
-        ))
-    
-    return SaleResponse(
-        id=sale.id,
-        sale_number=sale.sale_number,
-        customer_name=sale.customer_name,
-        total_amount=sale.total_amount,
-        payment_method=sale.payment_method,
-        notes=sale.notes,
-        created_at=sale.created_at,
-        items=items_response
-    )
-
+    return sales[0]
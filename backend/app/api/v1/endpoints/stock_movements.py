@@ -0,0 +1,159 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Query as OrmQuery, Session
+
+from app.core.auth import require_role
+from app.core.branches import get_current_branch
+from app.core.database import get_db
+from app.models.medicine import Medicine
+from app.models.stock_movement import StockMovement
+from app.models.user import User
+from app.schemas.stock_movement import StockLevels, StockMovementFilter, StockMovementPage, StockMovementReport
+from app.services.stock_ledger import stock_levels
+
+router = APIRouter()
+
+MOVEMENT_COLUMNS = (
+    StockMovement.id,
+    StockMovement.branch_id,
+    StockMovement.medicine_id,
+    StockMovement.change,
+    StockMovement.reason,
+    StockMovement.user_id,
+    StockMovement.sale_id,
+    StockMovement.order_id,
+    StockMovement.created_at,
+)
+
+
+def apply_movement_filters(query: OrmQuery, filters: StockMovementFilter) -> OrmQuery:
+    """Apply StockMovementFilter to a query over StockMovement"""
+    if filters.medicine_id is not None:
+        query = query.filter(StockMovement.medicine_id == filters.medicine_id)
+    if filters.reason:
+        query = query.filter(StockMovement.reason == filters.reason)
+    if filters.sale_id is not None:
+        query = query.filter(StockMovement.sale_id == filters.sale_id)
+    if filters.order_id is not None:
+        query = query.filter(StockMovement.order_id == filters.order_id)
+    if filters.created_from:
+        query = query.filter(StockMovement.created_at >= filters.created_from)
+    if filters.created_to:
+        query = query.filter(StockMovement.created_at <= filters.created_to)
+    return query
+
+
+@router.get("/", response_model=StockMovementPage)
+def get_stock_movements(
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    filters: StockMovementFilter = Depends(),
+    branch_id: int = Depends(get_current_branch),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("pharmacist"))
+):
+    """The branch's stock ledger, newest first, with optional filtering (pharmacist only).
+
+    Pages are keyed on the movement id: pass the returned `next_cursor` as
+    `cursor` to continue.
+    """
+    query = apply_movement_filters(
+        db.query(*MOVEMENT_COLUMNS).filter(StockMovement.branch_id == branch_id), filters
+    )
+    if cursor is not None:
+        query = query.filter(StockMovement.id < cursor)
+
+    # One extra row tells whether there is a next page
+    rows = query.order_by(StockMovement.id.desc()).limit(limit + 1).all()
+    items = [dict(row._mapping) for row in rows[:limit]]
+    next_cursor = items[-1]["id"] if len(rows) > limit else None
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
+
+
+@router.get("/levels/", response_model=StockLevels)
+def get_stock_levels(
+    at: Optional[datetime] = None,
+    medicine_id: List[int] = Query([]),
+    branch_id: int = Depends(get_current_branch),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("pharmacist"))
+):
+    """The branch's stock of the given medicines (default: all) as of `at`, from the ledger (pharmacist only).
+
+    Read from each medicine's latest snapshot taken by `at` plus the
+    movements after it. Without `at`, the current ledger totals.
+    """
+    levels = stock_levels(db, at, medicine_id or None, branch_id)
+    for missing in set(medicine_id) - set(levels):
+        levels[missing] = 0
+    return {"branch_id": branch_id, "at": at, "items": [{"medicine_id": key, "stock": levels[key]} for key in sorted(levels)]}
+
+
+@router.get("/report/", response_model=StockMovementReport)
+def get_stock_movement_report(
+    start: datetime,
+    end: Optional[datetime] = None,
+    category: Optional[str] = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    branch_id: int = Depends(get_current_branch),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("pharmacist"))
+):
+    """The branch's opening stock, movements by reason and closing stock per active medicine over [start, end] (pharmacist only).
+
+    Opening stock comes from the snapshots (see GET /levels/); only the
+    movements inside the period are read.
+    """
+    end = end or datetime.now(timezone.utc)
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+    query = db.query(Medicine.id, Medicine.name).filter(Medicine.is_active == True)
+    if category:
+        query = query.filter(Medicine.category == category)
+    medicines = query.order_by(Medicine.id).offset(skip).limit(limit).all()
+    ids = [medicine.id for medicine in medicines]
+
+    opening = stock_levels(db, start, ids, branch_id) if ids else {}
+    by_reason = defaultdict(dict)
+    received, removed = defaultdict(int), defaultdict(int)
+    if ids:
+        rows = db.execute(
+            select(
+                StockMovement.medicine_id,
+                StockMovement.reason,
+                func.sum(case((StockMovement.change > 0, StockMovement.change), else_=0)),
+                func.sum(case((StockMovement.change < 0, -StockMovement.change), else_=0)),
+            )
+            .where(
+                StockMovement.branch_id == branch_id,
+                StockMovement.medicine_id.in_(ids),
+                StockMovement.created_at > start,
+                StockMovement.created_at <= end,
+            )
+            .group_by(StockMovement.medicine_id, StockMovement.reason)
+        )
+        for medicine_id, reason, added, taken in rows:
+            by_reason[medicine_id][reason] = added - taken
+            received[medicine_id] += added
+            removed[medicine_id] += taken
+
+    items = []
+    for medicine_id, name in medicines:
+        start_stock = opening.get(medicine_id, 0)
+        items.append({
+            "medicine_id": medicine_id,
+            "name": name,
+            "opening": start_stock,
+            "received": received[medicine_id],
+            "removed": removed[medicine_id],
+            "closing": start_stock + received[medicine_id] - removed[medicine_id],
+            "by_reason": by_reason[medicine_id],
+        })
+    return {"branch_id": branch_id, "start": start, "end": end, "items": items}
@@ -4,13 +4,16 @@ from typing import List
 
 from app.core.database import get_db
 from app.core.auth import get_current_active_user, require_role
+from app.core.cache import response_cache
+from app.models.branch import Branch
 from app.models.user import User
-from app.schemas.user import User as UserSchema, UserUpdate
+from app.schemas.user import User as UserSchema, UserAdminUpdate, UserUpdate
 
 router = APIRouter()
 
 
 @router.get("/me", response_model=UserSchema)
+@response_cache.cached(UserSchema, tags=("user:{current_user.id}",))
 def get_current_user_info(current_user: User = Depends(get_current_active_user)):
     """Get current user information"""
     return current_user
@@ -29,6 +32,7 @@ def update_current_user(
     
     db.commit()
     db.refresh(current_user)
+    response_cache.invalidate(f"user:{current_user.id}")
     return current_user
 
 
@@ -45,6 +49,7 @@ def get_users(
 
 
 @router.get("/{user_id}", response_model=UserSchema)
+@response_cache.cached(UserSchema, tags=("user:{user_id}",), scope="shared")
 def get_user(
     user_id: int,
     db: Session = Depends(get_db),
@@ -60,21 +65,24 @@ def get_user(
 @router.put("/{user_id}", response_model=UserSchema)
 def update_user(
     user_id: int,
-    user_update: UserUpdate,
+    user_update: UserAdminUpdate,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_role("admin"))
 ):
-    """Update a user (admin only)"""
+    """Update a user (admin only); `branch_id` assigns staff to a branch"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     update_data = user_update.dict(exclude_unset=True)
+    if update_data.get("branch_id") is not None and not db.get(Branch, update_data["branch_id"]):
+        raise HTTPException(status_code=404, detail="Branch not found")
     for field, value in update_data.items():
         setattr(user, field, value)
     
     db.commit()
     db.refresh(user)
+    response_cache.invalidate(f"user:{user_id}")
     return user
 
 
@@ -91,5 +99,6 @@ def delete_user(
     
     user.is_active = False
     db.commit()
+    response_cache.invalidate(f"user:{user_id}")
     return {"message": "User deactivated successfully"}
 
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.database import engine
+from app.models.activity import Activity
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+
+class ActivityLogger:
+    """Buffered writer for the `activities` audit trail.
+
+    Request handlers call `log()`, which only appends to an in-memory queue.
+    A background thread writes the queue with one multi-row INSERT every
+    `flush_interval` seconds, or as soon as `batch_size` entries are waiting.
+    The queue holds at most `max_queue` entries; when it is full `policy`
+    decides what happens:
+
+    - ``drop_newest``: the new entry is discarded
+    - ``drop_oldest``: the oldest queued entry is discarded
+    - ``block``: the caller waits up to `block_timeout` seconds for room,
+      then the new entry is discarded
+
+    Entries are timestamped when logged, not when written. A failed flush is
+    logged and its entries are counted as failed; they are not retried.
+    """
+
+    def __init__(
+        self,
+        bind: Engine,
+        batch_size: int,
+        flush_interval: float,
+        max_queue: int,
+        policy: str = "drop_newest",
+        block_timeout: float = 0.1,
+    ):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown activity log overflow policy: {policy}")
+        self.bind = bind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self._queue: Deque[dict] = deque()
+        self._lock = threading.Condition()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def log(
+        self,
+        activity_type: str,
+        message: str,
+        user_id: Optional[int] = None,
+        medicine_id: Optional[int] = None,
+        extra_data: Optional[dict] = None,
+    ) -> bool:
+        """Queue an activity; returns False if it was dropped"""
+        entry = {
+            "activity_type": activity_type,
+            "message": message,
+            "user_id": user_id,
+            "medicine_id": medicine_id,
+            "extra_data": extra_data,
+            "created_at": datetime.now(timezone.utc),
+        }
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                if self.policy == "drop_oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif self.policy == "block":
+                    self._lock.wait_for(lambda: len(self._queue) < self.max_queue, self.block_timeout)
+                if len(self._queue) >= self.max_queue:
+                    self.dropped += 1
+                    return False
+            self._queue.append(entry)
+            self.enqueued += 1
+            if len(self._queue) >= self.batch_size:
+                self._lock.notify_all()
+        return True
+
+    def start(self) -> None:
+        """Start the flush thread (called from the application lifespan)"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flush thread after writing everything still queued"""
+        self._stopping.set()
+        with self._lock:
+            self._lock.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> int:
+        """Write everything queued right now; returns the number of rows written"""
+        written = 0
+        while True:
+            batch = self._take(wait=False)
+            if not batch:
+                return written
+            written += self._write(batch)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self._queue),
+            "max_queue": self.max_queue,
+            "policy": self.policy,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+        }
+
+    def _take(self, wait: bool) -> List[dict]:
+        with self._lock:
+            if wait and len(self._queue) < self.batch_size and not self._stopping.is_set():
+                self._lock.wait(self.flush_interval)
+            count = min(len(self._queue), self.batch_size)
+            batch = [self._queue.popleft() for _ in range(count)]
+            if batch:
+                # Wake callers blocked on a full queue
+                self._lock.notify_all()
+        return batch
+
+    def _write(self, batch: List[dict]) -> int:
+        started = time.perf_counter()
+        try:
+            with self.bind.begin() as connection:
+                connection.execute(insert(Activity).values(batch))
+        except Exception:
+            logger.exception("Failed to write %d activity log entries", len(batch))
+            self.failed += len(batch)
+            return 0
+        elapsed = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.written += len(batch)
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self._total_flush_ms += elapsed
+        return len(batch)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            batch = self._take(wait=True)
+            if batch:
+                self._write(batch)
+
+
+activity_log = ActivityLogger(
+    engine,
+    batch_size=settings.ACTIVITY_LOG_BATCH_SIZE,
+    flush_interval=settings.ACTIVITY_LOG_FLUSH_MS / 1000,
+    max_queue=settings.ACTIVITY_LOG_MAX_QUEUE,
+    policy=settings.ACTIVITY_LOG_OVERFLOW,
+    block_timeout=settings.ACTIVITY_LOG_BLOCK_MS / 1000,
+)
@@ -1,20 +1,18 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from typing import Optional
+from app.core.database import get_db, SessionLocal
 from app.core.security import verify_token
 from app.models.user import User
 from app.schemas.user import User as UserSchema
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get the current authenticated user"""
-    token = credentials.credentials
+def authenticate_token(token: str, db: Session) -> User:
+    """Resolve a bearer token to an active user"""
     payload = verify_token(token)
     
     user = db.query(User).filter(User.email == payload.get("sub")).first()
@@ -34,6 +32,35 @@ def get_current_user(
     return user
 
 
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get the current authenticated user"""
+    return authenticate_token(credentials.credentials, db)
+
+
+def get_stream_user(
+    token: Optional[str] = Query(None, description="Access token, for clients that cannot set headers (EventSource)"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+) -> User:
+    """Authenticate a long-lived streaming connection.
+
+    Accepts the usual Authorization header or a `token` query parameter, and
+    releases its database session straight away so an open stream does not
+    hold a pooled connection.
+    """
+    raw_token = credentials.credentials if credentials else token
+    if not raw_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    with SessionLocal() as db:
+        return authenticate_token(raw_token, db)
+
+
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Get the current active user"""
     if not current_user.is_active:
@@ -0,0 +1,67 @@
+"""
+Branch context of a request.
+
+Stock, sales, orders and stock reports are kept per branch. Endpoints take
+`branch_id: int = Depends(get_current_branch)`: staff act for the branch
+they are assigned to, while admins and users without a branch (customers)
+may pick one with `?branch_id=` and otherwise get the default branch
+(DEFAULT_BRANCH_CODE). Reads of sales and orders take
+`Depends(get_branch_scope)` instead, which also allows admins a view across
+every branch.
+"""
+
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from app.core.auth import get_current_active_user
+from app.core.config import settings
+from app.core.database import get_db
+from app.models.branch import Branch
+from app.models.user import User, UserRole
+
+_default_branch_id: Optional[int] = None
+
+
+def default_branch_id(db: Session) -> int:
+    """Id of the DEFAULT_BRANCH_CODE branch, looked up once per process"""
+    global _default_branch_id
+    if _default_branch_id is None:
+        branch_id = db.query(Branch.id).filter(Branch.code == settings.DEFAULT_BRANCH_CODE).scalar()
+        if branch_id is None:
+            raise RuntimeError(f"Default branch {settings.DEFAULT_BRANCH_CODE!r} does not exist; run the migrations")
+        _default_branch_id = branch_id
+    return _default_branch_id
+
+
+def get_current_branch(
+    branch_id: Optional[int] = Query(None, description="Branch to act for; defaults to your own"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+) -> int:
+    """The branch a request acts for"""
+    own = current_user.branch_id
+    if branch_id is None or branch_id == own:
+        return own if own is not None else default_branch_id(db)
+    if own is not None and current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to act for another branch")
+    if not db.query(Branch.id).filter(Branch.id == branch_id, Branch.is_active == True).first():
+        raise HTTPException(status_code=404, detail="Branch not found")
+    return branch_id
+
+
+def get_branch_scope(
+    branch_id: Optional[int] = Query(None, description="Branch to act for; defaults to your own"),
+    current_branch: int = Depends(get_current_branch),
+    current_user: User = Depends(get_current_active_user)
+) -> Optional[int]:
+    """The branch a read is limited to, or None for every branch.
+
+    Staff with a branch only see their own (403 for another, as in
+    get_current_branch). Admins and users without a branch see every branch
+    unless they pass `?branch_id=`.
+    """
+    if branch_id is None and (current_user.branch_id is None or current_user.role == UserRole.ADMIN):
+        return None
+    return current_branch
@@ -0,0 +1,368 @@
+"""
+Response cache for read-heavy GET endpoints.
+
+`@response_cache.cached(Model, tags=(...))` goes under the route decorator.
+Entries are keyed on the endpoint, its parameters (path, query and filter
+models) and, depending on `scope`, the current user's id or role.
+Dependencies such as authentication and the DB session still run on every
+request, so access checks are unchanged; a hit skips the endpoint body and
+response serialization.
+
+Entries carry tags such as `order:42`, formatted from the endpoint's
+parameters. Write endpoints call `response_cache.invalidate(...)` with the
+tags they touched after committing. Invalidation bumps a version per tag and
+entries remember the versions they were computed under, so a response
+computed while a write was committing is never served. Entries also expire
+after RESPONSE_CACHE_TTL seconds, which bounds staleness for changes no tag
+covers (e.g. a medicine renamed while orders listing it are cached).
+
+Batch endpoints serve many single-item calls at once with
+`response_cache.cached_items(...)`, which reads and fills the entries of the
+single-item endpoint, so both share one cache.
+
+Backends: "memory" (LRU per worker; invalidations reach the other workers
+over the event bus) or "redis" (shared by every worker, needs the `redis`
+package). Hits and misses are counted per endpoint in
+lipms_cache_requests_total{cache="response:<endpoint>"}.
+"""
+
+import functools
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import orjson
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.event_bus import EventBus, RESYNC_CHANNEL, event_bus
+from app.core.metrics import record_cache
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+CACHE_CHANNEL = "cache"
+SCOPES = ("user", "role", "shared")
+
+
+class MemoryBackend:
+    """LRU of serialized responses in this process.
+
+    Tag versions are kept for the `max_tags` most recently invalidated tags.
+    A tag that was forgotten reads as the newest forgotten version, so
+    entries are only ever treated as staler than they are, never fresher.
+    """
+
+    shared = False
+
+    def __init__(self, max_entries: int, max_tags: int):
+        self.max_entries = max_entries
+        self.max_tags = max_tags
+        self._entries: "OrderedDict[str, Tuple[float, Tuple[str, ...], Tuple[int, ...], bytes]]" = OrderedDict()
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._clock = itertools.count(1)
+        self._horizon = 0
+        self._lock = threading.Lock()
+
+    def _version(self, tag: str) -> int:
+        return self._versions.get(tag, self._horizon)
+
+    def versions(self, tags: Sequence[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._version(tag) for tag in tags)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, tags, versions, body = entry
+            if expires <= time.monotonic() or any(self._version(tag) != version for tag, version in zip(tags, versions)):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def set(self, key: str, body: bytes, tags: Sequence[str], versions: Sequence[int], ttl: float) -> None:
+        with self._lock:
+            if any(self._version(tag) != version for tag, version in zip(tags, versions)):
+                return  # invalidated while the response was being computed
+            self._entries[key] = (time.monotonic() + ttl, tuple(tags), tuple(versions), body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = next(self._clock)
+                self._versions.move_to_end(tag)
+            while len(self._versions) > self.max_tags:
+                _, self._horizon = self._versions.popitem(last=False)
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return [self.get(key) for key in keys]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "entries": len(self._entries), "tags": len(self._versions)}
+
+
+class RedisBackend:
+    """Serialized responses in Redis, shared by every worker.
+
+    Tag versions are counters in Redis that outlive any entry computed under
+    them. Errors are logged and treated as misses, so a Redis outage slows
+    reads down instead of failing them.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, ttl: float, prefix: str = "lipms:cache:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis needs the redis package (pip install redis)")
+        self.prefix = prefix
+        # Versions must outlive every entry that recorded them, including
+        # entries stored by requests that started just before an invalidation
+        self.tag_ttl = int(ttl * 2) + 60
+        self._client = redis.Redis.from_url(url)
+        self.errors = 0
+
+    def _failed(self, action: str) -> None:
+        self.errors += 1
+        if self.errors == 1 or self.errors % 1000 == 0:
+            logger.exception("Response cache backend unavailable (%s)", action)
+
+    def _tag_keys(self, tags: Sequence[str]) -> List[str]:
+        return [f"{self.prefix}tag:{tag}" for tag in tags]
+
+    def versions(self, tags: Sequence[str]) -> Tuple[int, ...]:
+        if not tags:
+            return ()
+        try:
+            return tuple(int(value or 0) for value in self._client.mget(self._tag_keys(tags)))
+        except Exception:
+            self._failed("versions")
+            return (-1,) * len(tags)  # never matches, so nothing is stored
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            stored = self._client.get(self.prefix + key)
+            if stored is None:
+                return None
+            header, _, body = stored.partition(b"\n")
+            tags, versions = orjson.loads(header)
+            if tags and tuple(versions) != self.versions(tags):
+                return None
+            return body
+        except Exception:
+            self._failed("get")
+            return None
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        """Like `get` for several keys, in two round trips: the entries, then their tags' versions"""
+        try:
+            entries = []
+            for stored in self._client.mget([self.prefix + key for key in keys]):
+                if stored is None:
+                    entries.append(None)
+                    continue
+                header, _, body = stored.partition(b"\n")
+                tags, versions = orjson.loads(header)
+                entries.append((tags, versions, body))
+            tags = list({tag for entry in entries if entry for tag in entry[0]})
+            current = dict(zip(tags, self.versions(tags)))
+            return [
+                entry[2] if entry and all(current[tag] == version for tag, version in zip(*entry[:2])) else None
+                for entry in entries
+            ]
+        except Exception:
+            self._failed("get_many")
+            return [None] * len(keys)
+
+    def set(self, key: str, body: bytes, tags: Sequence[str], versions: Sequence[int], ttl: float) -> None:
+        if -1 in versions:
+            return
+        try:
+            header = orjson.dumps([list(tags), list(versions)])
+            self._client.set(self.prefix + key, header + b"\n" + body, px=int(ttl * 1000))
+        except Exception:
+            self._failed("set")
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        try:
+            pipeline = self._client.pipeline(transaction=False)
+            for tag_key in self._tag_keys(list(tags)):
+                pipeline.incr(tag_key)
+                pipeline.expire(tag_key, self.tag_ttl)
+            pipeline.execute()
+        except Exception:
+            self._failed("invalidate")
+
+    def clear(self) -> None:
+        """Nothing to do: entries are shared and were invalidated in Redis"""
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "errors": self.errors}
+
+
+def create_backend():
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        return RedisBackend(settings.RESPONSE_CACHE_REDIS_URL, settings.RESPONSE_CACHE_TTL)
+    if settings.RESPONSE_CACHE_BACKEND != "memory":
+        raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {settings.RESPONSE_CACHE_BACKEND}")
+    return MemoryBackend(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_MAX_ENTRIES * 4)
+
+
+def _param(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError
+
+
+def request_key(endpoint: str, scope: str, kwargs: Dict[str, object]) -> str:
+    """Key of an endpoint call: its parameters plus the caller's user id or role, per `scope`"""
+    params, owner = {}, ""
+    for name, value in kwargs.items():
+        if isinstance(value, User):
+            if scope == "user":
+                owner = f"user:{value.id}"
+            elif scope == "role":
+                owner = f"role:{value.role.value}"
+        elif not isinstance(value, Session):
+            params[name] = value
+    digest = hashlib.sha1(orjson.dumps(params, default=_param, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    return f"{endpoint}:{owner}:{digest}"
+
+
+def serialize(adapter: TypeAdapter, result) -> bytes:
+    """JSON body of an endpoint result, as FastAPI would render it for the response model"""
+    return adapter.dump_json(adapter.validate_python(result, from_attributes=True), by_alias=True)
+
+
+class ResponseCache:
+    def __init__(self, bus: EventBus, backend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self._bus = bus
+        bus.subscribe(CACHE_CHANNEL, self._receive)
+        bus.subscribe(RESYNC_CHANNEL, self._resync)
+
+    def cached(self, model, tags: Sequence[str] = (), scope: str = "user", ttl: Optional[float] = None) -> Callable:
+        """Cache a sync GET endpoint's responses, serialized as `model`.
+
+        `tags` are format strings over the endpoint's parameters, e.g.
+        "order:{order_id}" or "user:{current_user.id}". `scope` is "user"
+        (one entry per user), "role" (per role) or "shared" (any caller who
+        passes the endpoint's dependencies).
+        """
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown cache scope: {scope}")
+        adapter = TypeAdapter(model)
+
+        def decorator(func):
+            if not self.enabled:
+                return func
+            name = f"response:{func.__name__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = request_key(func.__name__, scope, kwargs)
+                body = self.backend.get(key)
+                record_cache(name, body is not None)
+                if body is not None:
+                    return Response(body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+                entry_tags = [tag.format(**kwargs) for tag in tags]
+                versions = self.backend.versions(entry_tags)
+                result = func(*args, **kwargs)
+                if isinstance(result, Response):
+                    return result  # already serialized; left uncached
+                body = serialize(adapter, result)
+                self.backend.set(key, body, entry_tags, versions, ttl or self.ttl)
+                return Response(body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+            return wrapper
+
+        return decorator
+
+    def cached_items(
+        self,
+        endpoint: Callable,
+        model,
+        calls: Sequence[Dict[str, object]],
+        load: Callable[[Sequence[Dict[str, object]]], Sequence[object]],
+        tags: Sequence[str] = (),
+        scope: str = "user",
+        ttl: Optional[float] = None,
+    ) -> List[Optional[bytes]]:
+        """Serialized results of several calls of a `cached` endpoint, sharing its entries.
+
+        `calls` are the endpoint's parameters, one dict per call, and `tags`
+        and `scope` must match its decorator. Entries are read in one batch;
+        `load(misses)` computes the calls that missed, returning a result or
+        None (nothing to cache, e.g. not found) per call, and those results
+        are stored for later single calls. Bodies come back in call order.
+        """
+        adapter = TypeAdapter(model)
+        if not self.enabled:
+            return [None if result is None else serialize(adapter, result) for result in load(calls)]
+        name = f"response:{endpoint.__name__}"
+
+        keys = [request_key(endpoint.__name__, scope, call) for call in calls]
+        bodies = self.backend.get_many(keys)
+        for body in bodies:
+            record_cache(name, body is not None)
+        misses = [i for i, body in enumerate(bodies) if body is None]
+        if not misses:
+            return bodies
+
+        entry_tags = [[tag.format(**calls[i]) for tag in tags] for i in misses]
+        versions = self.backend.versions([tag for item_tags in entry_tags for tag in item_tags])
+        results = load([calls[i] for i in misses])
+        for n, (i, result) in enumerate(zip(misses, results)):
+            if result is None:
+                continue
+            bodies[i] = serialize(adapter, result)
+            item_versions = versions[n * len(tags):(n + 1) * len(tags)]
+            self.backend.set(keys[i], bodies[i], entry_tags[n], item_versions, ttl or self.ttl)
+        return bodies
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop cached responses carrying any of `tags` in every worker; call after committing"""
+        if not self.enabled or not tags:
+            return
+        if self.backend.shared:
+            self.backend.invalidate(tags)
+        else:
+            self._bus.publish(CACHE_CHANNEL, {"tags": list(tags)})
+
+    def _receive(self, message: dict) -> None:
+        self.backend.invalidate(message["tags"])
+
+    def _resync(self, message: dict) -> None:
+        """Invalidations may have been missed while the bus was disconnected"""
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, **self.backend.stats()} if self.enabled else {"enabled": False}
+
+
+response_cache = ResponseCache(
+    event_bus,
+    backend=create_backend() if settings.RESPONSE_CACHE_ENABLED else None,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    enabled=settings.RESPONSE_CACHE_ENABLED,
+)
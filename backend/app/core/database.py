@@ -1,28 +1,46 @@
-from sqlalchemy import create_engine
+import anyio
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.deadlines import apply_statement_timeout
+from app.core.startup import phase
 
 # Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    echo=settings.DEBUG
-)
+with phase("engine"):
+    # SQLite (tests) keeps SQLAlchemy's default pool, which has no overflow
+    pool_options = {} if make_url(settings.DATABASE_URL).get_backend_name() == "sqlite" else {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+    }
+    engine = create_engine(
+        settings.DATABASE_URL,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        echo=settings.DEBUG,
+        **pool_options
+    )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Transactions begun during a request get SET LOCAL statement_timeout
+event.listen(SessionLocal, "after_begin", apply_statement_timeout)
 
 # Create base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency to get database session"""
+async def get_db():
+    """Dependency to get database session.
+
+    The session is closed even when the request's deadline cancels it during
+    teardown (see app.core.deadlines), so its connection goes back to the pool.
+    """
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(db.close)
 
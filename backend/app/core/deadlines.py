@@ -0,0 +1,124 @@
+"""
+Per-route time budgets.
+
+Each request gets a deadline from its route's budget (REQUEST_TIMEOUTS, else
+REQUEST_TIMEOUT_DEFAULT). Every database transaction the request begins runs
+with `SET LOCAL statement_timeout` set to the time left, so a slow query is
+cancelled by Postgres instead of holding its pooled connection. Reads (GET,
+HEAD) that run past the deadline are answered with 504. Writes are never cut
+off from the outside, since their transaction may already be committed; they
+are bounded by the statement timeout, which rolls the transaction back.
+
+Only database work is actually cancelled, by the statement timeout. Sync
+endpoints run in the threadpool and cannot be interrupted: the endpoint's
+thread runs until it returns, keeping its connection, and a timed out read
+returns its 504 only then. Non-database work (Python loops, calls to other
+services) runs to completion. Cancellation can land in dependency teardown,
+so get_db closes its session in a shielded scope.
+"""
+
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+import anyio
+import orjson
+from sqlalchemy.exc import OperationalError
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from app.core.metrics import registry
+from app.core.routes import RouteRules, route_template
+
+logger = logging.getLogger(__name__)
+
+# Postgres SQLSTATE for a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+CANCELLABLE_METHODS = {"GET", "HEAD"}
+
+timeouts = registry.counter(
+    "lipms_request_timeouts_total", "Requests that ran out of time, by route and kind (deadline or statement)",
+    ("route", "kind"),
+)
+
+# time.monotonic() by which the current request must finish
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None outside a request"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def apply_statement_timeout(session, transaction, connection) -> None:
+    """Session "after_begin" hook: bound the transaction by the request's remaining time"""
+    left = remaining()
+    if left is None or connection.dialect.name != "postgresql":
+        return
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(int(left * 1000), 1)}")
+
+
+def is_statement_timeout(exc: OperationalError) -> bool:
+    return getattr(exc.orig, "pgcode", None) == QUERY_CANCELED
+
+
+async def statement_timeout_handler(request: Request, exc: OperationalError):
+    """Exception handler turning cancelled statements into 504; other errors propagate"""
+    if not is_statement_timeout(exc):
+        raise exc
+    timeouts.inc(route_template(request.scope), "statement")
+    return JSONResponse({"detail": "Request took too long"}, status_code=504)
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware setting each request's deadline and enforcing it for reads"""
+
+    def __init__(self, app, default: float, routes: Dict[str, float], exempt_paths: List[str]):
+        self.app = app
+        self.default = default
+        self.rules = RouteRules(routes)
+        self.exempt_paths = tuple(exempt_paths)
+
+    def budget(self, scope) -> float:
+        matched = self.rules.match(scope)
+        return matched[1] if matched else self.default
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+
+        budget = self.budget(scope)
+        token = _deadline.set(time.monotonic() + budget)
+        try:
+            if scope["method"] not in CANCELLABLE_METHODS:
+                await self.app(scope, receive, send)
+                return
+
+            started = False
+
+            async def send_tracking(message):
+                nonlocal started
+                if message["type"] == "http.response.start":
+                    started = True
+                await send(message)
+
+            with anyio.move_on_after(budget) as cancel_scope:
+                await self.app(scope, receive, send_tracking)
+            if cancel_scope.cancel_called:
+                timeouts.inc(route_template(scope), "deadline")
+                if started:
+                    # Headers are out; the client sees a truncated response
+                    logger.warning("Deadline of %.1fs hit mid-response for %s", budget, scope["path"])
+                    return
+                body = orjson.dumps({"detail": "Request took too long"})
+                await send({
+                    "type": "http.response.start",
+                    "status": 504,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+                })
+                await send({"type": "http.response.body", "body": body})
+        finally:
+            _deadline.reset(token)
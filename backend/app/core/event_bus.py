@@ -0,0 +1,263 @@
+import logging
+import select
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from typing import Callable, Deque, Dict, List, Tuple
+
+import orjson
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], None]
+
+# Published locally after the Postgres listener reconnects: notifications sent
+# while it was disconnected are lost, so subscribers should resynchronise.
+RESYNC_CHANNEL = "bus.resync"
+
+
+class EventBus(ABC):
+    """Fan-out of small messages to every worker process.
+
+    Handlers subscribe to a channel and are called with each message
+    published on it, in this process and (depending on the backend) in every
+    other worker. Handlers must be quick and thread-safe: they may be called
+    from the publishing thread or from a background listener thread.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        self._handlers[channel].append(handler)
+
+    @abstractmethod
+    def publish(self, channel: str, message: dict) -> None:
+        """Deliver `message` to the handlers of `channel` in every worker"""
+
+    def start(self) -> None:
+        """Start background work (called from the application lifespan)"""
+
+    def stop(self) -> None:
+        """Flush pending messages and stop background work"""
+
+    def stats(self) -> dict:
+        return {}
+
+    def _deliver(self, channel: str, message: dict) -> None:
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(message)
+            except Exception:
+                logger.exception("Event bus handler for %s failed", channel)
+
+
+class InMemoryEventBus(EventBus):
+    """Single-process bus: handlers run synchronously in the publishing thread.
+
+    Suitable for one worker and for tests.
+    """
+
+    def publish(self, channel: str, message: dict) -> None:
+        self._deliver(channel, message)
+
+
+class PostgresEventBus(EventBus):
+    """Cross-worker bus over Postgres LISTEN/NOTIFY.
+
+    Messages are delivered to local handlers immediately and queued for the
+    other workers. A sender thread batches queued messages into as few
+    NOTIFY payloads as fit under Postgres' 8000 byte limit, every
+    `batch_interval` seconds or as soon as `batch_size` messages are waiting.
+    A listener thread receives other workers' batches and delivers them
+    locally. Both threads use their own autocommit connection (outside the
+    SQLAlchemy pool) and reconnect with exponential backoff; while the sender
+    is disconnected up to `max_pending` messages are kept, oldest dropped
+    first.
+    """
+
+    MAX_PAYLOAD = 7900
+
+    def __init__(self, dsn: str, channel: str, batch_interval: float, batch_size: int, max_pending: int):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self.batch_interval = batch_interval
+        self.batch_size = batch_size
+        self.origin = uuid.uuid4().hex[:12]
+        self._pending: Deque[Tuple[str, dict]] = deque(maxlen=max_pending)
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self.batches_sent = 0
+        self.reconnects = 0
+
+    def publish(self, channel: str, message: dict) -> None:
+        self._deliver(channel, message)
+        with self._wakeup:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append((channel, message))
+            self.published += 1
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stopping.clear()
+        for target, name in ((self._send_loop, "event-bus-sender"), (self._listen_loop, "event-bus-listener")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+            "batches_sent": self.batches_sent,
+            "reconnects": self.reconnects,
+        }
+
+    def _connect(self):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _payloads(self, batch: List[Tuple[str, dict]]) -> List[str]:
+        """Pack messages into NOTIFY payloads no larger than MAX_PAYLOAD bytes"""
+        payloads, current, size = [], [], 0
+        overhead = len(orjson.dumps({"o": self.origin, "b": []}))
+        for channel, message in batch:
+            item = orjson.dumps([channel, message])
+            if len(item) + overhead > self.MAX_PAYLOAD:
+                logger.warning("Dropping %s event bus message of %d bytes (too large for NOTIFY)", channel, len(item))
+                self.dropped += 1
+                continue
+            if current and size + len(item) + 1 + overhead > self.MAX_PAYLOAD:
+                payloads.append(current)
+                current, size = [], 0
+            current.append(item)
+            size += len(item) + 1
+        if current:
+            payloads.append(current)
+        return [
+            '{"o":"%s","b":[%s]}' % (self.origin, b",".join(items).decode())
+            for items in payloads
+        ]
+
+    def _take_batch(self) -> List[Tuple[str, dict]]:
+        with self._wakeup:
+            if not self._pending and not self._stopping.is_set():
+                self._wakeup.wait(self.batch_interval)
+            batch = list(self._pending)
+            self._pending.clear()
+        return batch
+
+    def _send_loop(self) -> None:
+        conn, backoff = None, 0.5
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                if self._stopping.is_set():
+                    break
+                continue
+            try:
+                if conn is None or conn.closed:
+                    conn = self._connect()
+                with conn.cursor() as cursor:
+                    for payload in self._payloads(batch):
+                        cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+                        self.batches_sent += 1
+                backoff = 0.5
+            except Exception:
+                logger.exception("Event bus could not send notifications, retrying in %.1fs", backoff)
+                # Put the batch back in front of anything published meanwhile
+                with self._wakeup:
+                    retry = batch + list(self._pending)
+                    self.dropped += max(0, len(retry) - self._pending.maxlen)
+                    self._pending.clear()
+                    self._pending.extend(retry)
+                if conn is not None:
+                    conn.close()
+                conn = None
+                if self._stopping.wait(backoff):
+                    break
+                backoff = min(backoff * 2, 10.0)
+        if conn is not None:
+            conn.close()
+
+    def _listen_loop(self) -> None:
+        backoff, connected_before = 0.5, False
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                if connected_before:
+                    self.reconnects += 1
+                    self._deliver(RESYNC_CHANNEL, {})
+                connected_before, backoff = True, 0.5
+
+                while not self._stopping.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._receive(conn.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("Event bus listener lost its connection, reconnecting in %.1fs", backoff)
+                if self._stopping.wait(backoff):
+                    break
+                backoff = min(backoff * 2, 10.0)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _receive(self, payload: str) -> None:
+        batch = orjson.loads(payload)
+        if batch.get("o") == self.origin:
+            return  # already delivered locally when published
+        for channel, message in batch["b"]:
+            self.received += 1
+            self._deliver(channel, message)
+
+
+def create_event_bus() -> EventBus:
+    """Build the event bus selected by EVENT_BUS_BACKEND"""
+    if settings.EVENT_BUS_BACKEND == "postgres":
+        dsn = make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        return PostgresEventBus(
+            dsn=dsn,
+            channel=settings.EVENT_BUS_CHANNEL,
+            batch_interval=settings.EVENT_BUS_BATCH_MS / 1000,
+            batch_size=settings.EVENT_BUS_BATCH_SIZE,
+            max_pending=settings.EVENT_BUS_MAX_PENDING,
+        )
+    if settings.EVENT_BUS_BACKEND == "memory":
+        return InMemoryEventBus()
+    raise ValueError(f"Unknown EVENT_BUS_BACKEND: {settings.EVENT_BUS_BACKEND}")
+
+
+event_bus = create_event_bus()
@@ -0,0 +1,195 @@
+import asyncio
+import itertools
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Iterable, Optional, Set
+
+import orjson
+
+from app.core.config import settings
+from app.core.event_bus import EventBus, RESYNC_CHANNEL, event_bus
+
+# Roles that see every operational event (orders, sales, stock)
+STAFF_ROLES = ("admin", "pharmacist", "staff")
+
+# Event bus channel carrying client-facing events between workers
+EVENTS_CHANNEL = "events"
+
+
+class Event:
+    """An event pushed to connected clients.
+
+    `roles` lists the user roles allowed to receive the event; `user_id`
+    additionally lets one specific user (e.g. the customer who placed an
+    order) receive it regardless of role. The payload is serialized once and
+    shared by every subscriber.
+    """
+
+    __slots__ = ("id", "type", "data", "roles", "user_id", "json")
+
+    def __init__(self, id: int, type: str, data: dict, roles: Iterable[str], user_id: Optional[int] = None):
+        self.id = id
+        self.type = type
+        self.data = data
+        self.roles = frozenset(roles)
+        self.user_id = user_id
+        self.json = orjson.dumps({
+            "id": id,
+            "type": type,
+            "data": data,
+            "created_at": datetime.now(timezone.utc),
+        }).decode()
+
+
+class Subscriber:
+    """One connected client with its own bounded queue.
+
+    When the client falls behind and the queue is full, the oldest event is
+    dropped so memory stays bounded; the drop count is reported to the client
+    with the next event so it can refetch. A client that keeps lagging past
+    `max_dropped` events is disconnected.
+    """
+
+    def __init__(self, role: str, user_id: int, types: Optional[Set[str]], max_queue: int, max_dropped: int):
+        self.role = role
+        self.user_id = user_id
+        self.types = types
+        self.max_dropped = max_dropped
+        self.dropped = 0
+        self.closed = False
+        self._queue: Deque[Event] = deque(maxlen=max_queue)
+        self._ready = asyncio.Event()
+
+    def accepts(self, event: Event) -> bool:
+        if self.types and event.type not in self.types:
+            return False
+        return self.role in event.roles or (event.user_id is not None and event.user_id == self.user_id)
+
+    def offer(self, event: Event) -> None:
+        """Queue an event (called on the event loop thread)"""
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+            if self.dropped > self.max_dropped:
+                self.close()
+                return
+        self._queue.append(event)
+        self._ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """Next event, or None on timeout or once the subscriber is closed"""
+        if not self._queue and not self.closed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.closed or not self._queue:
+            return None
+        return self._queue.popleft()
+
+    def take_dropped(self) -> int:
+        """Number of events dropped since the last call"""
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class EventBroker:
+    """Publish/subscribe hub for server-push endpoints.
+
+    Endpoints publish from the threadpool after committing. Events travel
+    over the event bus, so with the Postgres backend every worker's
+    subscribers see them; delivery into the subscribers' queues always
+    happens on this worker's event loop thread. Delivering with no
+    subscribers connected costs almost nothing.
+    """
+
+    def __init__(self, bus: EventBus, max_queue: int, max_dropped: int):
+        self.max_queue = max_queue
+        self.max_dropped = max_dropped
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._bus = bus
+        self.published = 0
+        self.delivered = 0
+        bus.subscribe(EVENTS_CHANNEL, self._receive)
+        bus.subscribe(RESYNC_CHANNEL, self._resync)
+
+    def publish(self, type: str, data: dict, roles: Iterable[str] = STAFF_ROLES, user_id: Optional[int] = None) -> None:
+        """Publish an event to matching subscribers in every worker; safe to call from any thread"""
+        self.published += 1
+        self._bus.publish(EVENTS_CHANNEL, {"type": type, "data": data, "roles": list(roles), "user_id": user_id})
+
+    def _receive(self, message: dict) -> None:
+        """Event bus handler: hand an event to the loop thread for delivery"""
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return
+        with self._lock:
+            event_id = next(self._ids)
+        event = Event(event_id, message["type"], message["data"], message["roles"], message["user_id"])
+        self._call_soon(self._dispatch, event)
+
+    def _resync(self, message: dict) -> None:
+        """Events may have been missed; make every subscriber refetch"""
+        if self._loop is not None:
+            self._call_soon(self._mark_lagged)
+
+    def _call_soon(self, callback, *args) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def _dispatch(self, event: Event) -> None:
+        for subscriber in list(self._subscribers):
+            if subscriber.accepts(event):
+                subscriber.offer(event)
+                self.delivered += 1
+                if subscriber.closed:
+                    self._subscribers.discard(subscriber)
+
+    def _mark_lagged(self) -> None:
+        for subscriber in self._subscribers:
+            subscriber.dropped += 1
+            subscriber._ready.set()
+
+    def subscribe(self, role: str, user_id: int, types: Optional[Set[str]] = None) -> Subscriber:
+        """Register a subscriber; must be called from the event loop"""
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(role, user_id, types, self.max_queue, self.max_dropped)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        subscriber.close()
+        self._subscribers.discard(subscriber)
+
+    def close(self) -> None:
+        """Disconnect every subscriber (used on shutdown)"""
+        for subscriber in list(self._subscribers):
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+broker = EventBroker(
+    event_bus,
+    max_queue=settings.EVENTS_QUEUE_SIZE,
+    max_dropped=settings.EVENTS_MAX_DROPPED,
+)
@@ -0,0 +1,285 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Metrics are plain objects holding their samples in dicts keyed by label
+values, each guarded by its own lock so request threads can update them
+concurrently. Rendering happens only when `/metrics` is scraped. Values are
+per process: with several uvicorn workers every scrape is answered by one of
+them.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.routes import route_template
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (last one is +Inf), then the sum
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def totals(self, *labels: str) -> Tuple[int, float]:
+        """(count, sum) of the observations for a label set"""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                return 0, 0.0
+            return sum(series[:-1]), series[-1]
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        names = self.labels + ("le",)
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {values[-1]!r}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    """Metrics of this process, plus collectors that read values at scrape time"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def collector(self, collect: Callable[[], Iterable[Metric]]) -> Callable[[], Iterable[Metric]]:
+        """Register `collect`, called on every scrape to build fresh metrics"""
+        self._collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        metrics = list(self._metrics.values())
+        for collect in self._collectors:
+            metrics.extend(collect())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = Registry()
+
+# HTTP
+http_requests = registry.counter(
+    "lipms_http_requests_total", "HTTP requests by route, method and status code",
+    ("route", "method", "status"),
+)
+http_request_duration = registry.histogram(
+    "lipms_http_request_duration_seconds", "HTTP request latency by route and method",
+    ("route", "method"),
+)
+http_in_flight = registry.gauge(
+    "lipms_http_requests_in_flight", "HTTP requests currently being handled",
+    ("method",),
+)
+
+# Database
+db_queries = registry.histogram(
+    "lipms_db_queries_per_request", "SQL statements executed per HTTP request",
+    ("route", "method"), buckets=QUERY_BUCKETS,
+)
+db_pool_checkouts = registry.counter("lipms_db_pool_checkouts_total", "Connections checked out of the pool")
+db_pool_connects = registry.counter("lipms_db_pool_connects_total", "New database connections opened by the pool")
+
+# In-process caches
+cache_requests = registry.counter(
+    "lipms_cache_requests_total", "Cache lookups by cache and result (hit or miss)",
+    ("cache", "result"),
+)
+
+# Business
+sales_completed = registry.counter("lipms_sales_total", "Completed sales")
+sales_amount = registry.counter("lipms_sales_amount_total", "Total value of completed sales")
+stock_decrements = registry.counter(
+    "lipms_stock_decrement_units_total", "Units taken out of stock, by reason",
+    ("reason",),
+)
+
+# Statements executed by the current request; a one-element list so threads
+# running the request's sync code can add to it
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count statements per request and pool checkouts, and expose pool usage"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        queries = _request_queries.get()
+        if queries is not None:
+            queries[0] += 1
+
+    @event.listens_for(engine.pool, "checkout")
+    def count_checkout(dbapi_connection, connection_record, connection_proxy):
+        db_pool_checkouts.inc()
+
+    @event.listens_for(engine.pool, "connect")
+    def count_connect(dbapi_connection, connection_record):
+        db_pool_connects.inc()
+
+    @registry.collector
+    def pool_usage() -> Iterable[Metric]:
+        pool = engine.pool
+        usage = Gauge("lipms_db_pool_connections", "Pool connections by state", ("state",))
+        for state, reader in (("checked_out", "checkedout"), ("idle", "checkedin"), ("overflow", "overflow")):
+            if hasattr(pool, reader):
+                # overflow() is negative while the pool is still below its size
+                usage.set(max(getattr(pool, reader)(), 0), state)
+        size = Gauge("lipms_db_pool_size", "Configured pool size")
+        if hasattr(pool, "size"):
+            size.set(pool.size())
+        return [usage, size]
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status, in-flight and query counts.
+
+    Requests are labelled with the route's path template (`/api/v1/orders/{order_id}`),
+    so label cardinality stays bounded; requests matching no route share the
+    `unmatched` label. WebSockets and lifespan events pass straight through.
+    """
+
+    def __init__(self, app, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        queries = [0]
+        token = _request_queries.set(queries)
+        http_in_flight.inc(method)
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_queries.reset(token)
+            http_in_flight.dec(method)
+            route = route_template(scope)
+            http_requests.inc(route, method, str(status))
+            http_request_duration.observe(elapsed, route, method)
+            db_queries.observe(queries[0], route, method)
@@ -0,0 +1,208 @@
+"""
+Monthly range partitions on created_at for the history tables.
+
+Partitioning is optional (see the 0003 migration); every helper here is a
+no-op or returns nothing for a table that is not partitioned, so the
+maintenance command can run against either layout. Partitions are named
+``<table>_pYYYY_MM`` and cover one calendar month in UTC; each partitioned
+table also has a ``<table>_default`` partition catching rows outside the
+pre-created range.
+"""
+
+import gzip
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+PARTITIONED_TABLES = ("activities", "sales", "sale_items", "orders", "order_items")
+
+# Items reference their sale/order, so their partitions go first when
+# detaching or archiving
+DETACH_ORDER = ("sale_items", "sales", "order_items", "orders", "activities")
+
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class Partition(NamedTuple):
+    name: str
+    start: Optional[date]  # None for the default partition
+    end: Optional[date]
+
+
+def _utc_date(value: str) -> date:
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+def _utc_bound(day: date) -> str:
+    """Literal for midnight UTC on `day`, independent of the session TimeZone"""
+    return f"{day.isoformat()} 00:00:00+00"
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid))"
+    ), {"table": table}).scalar()
+
+
+# Partitioning only changes through migrations, which restart the app
+_partitioned = {}
+
+
+def is_partitioned_cached(conn: Connection, table: str) -> bool:
+    """is_partitioned, remembered for the life of the process"""
+    if table not in _partitioned:
+        _partitioned[table] = is_partitioned(conn, table)
+    return _partitioned[table]
+
+
+def list_partitions(conn: Connection, table: str) -> List[Partition]:
+    """Attached partitions of `table`, oldest first, default partition last"""
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table AND pg_table_is_visible(p.oid)"
+    ), {"table": table}).all()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND.search(bound)
+        if match:
+            start, end = (_utc_date(value) for value in match.groups())
+            partitions.append(Partition(name, start, end))
+        else:
+            partitions.append(Partition(name, None, None))
+    return sorted(partitions, key=lambda p: (p.start is None, p.start or date.min))
+
+
+def create_partition(conn: Connection, table: str, month: date) -> str:
+    """Create the partition for `month`, moving any matching rows out of the default partition"""
+    name = partition_name(table, month)
+    start, end = month_start(month), add_months(month, 1)
+    bounds = {"start": _utc_bound(start), "end": _utc_bound(end)}
+    default = f"{table}_default"
+
+    has_default = conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": default}).scalar()
+    stray = has_default and conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {default} "
+        f"WHERE created_at >= CAST(:start AS timestamptz) AND created_at < CAST(:end AS timestamptz))"
+    ), bounds).scalar()
+
+    if stray:
+        # Postgres refuses to create a partition whose rows already sit in the
+        # default partition: take it out, create the month, move the rows, put it back
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    ))
+    if stray:
+        where = "created_at >= CAST(:start AS timestamptz) AND created_at < CAST(:end AS timestamptz)"
+        conn.execute(text(f"INSERT INTO {table} SELECT * FROM {default} WHERE {where}"), bounds)
+        conn.execute(text(f"DELETE FROM {default} WHERE {where}"), bounds)
+        conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+    return name
+
+
+def ensure_partitions(conn: Connection, table: str, months_ahead: int, first_month: Optional[date] = None) -> List[str]:
+    """Create missing monthly partitions from `first_month` (default: this month) through `months_ahead` months ahead"""
+    if not is_partitioned(conn, table):
+        return []
+    existing = {p.start for p in list_partitions(conn, table)}
+    current = month_start(first_month or datetime.now(timezone.utc).date())
+    last = add_months(month_start(datetime.now(timezone.utc).date()), months_ahead)
+
+    created = []
+    while current <= last:
+        if current not in existing:
+            created.append(create_partition(conn, table, current))
+        current = add_months(current, 1)
+    return created
+
+
+def partitions_before(conn: Connection, table: str, cutoff: date) -> List[Partition]:
+    """Monthly partitions holding only rows older than `cutoff`"""
+    if not is_partitioned(conn, table):
+        return []
+    return [p for p in list_partitions(conn, table) if p.end is not None and p.end <= cutoff]
+
+
+def detach_partition(conn: Connection, table: str, name: str) -> None:
+    """Detach a partition, leaving it as a standalone table.
+
+    The detached table keeps copies of the parent's foreign keys; they are
+    dropped so that an item partition detached first does not block
+    detaching the sale/order partition it references.
+    """
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    foreign_keys = conn.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:name AS regclass) AND contype = 'f'"
+    ), {"name": name}).scalars().all()
+    for constraint in foreign_keys:
+        conn.execute(text(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"'))
+
+
+def archive_table(conn: Connection, name: str, directory: Path) -> Path:
+    """Dump a (detached) table to <directory>/<name>.csv.gz and drop it"""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{name}.csv.gz"
+    cursor = conn.connection.cursor()
+    try:
+        with gzip.open(path, "wb") as archive:
+            cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", archive)
+    finally:
+        cursor.close()
+    conn.execute(text(f"DROP TABLE {name}"))
+    return path
+
+
+def purge_activities(engine: Engine, cutoff: datetime, batch_size: int = 10000) -> int:
+    """Delete activities older than `cutoff`, dropping whole partitions where possible.
+
+    Each partition drop and each batch of at most `batch_size` deleted rows
+    commits on its own, so locks are held for one batch at a time.
+    """
+    deleted = 0
+    with engine.connect() as conn:
+        partitions = partitions_before(conn, "activities", cutoff.date())
+    for partition in partitions:
+        with engine.begin() as conn:
+            deleted += conn.execute(text(f"SELECT count(*) FROM {partition.name}")).scalar()
+            detach_partition(conn, "activities", partition.name)
+            conn.execute(text(f"DROP TABLE {partition.name}"))
+
+    # Rows left in the partition straddling the cutoff (or in an unpartitioned table)
+    while True:
+        with engine.begin() as conn:
+            count = conn.execute(text(
+                "DELETE FROM activities WHERE id IN "
+                "(SELECT id FROM activities WHERE created_at < :cutoff LIMIT :limit)"
+            ), {"cutoff": cutoff, "limit": batch_size}).rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
@@ -0,0 +1,269 @@
+"""
+On-demand request profiling.
+
+An admin arms the profiler with a job: profile the next `count` requests to
+a route (its path template, optionally one method) and/or carrying a given
+`X-Profile-Token` header. The job is published on the event bus, so every
+worker arms it and each profiles up to `count` matching requests.
+
+Matching requests run their endpoint function under cProfile. Each profile
+is written to PROFILE_DIR as a `.pstats` file (for pstats/snakeviz) and a
+`.collapsed` file of folded stacks (for flamegraph.pl/speedscope).
+Dependencies such as the DB session and authentication are not included.
+
+While no job is armed the only cost per request is one attribute check.
+"""
+
+import asyncio
+import cProfile
+import functools
+import itertools
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.routing import request_response
+
+from app.core.config import settings
+from app.core.event_bus import EventBus, event_bus
+
+logger = logging.getLogger(__name__)
+
+PROFILER_CHANNEL = "profiler"
+TOKEN_HEADER = "x-profile-token"
+EXTENSIONS = (".pstats", ".collapsed")
+NAME_PATTERN = re.compile(r"^[\w.-]+$")
+
+# Profile of the current request, enabled around the endpoint call
+_active: ContextVar[Optional[cProfile.Profile]] = ContextVar("active_profile", default=None)
+
+
+class ProfileJob:
+    def __init__(self, id: str, count: int, route: Optional[str] = None, method: Optional[str] = None, token: Optional[str] = None):
+        self.id = id
+        self.count = count
+        self.remaining = count
+        self.route = route
+        self.method = method.upper() if method else None
+        self.token = token
+
+    def matches(self, route: str, method: str, token: Optional[str]) -> bool:
+        return (
+            (self.route is None or self.route == route)
+            and (self.method is None or self.method == method)
+            and (self.token is None or self.token == token)
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "count": self.count,
+            "remaining": self.remaining,
+            "route": self.route,
+            "method": self.method,
+            "token": self.token,
+        }
+
+
+def collapse_stats(stats: pstats.Stats, max_depth: int = 64) -> List[str]:
+    """Folded stacks ("outer;inner;leaf microseconds") from a cProfile call graph.
+
+    cProfile only records caller/callee pairs, so each function's time is
+    split between its call paths in proportion to the time spent through
+    each caller. Recursive paths are cut at the first repeat.
+    """
+    children: Dict[tuple, Dict[tuple, float]] = {}
+    roots = []
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            children.setdefault(caller, {})[func] = edge[3]
+
+    def label(func: tuple) -> str:
+        filename, line, name = func
+        if filename == "~":
+            return name
+        return f"{name} ({Path(filename).name}:{line})"
+
+    folded: Dict[str, float] = {}
+
+    def walk(func: tuple, share: float, stack: List[tuple]) -> None:
+        # `share` is the fraction of func's total time that belongs to `stack`
+        own = stats.stats[func][2]
+        stack = stack + [func]
+        key = ";".join(label(frame) for frame in stack)
+        folded[key] = folded.get(key, 0.0) + own * share
+        if len(stack) >= max_depth:
+            return
+        for child, edge_cumulative in children.get(func, {}).items():
+            child_cumulative = stats.stats[child][3]
+            if child in stack or not child_cumulative:
+                continue
+            # Fraction of the child's total time spent on this path
+            walk(child, share * edge_cumulative / child_cumulative, stack)
+
+    for root in roots:
+        walk(root, 1.0, [])
+
+    return [f"{stack} {round(seconds * 1_000_000)}" for stack, seconds in folded.items() if seconds >= 0.0000005]
+
+
+class RequestProfiler:
+    def __init__(self, bus: EventBus, directory: str, max_profiles: int):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+        self.armed = False
+        self._jobs: List[ProfileJob] = []
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+        self._bus = bus
+        bus.subscribe(PROFILER_CHANNEL, self._receive)
+
+    def arm(self, count: int, route: Optional[str] = None, method: Optional[str] = None, token: Optional[str] = None) -> ProfileJob:
+        """Arm a job in every worker"""
+        job = ProfileJob(uuid.uuid4().hex[:12], count, route, method, token)
+        self._bus.publish(PROFILER_CHANNEL, {"action": "arm", **job.to_dict()})
+        return job
+
+    def disarm(self) -> None:
+        """Cancel all jobs in every worker"""
+        self._bus.publish(PROFILER_CHANNEL, {"action": "disarm"})
+
+    def jobs(self) -> List[dict]:
+        with self._lock:
+            return [job.to_dict() for job in self._jobs]
+
+    def _receive(self, message: dict) -> None:
+        with self._lock:
+            if message["action"] == "arm":
+                self._jobs.append(ProfileJob(message["id"], message["count"], message["route"], message["method"], message["token"]))
+            else:
+                self._jobs.clear()
+            self.armed = bool(self._jobs)
+
+    def _claim(self, route: str, method: str, token: Optional[str]) -> Optional[ProfileJob]:
+        with self._lock:
+            for job in self._jobs:
+                if job.matches(route, method, token):
+                    job.remaining -= 1
+                    if not job.remaining:
+                        self._jobs.remove(job)
+                        self.armed = bool(self._jobs)
+                    return job
+        return None
+
+    # Storage
+
+    def save(self, profile: cProfile.Profile, job: ProfileJob, route: str, method: str, elapsed: float) -> str:
+        """Write a profile's .pstats and .collapsed files; returns the profile name"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^\w]+", "_", route).strip("_") or "root"
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        name = f"{stamp}-{os.getpid()}-{next(self._sequence)}-{method.lower()}-{slug}-{round(elapsed * 1000)}ms"
+
+        profile.dump_stats(self.directory / f"{name}.pstats")
+        stats = pstats.Stats(profile)
+        (self.directory / f"{name}.collapsed").write_text("\n".join(collapse_stats(stats)) + "\n")
+        logger.info("Profiled %s %s for job %s in %.1fms: %s", method, route, job.id, elapsed * 1000, name)
+        self._prune()
+        return name
+
+    def profiles(self) -> List[dict]:
+        """Stored profiles, newest first"""
+        if not self.directory.is_dir():
+            return []
+        files = sorted(self.directory.glob("*.pstats"), key=lambda path: path.stat().st_mtime, reverse=True)
+        return [
+            {
+                "name": path.stem,
+                "created_at": datetime.fromtimestamp(path.stat().st_mtime, timezone.utc),
+                "files": [path.stem + extension for extension in EXTENSIONS],
+            }
+            for path in files
+        ]
+
+    def file(self, filename: str) -> Optional[Path]:
+        """Path of a stored profile file, or None if the name is not one"""
+        if not NAME_PATTERN.match(filename) or not filename.endswith(EXTENSIONS):
+            return None
+        path = self.directory / filename
+        return path if path.is_file() else None
+
+    def _prune(self) -> None:
+        profiles = self.profiles()
+        for stale in profiles[self.max_profiles:]:
+            for filename in stale["files"]:
+                (self.directory / filename).unlink(missing_ok=True)
+
+    # Instrumentation
+
+    def instrument(self, app: FastAPI) -> None:
+        """Make every API route of `app` profilable. Call once all routers are included."""
+        for route in app.routes:
+            if isinstance(route, APIRoute):
+                route.dependant.call = _profiled_call(route.dependant.call)
+                route.app = request_response(self._profiled_handler(route.get_route_handler(), route.path))
+
+    def _profiled_handler(self, handler, route: str):
+        async def profiled_handler(request: Request):
+            if not self.armed:
+                return await handler(request)
+            job = self._claim(route, request.method, request.headers.get(TOKEN_HEADER))
+            if job is None:
+                return await handler(request)
+
+            profile = cProfile.Profile()
+            token = _active.set(profile)
+            started = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                elapsed = time.perf_counter() - started
+                _active.reset(token)
+                await run_in_threadpool(self.save, profile, job, route, request.method, elapsed)
+
+        return profiled_handler
+
+
+def _profiled_call(call):
+    """Wrap an endpoint function to run under the request's profile, if any"""
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def profiled(*args, **kwargs):
+            profile = _active.get()
+            if profile is None:
+                return await call(*args, **kwargs)
+            # Runs on the event loop, so other requests' coroutines may show up
+            profile.enable()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                profile.disable()
+    else:
+        @functools.wraps(call)
+        def profiled(*args, **kwargs):
+            profile = _active.get()
+            if profile is None:
+                return call(*args, **kwargs)
+            profile.enable()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                profile.disable()
+    return profiled
+
+
+profiler = RequestProfiler(event_bus, settings.PROFILE_DIR, settings.PROFILE_MAX_PROFILES)
@@ -0,0 +1,235 @@
+"""
+Per-user rate limiting and global admission control.
+
+Every request takes a token from its subject's bucket (the JWT `sub`, or the
+client address for anonymous requests) and, for routes with their own rule,
+from the subject's bucket for that route. An empty bucket gets 429 with
+Retry-After. Independently, when the database pool is nearly exhausted or
+too many requests are in flight, new requests are shed with 503 before they
+queue up for a connection.
+
+Buckets live in process memory, or in Redis (RATE_LIMIT_BACKEND=redis, needs
+the `redis` package) so that all workers share them.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+from jose import JWTError, jwt
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.routes import RouteRules
+
+logger = logging.getLogger(__name__)
+
+throttled = registry.counter(
+    "lipms_rate_limited_total", "Requests rejected by the rate limiter, by reason",
+    ("reason",),
+)
+
+# Token bucket in Redis: refill by elapsed time, then try to take `cost` tokens
+REDIS_TAKE = """
+local rate, burst, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local retry = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(retry)
+"""
+
+
+def parse_rule(value: str) -> Tuple[float, int]:
+    """"rate/burst" (requests per second / bucket size) -> (rate, burst)"""
+    rate, _, burst = value.partition("/")
+    return float(rate), int(burst or max(1, math.ceil(float(rate))))
+
+
+class MemoryBuckets:
+    """Token buckets in this process, least recently used dropped beyond `max_keys`"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        """Take `cost` tokens; returns 0 if allowed, else seconds until it would be"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(burst), now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / rate
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker through Redis.
+
+    If Redis is unreachable requests are let through (and logged), so an
+    outage of the limiter never takes the API down with it.
+    """
+
+    def __init__(self, url: str, prefix: str = "lipms:rl:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis package (pip install redis)")
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._take = self._client.register_script(REDIS_TAKE)
+        self.errors = 0
+
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        try:
+            return float(await self._take(keys=[self.prefix + key], args=[rate, burst, time.time(), cost]))
+        except Exception:
+            self.errors += 1
+            if self.errors == 1 or self.errors % 1000 == 0:
+                logger.exception("Rate limit backend unavailable; letting requests through")
+            return 0.0
+
+
+def create_buckets():
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisBuckets(settings.RATE_LIMIT_REDIS_URL)
+    if settings.RATE_LIMIT_BACKEND != "memory":
+        raise ValueError(f"Unknown rate limit backend: {settings.RATE_LIMIT_BACKEND}")
+    return MemoryBuckets()
+
+
+@lru_cache(maxsize=4096)
+def token_subject(token: str) -> Optional[str]:
+    """`sub` of a validly signed JWT (expired or not), or None"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM], options={"verify_exp": False})
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
+def request_subject(scope) -> str:
+    """Rate limit key of a request: the token's subject, else the client address"""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                subject = token_subject(token)
+                if subject:
+                    return f"user:{subject}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware applying the buckets and admission control.
+
+    `routes` maps "METHOD /path/template" to "rate/burst". Paths starting
+    with one of `exempt_paths` (health checks, metrics, event streams) are
+    neither limited nor counted as in flight.
+    """
+
+    def __init__(
+        self,
+        app,
+        buckets,
+        user_rate: float,
+        user_burst: int,
+        routes: Dict[str, str],
+        exempt_paths: List[str],
+        max_in_flight: int = 0,
+        pool=None,
+        pool_overflow: int = 0,
+        pool_threshold: float = 0.0,
+    ):
+        self.app = app
+        self.buckets = buckets
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.rules = RouteRules({rule: parse_rule(value) for rule, value in routes.items()})
+        self.exempt_paths = tuple(exempt_paths)
+        self.max_in_flight = max_in_flight
+        # SQLite's SingletonThreadPool and StaticPool count no checkouts
+        self.pool = pool if hasattr(pool, "checkedout") else None
+        self.pool_overflow = pool_overflow
+        self.pool_threshold = pool_threshold
+        self.in_flight = 0
+
+    def _overloaded(self) -> Optional[str]:
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return "in_flight"
+        if self.pool is not None and self.pool_threshold:
+            capacity = self.pool.size() + self.pool_overflow
+            if self.pool.checkedout() >= capacity * self.pool_threshold:
+                return "db_pool"
+        return None
+
+    async def _reject(self, send, status: int, retry_after: float, detail: str) -> None:
+        body = orjson.dumps({"detail": detail})
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+
+        overload = self._overloaded()
+        if overload:
+            throttled.inc(f"overload_{overload}")
+            await self._reject(send, 503, 1, "Server is busy, please retry shortly")
+            return
+
+        subject = request_subject(scope)
+        wait = await self.buckets.take(subject, self.user_rate, self.user_burst)
+        if wait:
+            throttled.inc("user")
+            await self._reject(send, 429, wait, "Too many requests")
+            return
+
+        matched = self.rules.match(scope)
+        if matched:
+            rule, (rate, burst) = matched
+            wait = await self.buckets.take(f"{subject}|{rule}", rate, burst)
+            if wait:
+                throttled.inc("route")
+                await self._reject(send, 429, wait, "Too many requests")
+                return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
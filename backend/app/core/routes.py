@@ -0,0 +1,63 @@
+"""
+Route lookups shared by the middleware.
+
+Middleware runs before routing, so per-route settings are keyed on
+"METHOD /path/template" strings and matched with the routes' own regexes.
+"""
+
+import logging
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+_templates: Dict[Callable, str] = {}
+
+
+def route_template(scope) -> str:
+    """Path template of the route that handled a request, or "unmatched".
+
+    Only valid once routing has run (the router records the endpoint in the scope).
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    template = _templates.get(endpoint)
+    if template is None:
+        template = "unmatched"
+        for route in scope["app"].routes:
+            if getattr(route, "endpoint", None) is endpoint:
+                template = route.path
+                break
+        _templates[endpoint] = template
+    return template
+
+
+class RouteRules(Generic[V]):
+    """Values keyed on "METHOD /path/template", looked up for a request before routing"""
+
+    def __init__(self, rules: Dict[str, V]):
+        self.rules = rules
+        self._resolved: Optional[List[Tuple[str, object, V]]] = None
+
+    def _resolve(self, app) -> List[Tuple[str, object, V]]:
+        resolved = []
+        for rule, value in self.rules.items():
+            method, _, path = rule.partition(" ")
+            for route in app.routes:
+                if getattr(route, "path", None) == path and method in (getattr(route, "methods", None) or ()):
+                    resolved.append((rule, route, value))
+                    break
+            else:
+                logger.warning("Route rule %r matches no route", rule)
+        return resolved
+
+    def match(self, scope) -> Optional[Tuple[str, V]]:
+        """(rule, value) of the first rule matching the request, or None"""
+        if self._resolved is None:
+            self._resolved = self._resolve(scope["app"])
+        for rule, route, value in self._resolved:
+            if scope["method"] in route.methods and route.path_regex.match(scope["path"]):
+                return rule, value
+        return None
@@ -0,0 +1,120 @@
+"""
+Request coalescing for identical concurrent reads.
+
+`@singleflight.coalesced(Model)` goes under the route decorator. While one
+call of the endpoint is running, identical calls in the same worker (same
+parameters, same user or role per `scope`, as in the response cache) wait
+for it and answer with its serialized result instead of running their own
+query. Dependencies still run for every request, so permission checks are
+unchanged.
+
+A request waits at most until its own deadline, or REQUEST_TIMEOUT_DEFAULT
+seconds outside one (exempt routes, calls outside a request); if the shared
+call has not finished by then it runs the endpoint itself. HTTP errors raised by the
+shared call (404, 403, ...) are raised for every waiter; any other error
+makes the waiters run the endpoint themselves. Coalesced requests are
+counted in lipms_coalesced_requests_total{endpoint}.
+"""
+
+import functools
+import threading
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+from app.core import deadlines
+from app.core.cache import SCOPES, request_key, serialize
+from app.core.config import settings
+from app.core.metrics import registry
+
+coalesced_requests = registry.counter(
+    "lipms_coalesced_requests_total", "Requests answered with the result of an identical in-flight request",
+    ("endpoint",),
+)
+
+
+class Flight:
+    """One running endpoint call and, once done, its body or HTTP error"""
+
+    __slots__ = ("done", "body", "media_type", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.body: Optional[bytes] = None
+        self.media_type = "application/json"
+        self.error: Optional[HTTPException] = None
+
+
+class SingleFlight:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+
+    def coalesced(self, model, scope: str = "role") -> Callable:
+        """Share one run of a sync GET endpoint among identical concurrent calls.
+
+        `model` is the response model the shared result is serialized as;
+        `scope` is "user", "role" or "shared" (see app.core.cache).
+        """
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown coalescing scope: {scope}")
+        adapter = TypeAdapter(model)
+
+        def decorator(func):
+            if not self.enabled:
+                return func
+            endpoint = func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = request_key(endpoint, scope, kwargs)
+                with self._lock:
+                    flight = self._flights.get(key)
+                    leader = flight is None
+                    if leader:
+                        flight = self._flights[key] = Flight()
+
+                if not leader:
+                    if flight.done.wait(self._wait_timeout()) and (flight.body is not None or flight.error):
+                        coalesced_requests.inc(endpoint)
+                        if flight.error:
+                            raise HTTPException(flight.error.status_code, flight.error.detail, flight.error.headers)
+                        return Response(flight.body, media_type=flight.media_type)
+                    return self._respond(adapter, func(*args, **kwargs), Flight())
+
+                try:
+                    return self._respond(adapter, func(*args, **kwargs), flight)
+                except HTTPException as exc:
+                    flight.error = exc
+                    raise
+                finally:
+                    with self._lock:
+                        self._flights.pop(key, None)
+                    flight.done.set()
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def _wait_timeout() -> float:
+        """Seconds a waiter gives the shared call; never unbounded, so a hung call cannot hold waiters' threads"""
+        left = deadlines.remaining()
+        return settings.REQUEST_TIMEOUT_DEFAULT if left is None else left
+
+    @staticmethod
+    def _respond(adapter: TypeAdapter, result, flight: Flight) -> Response:
+        if isinstance(result, Response):
+            flight.body, flight.media_type = result.body, result.media_type
+            return result
+        flight.body = serialize(adapter, result)
+        return Response(flight.body, media_type=flight.media_type)
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "in_flight": len(self._flights)}
+
+
+singleflight = SingleFlight(enabled=settings.SINGLEFLIGHT_ENABLED)
@@ -0,0 +1,79 @@
+import logging
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger("uvicorn.error")
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+# Milliseconds spent in each startup phase of this worker, in order
+timings: Dict[str, float] = {}
+
+
+@contextmanager
+def phase(name: str):
+    """Time a block of startup work under `name`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def record(name: str, seconds: float) -> None:
+    timings[name] = round(seconds * 1000, 2)
+
+
+def report() -> str:
+    return ", ".join(f"{name} {ms:.1f}ms" for name, ms in timings.items())
+
+
+def alembic_config():
+    """Alembic config that works from any working directory"""
+    from alembic.config import Config
+
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    return config
+
+
+def head_revision() -> Optional[str]:
+    """Latest Alembic revision shipped with this code"""
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def database_revision(conn: Connection) -> Optional[str]:
+    """Revision recorded in alembic_version, or None if migrations never ran"""
+    try:
+        return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except DBAPIError:
+        conn.rollback()
+        return None
+
+
+def check_schema_revision(conn: Connection, mode: str) -> None:
+    """Compare the database's Alembic revision with the code's.
+
+    `mode` is "fail" (raise, so the worker does not start against a schema
+    it does not match), "warn" (log and continue) or "off".
+    """
+    if mode == "off":
+        return
+    expected, current = head_revision(), database_revision(conn)
+    if current == expected:
+        return
+    message = (
+        f"Database schema is at revision {current or 'none'}, this code expects {expected}. "
+        f"Run `alembic upgrade head` (or set DB_SCHEMA_CHECK=warn to start anyway)."
+    )
+    if mode == "fail":
+        raise RuntimeError(message)
+    logger.warning(message)
@@ -1,33 +1,94 @@
+import time
+
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from contextlib import asynccontextmanager
+from sqlalchemy.exc import OperationalError
 import uvicorn
 
+from app.core import deadlines, metrics, rate_limit, startup
+from app.core.profiler import profiler
+from app.core.activity_log import activity_log
+from app.core.cache import response_cache
+from app.core.singleflight import singleflight
+from app.services.inventory_summary import inventory_summary
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, Base, pool_options
+from app.core.event_bus import event_bus
+from app.core.events import broker
 from app.api.v1.api import api_router
 
 # Import all models to ensure they're registered with SQLAlchemy
 import app.models  # noqa: F401
 
+# Includes the engine phase timed inside app.core.database
+startup.record("import", time.perf_counter() - _import_started)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    Base.metadata.create_all(bind=engine)
+    # Startup: one connection to check the schema, no DDL unless asked for.
+    # Tables are created and migrated by `alembic upgrade head`.
+    with startup.phase("first_connection"):
+        conn = engine.connect()
+    with conn:
+        if settings.DB_CREATE_ALL:
+            with startup.phase("create_all"):
+                Base.metadata.create_all(bind=conn)
+                conn.commit()
+        else:
+            with startup.phase("schema_check"):
+                startup.check_schema_revision(conn, settings.DB_SCHEMA_CHECK)
+    with startup.phase("background"):
+        event_bus.start()
+        activity_log.start()
+    startup.logger.info("Startup: %s", startup.report())
     yield
-    # Shutdown
-    pass
+    # Shutdown: runs after in-flight requests have finished. End the event
+    # streams, write out queued activities and events, then close the pool.
+    broker.close()
+    activity_log.stop()
+    event_bus.stop()
+    engine.dispose()
 
 
 app = FastAPI(
     title="LIPMS API",
     description="Live Pharmacy Inventory Management System - Backend API",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Request deadlines, innermost so throttled requests never start one
+app.add_middleware(
+    deadlines.DeadlineMiddleware,
+    default=settings.REQUEST_TIMEOUT_DEFAULT,
+    routes=settings.REQUEST_TIMEOUTS,
+    exempt_paths=settings.REQUEST_TIMEOUT_EXEMPT_PATHS,
+)
+app.add_exception_handler(OperationalError, deadlines.statement_timeout_handler)
+
+# Rate limiting and load shedding; added first so CORS headers wrap its
+# 429/503 responses and metrics count them
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        rate_limit.RateLimitMiddleware,
+        buckets=rate_limit.create_buckets(),
+        user_rate=settings.RATE_LIMIT_USER_RATE,
+        user_burst=settings.RATE_LIMIT_USER_BURST,
+        routes=settings.RATE_LIMIT_ROUTES,
+        exempt_paths=settings.RATE_LIMIT_EXEMPT_PATHS,
+        max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+        pool=engine.pool,
+        pool_overflow=pool_options.get("max_overflow", 0),
+        pool_threshold=settings.ADMISSION_POOL_THRESHOLD,
+    )
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -43,8 +104,15 @@ app.add_middleware(
     allowed_hosts=["localhost", "127.0.0.1", "*.localhost"]
 )
 
+# Outermost, so latency includes the other middleware
+if settings.METRICS_ENABLED:
+    metrics.instrument_engine(engine)
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
+if settings.PROFILER_ENABLED:
+    profiler.instrument(app)
 
 
 @app.get("/")
@@ -61,6 +129,27 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/health/background")
+async def background_health():
+    """Queue depths and throughput of the in-process background workers"""
+    return {
+        "activity_log": activity_log.stats(),
+        "event_bus": event_bus.stats(),
+        "events": broker.stats(),
+        "response_cache": response_cache.stats(),
+        "singleflight": singleflight.stats(),
+        "inventory_summary": inventory_summary.stats(),
+        "startup": startup.timings,
+    }
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        """Metrics of this worker in the Prometheus text format"""
+        return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
@@ -1,21 +1,29 @@
 # Import all models here to ensure they are registered with SQLAlchemy
 # Order matters for relationships
 
+from app.models.branch import Branch, BranchStock
 from app.models.user import User, UserRole
-from app.models.medicine import Medicine
-from app.models.order import Order, OrderItem, OrderStatus
+from app.models.medicine import Medicine, MedicineLot
+from app.models.order import Order, OrderItem, OrderStatus, OrderLotAllocation
 from app.models.activity import Activity
 from app.models.sale import Sale, SaleItem
+from app.models.stock_movement import StockMovement, StockSnapshot
 
 __all__ = [
+    "Branch",
+    "BranchStock",
     "User",
     "UserRole",
     "Medicine",
+    "MedicineLot",
     "Order",
     "OrderItem",
     "OrderStatus",
+    "OrderLotAllocation",
     "Activity",
     "Sale",
     "SaleItem",
+    "StockMovement",
+    "StockSnapshot",
 ]
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -13,7 +13,15 @@ class Activity(Base):
     activity_type = Column(String, nullable=False)
     message = Column(Text, nullable=False)
     extra_data = Column(JSON, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    # Feeds are read newest first by (created_at, id); see GET /activities/
+    __table_args__ = (
+        Index("ix_activities_created_at_id", "created_at", "id"),
+        Index("ix_activities_user_id_created_at", "user_id", "created_at", "id"),
+        Index("ix_activities_medicine_id_created_at", "medicine_id", "created_at", "id"),
+        Index("ix_activities_activity_type_created_at", "activity_type", "created_at", "id"),
+    )
 
     # Relationships
     user = relationship("User", back_populates="activities")
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.core.database import Base
+
+
+class Branch(Base):
+    __tablename__ = "branches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String, unique=True, index=True, nullable=False)
+    name = Column(String, nullable=False)
+    address = Column(String, nullable=True)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    users = relationship("User", back_populates="branch")
+
+
+class BranchStock(Base):
+    """Units of a medicine held by a branch.
+
+    Sales, orders and adjustments lock and update only their own branch's
+    rows, so branches never wait on each other for the same medicine.
+    """
+    __tablename__ = "branch_stock"
+
+    # The (branch_id, medicine_id) key is the index catalog reads join on
+    branch_id = Column(Integer, ForeignKey("branches.id"), primary_key=True)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), primary_key=True)
+    stock = Column(Integer, nullable=False, default=0)
+    # Reorder thresholds from the branch's demand forecast; NULL uses the medicine's
+    min_stock_level = Column(Integer, nullable=True)
+    max_stock_level = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        # A medicine's stock across branches
+        Index("ix_branch_stock_medicine_id", "medicine_id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, Text, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -11,7 +11,7 @@ class Medicine(Base):
     name = Column(String, nullable=False, index=True)
     description = Column(Text, nullable=True)
     price = Column(Float, nullable=False)
-    stock = Column(Integer, default=0)
+    # Stock is held per branch, in branch_stock and medicine_lots
     category = Column(String, nullable=False)
     manufacturer = Column(String, nullable=False)
     dosage = Column(String, nullable=True)
@@ -25,4 +25,34 @@ class Medicine(Base):
     # Relationships
     order_items = relationship("OrderItem", back_populates="medicine")
     activities = relationship("Activity", back_populates="medicine")
+    lots = relationship("MedicineLot", back_populates="medicine")
 
+
+class MedicineLot(Base):
+    """A batch of a medicine received by a branch. Lots are sold first-expiry-first-out.
+
+    A branch's lots of a medicine add up to its branch_stock row.
+    """
+    __tablename__ = "medicine_lots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    branch_id = Column(Integer, ForeignKey("branches.id"), nullable=False)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=False)
+    lot_number = Column(String, nullable=False)
+    # NULL for stock without a known expiry (e.g. from before lots were tracked);
+    # sold after every dated lot
+    expiry_date = Column(Date, nullable=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "branch_id", "medicine_id", "lot_number", name="uq_medicine_lots_branch_id_medicine_id_lot_number"
+        ),
+        # FEFO allocation walks a branch's lots of a medicine in expiry order
+        Index("ix_medicine_lots_branch_id_medicine_id_expiry_date", "branch_id", "medicine_id", "expiry_date"),
+        # Expiring-soon listing across the catalog
+        Index("ix_medicine_lots_expiry_date", "expiry_date"),
+    )
+
+    medicine = relationship("Medicine", back_populates="lots")
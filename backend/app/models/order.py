@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -14,11 +14,31 @@ class OrderStatus(str, enum.Enum):
     CANCELLED = "cancelled"
 
 
+# Status changes allowed from each status. Delivered and cancelled orders are
+# final; cancelling is only possible before the order has shipped, and puts
+# the ordered quantities back into stock.
+ORDER_STATUS_TRANSITIONS = {
+    OrderStatus.PENDING: {OrderStatus.CONFIRMED, OrderStatus.CANCELLED},
+    OrderStatus.CONFIRMED: {OrderStatus.PROCESSING, OrderStatus.CANCELLED},
+    OrderStatus.PROCESSING: {OrderStatus.SHIPPED, OrderStatus.CANCELLED},
+    OrderStatus.SHIPPED: {OrderStatus.DELIVERED},
+    OrderStatus.DELIVERED: set(),
+    OrderStatus.CANCELLED: set(),
+}
+
+
+def allowed_previous_statuses(new_status: OrderStatus) -> set:
+    """Statuses an order may be in for a change to `new_status` to be allowed"""
+    return {status for status, targets in ORDER_STATUS_TRANSITIONS.items() if new_status in targets}
+
+
 class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Branch fulfilling the order; not a foreign key, as on sales
+    branch_id = Column(Integer, nullable=False)
     order_number = Column(String, unique=True, index=True, nullable=False)
     status = Column(Enum(OrderStatus), default=OrderStatus.PENDING)
     total_amount = Column(Float, nullable=False)
@@ -27,6 +47,14 @@ class Order(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Indexes backing the filters on GET /orders/
+    __table_args__ = (
+        Index("ix_orders_created_at", "created_at"),
+        Index("ix_orders_customer_id_created_at", "customer_id", "created_at"),
+        Index("ix_orders_branch_id_created_at", "branch_id", "created_at"),
+        Index("ix_orders_status_created_at", "status", "created_at"),
+    )
+
     # Relationships
     customer = relationship("User", back_populates="orders")
     order_items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
@@ -36,13 +64,31 @@ class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=False)
     quantity = Column(Integer, nullable=False)
     unit_price = Column(Float, nullable=False)
     total_price = Column(Float, nullable=False)
+    # Same timestamp as the order; lets item lookups prune monthly partitions
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    # Lets "orders containing medicine X" resolve from the index alone
+    __table_args__ = (
+        Index("ix_order_items_medicine_id_order_id", "medicine_id", "order_id"),
+    )
 
     # Relationships
     order = relationship("Order", back_populates="order_items")
     medicine = relationship("Medicine", back_populates="order_items")
 
+
+class OrderLotAllocation(Base):
+    """Units an order took from a lot, so a cancellation can put them back"""
+    __tablename__ = "order_lot_allocations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No foreign key: orders may be partitioned, with a (id, created_at) key
+    order_id = Column(Integer, nullable=False, index=True)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=False)
+    lot_id = Column(Integer, ForeignKey("medicine_lots.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -10,12 +10,28 @@ class Sale(Base):
     id = Column(Integer, primary_key=True, index=True)
     sale_number = Column(String, unique=True, index=True, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Not a foreign key: adding one would validate the whole (partitioned) history
+    branch_id = Column(Integer, nullable=False)
     customer_name = Column(String, nullable=True)
     total_amount = Column(Float, nullable=False)
     payment_method = Column(String, nullable=False)  # cash, card, insurance
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Indexes backing the filters on GET /sales/
+    __table_args__ = (
+        Index("ix_sales_created_at", "created_at"),
+        Index("ix_sales_user_id_created_at", "user_id", "created_at"),
+        Index("ix_sales_branch_id_created_at", "branch_id", "created_at"),
+        Index("ix_sales_payment_method_created_at", "payment_method", "created_at"),
+        # Case-insensitive prefix search on customer_name (LIKE 'abc%')
+        Index(
+            "ix_sales_customer_name_prefix",
+            func.lower(customer_name).label("customer_name_lower"),
+            postgresql_ops={"customer_name_lower": "text_pattern_ops"},
+        ),
+    )
+
     # Relationships
     user = relationship("User", backref="sales")
     sale_items = relationship("SaleItem", back_populates="sale", cascade="all, delete-orphan")
@@ -25,14 +41,20 @@ class SaleItem(Base):
     __tablename__ = "sale_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False, index=True)
     medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=False)
     quantity = Column(Integer, nullable=False)
     unit_price = Column(Float, nullable=False)
     total_price = Column(Float, nullable=False)
     discount = Column(Float, default=0.0)
+    # Same timestamp as the sale; lets item lookups prune monthly partitions
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    # Lets "sales containing medicine X" resolve from the index alone
+    __table_args__ = (
+        Index("ix_sale_items_medicine_id_sale_id", "medicine_id", "sale_id"),
+    )
 
     # Relationships
     sale = relationship("Sale", back_populates="sale_items")
     medicine = relationship("Medicine", backref="sale_items")
-
@@ -0,0 +1,61 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class StockMovement(Base):
+    """One change of a medicine's stock in a branch. Rows are only ever inserted.
+
+    The sum of a branch's movements of a medicine is its branch_stock.
+    """
+    __tablename__ = "stock_movements"
+
+    id = Column(Integer, primary_key=True, index=True)
+    branch_id = Column(Integer, ForeignKey("branches.id"), nullable=False)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=False)
+    change = Column(Integer, nullable=False)
+    # opening, initial, sale, order, order_cancelled, adjustment or correction
+    reason = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # No foreign keys: sales and orders may be partitioned, with (id, created_at) keys
+    sale_id = Column(Integer, nullable=True)
+    order_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # Replaying a medicine's movements after its latest snapshot
+        Index("ix_stock_movements_medicine_id_id", "medicine_id", "id"),
+        # A branch's ledger, newest first
+        Index("ix_stock_movements_branch_id_id", "branch_id", "id"),
+        # Movement reports over a period
+        Index("ix_stock_movements_created_at", "created_at"),
+        Index("ix_stock_movements_sale_id", "sale_id"),
+        Index("ix_stock_movements_order_id", "order_id"),
+    )
+
+
+class StockSnapshot(Base):
+    """A branch's stock of a medicine after every movement up to `movement_id`.
+
+    Snapshots are taken in runs that share movement_id and taken_at, and only
+    for (branch, medicine) pairs that moved since the previous run, so a pair
+    without a row in a run did not move since its latest earlier one.
+    """
+    __tablename__ = "stock_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    branch_id = Column(Integer, ForeignKey("branches.id"), nullable=False)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=False)
+    movement_id = Column(Integer, nullable=False)
+    stock = Column(Integer, nullable=False)
+    # Creation time of the newest movement included
+    taken_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index(
+            "ix_stock_snapshots_medicine_id_branch_id_movement_id",
+            "medicine_id", "branch_id", "movement_id", unique=True,
+        ),
+        # Latest snapshot run at or before a time
+        Index("ix_stock_snapshots_taken_at_movement_id", "taken_at", "movement_id"),
+    )
@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+
+class ActivityFilter(BaseModel):
+    """Query-string filters for the activity feed"""
+    user_id: Optional[int] = None
+    medicine_id: Optional[int] = None
+    activity_type: Optional[str] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+
+class ActivityResponse(BaseModel):
+    id: int
+    user_id: Optional[int]
+    medicine_id: Optional[int]
+    activity_type: str
+    message: str
+    extra_data: Optional[Dict[str, Any]]
+    created_at: datetime
+
+
+class ActivityPage(BaseModel):
+    items: List[ActivityResponse]
+    # Pass as `cursor` to get the next (older) page; null on the last page
+    next_cursor: Optional[str] = None
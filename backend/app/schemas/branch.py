@@ -0,0 +1,38 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class BranchBase(BaseModel):
+    code: str
+    name: str
+    address: Optional[str] = None
+
+
+class BranchCreate(BranchBase):
+    pass
+
+
+class BranchUpdate(BaseModel):
+    name: Optional[str] = None
+    address: Optional[str] = None
+    is_active: Optional[bool] = None
+
+
+class Branch(BranchBase):
+    id: int
+    is_active: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class BranchStockLevel(BaseModel):
+    branch_id: int
+    code: str
+    name: str
+    stock: int
+
+    class Config:
+        from_attributes = True
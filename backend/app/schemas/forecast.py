@@ -0,0 +1,37 @@
+from pydantic import BaseModel
+from typing import List
+from datetime import date, datetime
+
+
+class MedicineForecast(BaseModel):
+    medicine_id: int
+    name: str
+    category: str
+    stock: int
+    moving_average: float  # units per day over the window
+    smoothed_demand: float  # units per day, exponentially smoothed
+    demand_std: float  # daily standard deviation over the window
+    safety_stock: int
+    reorder_point: int
+    order_quantity: int
+    min_stock_level: int
+    max_stock_level: int
+    needs_reorder: bool
+
+
+class ForecastResponse(BaseModel):
+    generated_at: datetime
+    history_start: date
+    history_end: date
+    window_days: int
+    smoothing: float
+    lead_time_days: float
+    review_days: float
+    service_level: float
+    total: int
+    items: List[MedicineForecast]
+
+
+class ForecastApplyResult(BaseModel):
+    updated: int
+    skipped: int  # medicines without sales in the history window
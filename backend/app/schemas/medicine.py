@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import date, datetime
 
 
 class MedicineBase(BaseModel):
@@ -48,8 +48,61 @@ class Medicine(MedicineInDB):
     pass
 
 
+# Largest id list accepted by the batch lookup (GET/POST /medicines/batch)
+MEDICINE_BATCH_MAX_IDS = 500
+
+
+class MedicineBatchRequest(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=MEDICINE_BATCH_MAX_IDS)
+
+
+class MedicineBatch(BaseModel):
+    items: List[Medicine]  # in request order, duplicates dropped
+    missing: List[int]  # requested ids with no medicine
+
+
 class StockUpdate(BaseModel):
     medicine_id: int
     quantity: int
     operation: str  # 'add' or 'subtract'
+    # Lot receiving added units; the UNTRACKED lot if not given
+    lot_number: Optional[str] = None
+    expiry_date: Optional[date] = None
+
+
+class MedicineLot(BaseModel):
+    id: int
+    branch_id: int
+    medicine_id: int
+    lot_number: str
+    expiry_date: Optional[date]  # None for stock without a known expiry
+    quantity: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ExpiringLot(MedicineLot):
+    medicine_name: str
+    expired: bool
+
+
+class StockTotals(BaseModel):
+    medicines: int
+    units: int
+    value: float  # stock x price
+    out_of_stock: int  # stock <= 0
+    low_stock: int  # stock <= min_stock_level (includes out of stock)
+    overstock: int  # stock > max_stock_level
+
+
+class GroupStockTotals(StockTotals):
+    name: str
+
 
+class InventorySummary(BaseModel):
+    computed_at: datetime
+    totals: StockTotals
+    by_category: List[GroupStockTotals]
+    by_manufacturer: List[GroupStockTotals]
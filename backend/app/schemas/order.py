@@ -0,0 +1,77 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+from app.models.order import OrderStatus
+
+
+class OrderFilter(BaseModel):
+    """Query-string filters for listing orders"""
+    status: Optional[OrderStatus] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    customer_id: Optional[int] = None
+    branch_id: Optional[int] = None
+    medicine_id: Optional[int] = None
+    min_total: Optional[float] = None
+    max_total: Optional[float] = None
+
+
+class OrderItemCreate(BaseModel):
+    medicine_id: int
+    quantity: int = Field(gt=0)
+
+
+class OrderCreate(BaseModel):
+    shipping_address: str
+    notes: Optional[str] = None
+    items: List[OrderItemCreate] = Field(min_length=1)
+
+
+class OrderItemResponse(BaseModel):
+    medicine_id: int
+    medicine_name: str
+    quantity: int
+    unit_price: float
+    total_price: float
+
+
+class OrderResponse(BaseModel):
+    id: int
+    order_number: str
+    branch_id: int
+    status: OrderStatus
+    total_amount: float
+    shipping_address: str
+    notes: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+    items: List[OrderItemResponse]
+
+
+class OrderCreateResponse(BaseModel):
+    id: int
+    order_number: str
+    status: OrderStatus
+    total_amount: float
+    message: str
+
+
+class OrderStatusUpdate(BaseModel):
+    status: OrderStatus
+
+
+class BulkOrderStatusUpdate(BaseModel):
+    order_ids: List[int] = Field(min_length=1)
+    status: OrderStatus
+
+
+class OrderStatusResult(BaseModel):
+    order_id: int
+    updated: bool
+    status: Optional[OrderStatus]  # status after the request; None if not found
+    detail: Optional[str] = None
+
+
+class BulkOrderStatusResponse(BaseModel):
+    updated: int
+    results: List[OrderStatusResult]
@@ -0,0 +1,40 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+from datetime import datetime
+
+
+class ProfileJobCreate(BaseModel):
+    """Profile the next `count` requests matching the route and/or token"""
+    count: int = Field(1, ge=1, le=100)
+    # Path template as routed, e.g. /api/v1/orders/{order_id}
+    route: Optional[str] = None
+    method: Optional[str] = None
+    # Matched against the X-Profile-Token request header
+    token: Optional[str] = None
+
+    @model_validator(mode="after")
+    def require_match(self):
+        if not self.route and not self.token:
+            raise ValueError("Set route or token")
+        return self
+
+
+class ProfileJob(BaseModel):
+    id: str
+    count: int
+    remaining: int
+    route: Optional[str]
+    method: Optional[str]
+    token: Optional[str]
+
+
+class StoredProfile(BaseModel):
+    name: str
+    created_at: datetime
+    files: List[str]
+
+
+class ProfilerStatus(BaseModel):
+    enabled: bool
+    jobs: List[ProfileJob]
+    profiles: List[StoredProfile]
@@ -33,6 +33,7 @@ class SaleCreate(BaseModel):
 class SaleResponse(BaseModel):
     id: int
     sale_number: str
+    branch_id: int
     customer_name: Optional[str]
     total_amount: float
     payment_method: str
@@ -43,3 +44,16 @@ class SaleResponse(BaseModel):
     class Config:
         from_attributes = True
 
+
+
+class SaleFilter(BaseModel):
+    """Query-string filters for listing sales"""
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    payment_method: Optional[str] = None
+    user_id: Optional[int] = None
+    branch_id: Optional[int] = None
+    customer_name: Optional[str] = None  # case-insensitive prefix
+    medicine_id: Optional[int] = None
+    min_total: Optional[float] = None
+    max_total: Optional[float] = None
@@ -0,0 +1,59 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from datetime import datetime
+
+
+class StockMovementFilter(BaseModel):
+    """Query-string filters for the stock ledger"""
+    medicine_id: Optional[int] = None
+    reason: Optional[str] = None
+    sale_id: Optional[int] = None
+    order_id: Optional[int] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+
+class StockMovementResponse(BaseModel):
+    id: int
+    branch_id: int
+    medicine_id: int
+    change: int
+    reason: str
+    user_id: Optional[int]
+    sale_id: Optional[int]
+    order_id: Optional[int]
+    created_at: datetime
+
+
+class StockMovementPage(BaseModel):
+    items: List[StockMovementResponse]
+    # Pass as `cursor` to get the next (older) page; null on the last page
+    next_cursor: Optional[int] = None
+
+
+class StockLevel(BaseModel):
+    medicine_id: int
+    stock: int
+
+
+class StockLevels(BaseModel):
+    branch_id: int
+    at: Optional[datetime]  # None: after every movement
+    items: List[StockLevel]
+
+
+class StockMovementTotals(BaseModel):
+    medicine_id: int
+    name: str
+    opening: int  # stock at `start`
+    received: int  # units added in the period
+    removed: int  # units taken out in the period
+    closing: int  # stock at `end`
+    by_reason: Dict[str, int]  # net change per reason
+
+
+class StockMovementReport(BaseModel):
+    branch_id: int
+    start: datetime
+    end: datetime
+    items: List[StockMovementTotals]
@@ -20,10 +20,15 @@ class UserUpdate(BaseModel):
     avatar_url: Optional[str] = None
 
 
+class UserAdminUpdate(UserUpdate):
+    branch_id: Optional[int] = None
+
+
 class UserInDB(UserBase):
     id: int
     is_active: bool
     avatar_url: Optional[str]
+    branch_id: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime]
 
@@ -0,0 +1,83 @@
+"""
+Production server entry point.
+
+    python -m app.serve [--workers N] [--host H] [--port P]
+
+Runs uvicorn with the WEB_* tunables from Settings: worker processes sharing
+one listening socket, uvloop and httptools, keep-alive, listen backlog and a
+per-worker concurrency limit. On SIGTERM/SIGINT each worker stops accepting
+connections, lets in-flight requests finish (up to WEB_GRACEFUL_TIMEOUT
+seconds) and then runs the application's lifespan shutdown, which flushes
+the background queues and closes the database pool. Use run.py for local
+development with auto-reload.
+"""
+
+import argparse
+import os
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from app.core.config import settings
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that ends server-push streams as soon as shutdown starts.
+
+    SSE and WebSocket connections never finish on their own, so without this
+    every shutdown would wait out the full graceful timeout.
+    """
+
+    def handle_exit(self, sig, frame) -> None:
+        if not self.should_exit:
+            from app.core.events import broker
+            broker.close()
+        super().handle_exit(sig, frame)
+
+
+def worker_count() -> int:
+    """WEB_WORKERS, or one worker per CPU when it is 0"""
+    return settings.WEB_WORKERS or os.cpu_count() or 1
+
+
+def build_config(**overrides) -> uvicorn.Config:
+    options = dict(
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=worker_count(),
+        loop=settings.WEB_LOOP,
+        http=settings.WEB_HTTP,
+        backlog=settings.WEB_BACKLOG,
+        timeout_keep_alive=settings.WEB_KEEPALIVE_SECONDS,
+        limit_concurrency=settings.WEB_LIMIT_CONCURRENCY,
+        limit_max_requests=settings.WEB_LIMIT_MAX_REQUESTS,
+        timeout_graceful_shutdown=settings.WEB_GRACEFUL_TIMEOUT,
+        proxy_headers=settings.WEB_PROXY_HEADERS,
+        forwarded_allow_ips=settings.WEB_FORWARDED_ALLOW_IPS,
+        access_log=settings.WEB_ACCESS_LOG,
+        lifespan="on",
+    )
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return uvicorn.Config("app.main:app", **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, help="worker processes (default: WEB_WORKERS)")
+    parser.add_argument("--host", help="bind address (default: HOST)")
+    parser.add_argument("--port", type=int, help="bind port (default: PORT)")
+    args = parser.parse_args()
+
+    config = build_config(workers=args.workers, host=args.host, port=args.port)
+    server = DrainingServer(config)
+
+    if config.workers > 1:
+        # Same as uvicorn.run(), but every worker runs DrainingServer
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
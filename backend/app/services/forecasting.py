@@ -0,0 +1,215 @@
+"""
+Demand forecasting and reorder points.
+
+Daily unit demand per medicine (sales plus orders that were not cancelled)
+comes back from one grouped query over sale_items and order_items. The
+statistics are then computed for the whole catalog at once with
+`numpy.bincount` over the (medicine, day, units) rows, so memory and time
+grow with the number of rows rather than medicines x days:
+
+- moving average and standard deviation of daily demand over the last
+  `window_days` (days without sales count as zero)
+- simple exponential smoothing over the whole history: each day's units
+  weighted by alpha * (1 - alpha) ** age_in_days
+
+From the smoothed daily demand d and the deviation s:
+
+    safety stock   = z * s * sqrt(lead time)       (z from the service level)
+    reorder point  = d * lead time + safety stock  -> min_stock_level
+    order quantity = d * review days               -> max_stock_level = reorder point + order quantity
+
+Reorder points are applied per branch, from the branch's own demand, to its
+branch_stock rows; the medicines' levels stay the catalog-wide defaults.
+"""
+
+import math
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from statistics import NormalDist
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import Integer, bindparam, cast, extract, func, select, union_all, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.branch import BranchStock
+from app.models.medicine import Medicine
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.sale import Sale, SaleItem
+
+
+@dataclass
+class Forecast:
+    """Per-medicine arrays, aligned with `medicine_ids`"""
+    medicine_ids: np.ndarray
+    has_history: np.ndarray
+    moving_average: np.ndarray
+    smoothed_demand: np.ndarray
+    demand_std: np.ndarray
+    safety_stock: np.ndarray
+    reorder_point: np.ndarray
+    order_quantity: np.ndarray
+
+
+@dataclass
+class ForecastSettings:
+    history_days: int
+    window_days: int
+    smoothing: float
+    lead_time_days: float
+    review_days: float
+    service_level: float
+
+    @classmethod
+    def resolve(cls, **overrides) -> "ForecastSettings":
+        """The FORECAST_* settings, with any non-None `overrides` applied"""
+        resolved = cls(
+            history_days=settings.FORECAST_HISTORY_DAYS,
+            window_days=settings.FORECAST_WINDOW_DAYS,
+            smoothing=settings.FORECAST_SMOOTHING,
+            lead_time_days=settings.FORECAST_LEAD_TIME_DAYS,
+            review_days=settings.FORECAST_REVIEW_DAYS,
+            service_level=settings.FORECAST_SERVICE_LEVEL,
+        )
+        for name, value in overrides.items():
+            if value is not None:
+                setattr(resolved, name, value)
+        resolved.window_days = min(resolved.window_days, resolved.history_days)
+        return resolved
+
+
+def history_bounds(history_days: int, end: Optional[date] = None):
+    """[start, end) of the history: the last `history_days` full days before `end` (default today, UTC)"""
+    end = end or datetime.now(timezone.utc).date()
+    return end - timedelta(days=history_days), end
+
+
+def _day_index(column, start: datetime):
+    """Whole days between `start` and a timestamp column, computed by the database"""
+    return cast(func.floor((extract("epoch", column) - start.timestamp()) / 86400), Integer)
+
+
+def load_daily_demand(db: Session, start: date, end: date, branch_id: Optional[int] = None) -> np.ndarray:
+    """(medicine_id, day, units) rows for [start, end), day 0 being `start`, as an int64 array.
+
+    Sales and non-cancelled orders, of one branch or of all of them, are
+    combined and grouped by the database in one query; both tables are
+    filtered on created_at, so partitions outside the history are skipped.
+    """
+    start_at = datetime.combine(start, time.min, tzinfo=timezone.utc)
+    end_at = datetime.combine(end, time.min, tzinfo=timezone.utc)
+    sales = select(
+        SaleItem.medicine_id.label("medicine_id"),
+        _day_index(SaleItem.created_at, start_at).label("day"),
+        SaleItem.quantity.label("quantity"),
+    ).where(SaleItem.created_at >= start_at, SaleItem.created_at < end_at)
+    orders = (
+        select(
+            OrderItem.medicine_id,
+            _day_index(OrderItem.created_at, start_at),
+            OrderItem.quantity,
+        )
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(
+            OrderItem.created_at >= start_at,
+            OrderItem.created_at < end_at,
+            Order.status != OrderStatus.CANCELLED,
+        )
+    )
+    if branch_id is not None:
+        sales = sales.where(SaleItem.sale_id.in_(select(Sale.id).where(Sale.branch_id == branch_id)))
+        orders = orders.where(Order.branch_id == branch_id)
+    demand = union_all(sales, orders).subquery()
+    rows = db.execute(
+        select(demand.c.medicine_id, demand.c.day, func.sum(demand.c.quantity))
+        .group_by(demand.c.medicine_id, demand.c.day)
+    ).all()
+    return np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+
+def compute_forecast(medicine_ids: np.ndarray, demand: np.ndarray, days: int, config: ForecastSettings) -> Forecast:
+    """Forecast every medicine in `medicine_ids` from (medicine_id, day, units) rows over `days` days"""
+    n = len(medicine_ids)
+    # Row of each medicine id (ids are dense serials, so a lookup table is
+    # small and much faster than searching); -1 for medicines not forecast
+    lookup = np.full(max(int(medicine_ids.max(initial=0)), int(demand[:, 0].max(initial=0))) + 1, -1, dtype=np.int64)
+    lookup[medicine_ids] = np.arange(n)
+    positions = lookup[demand[:, 0]]
+    known = positions >= 0
+    if not known.all():
+        positions, demand = positions[known], demand[known]
+    rows, day, units = positions, demand[:, 1], demand[:, 2].astype(np.float64)
+
+    has_history = np.bincount(rows, minlength=n) > 0
+
+    in_window = day >= days - config.window_days
+    window_rows, window_units = rows[in_window], units[in_window]
+    moving_average = np.bincount(window_rows, weights=window_units, minlength=n) / config.window_days
+    mean_square = np.bincount(window_rows, weights=window_units * window_units, minlength=n) / config.window_days
+    demand_std = np.sqrt(np.maximum(mean_square - moving_average ** 2, 0.0))
+
+    # Weight of a day's units in the smoothed level, by day index
+    alpha = config.smoothing
+    decay = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=np.float64)
+    smoothed = np.bincount(rows, weights=units * decay[day], minlength=n)
+
+    z = NormalDist().inv_cdf(config.service_level)
+    safety_stock = np.ceil(z * demand_std * math.sqrt(config.lead_time_days))
+    reorder_point = np.ceil(smoothed * config.lead_time_days) + safety_stock
+    order_quantity = np.ceil(smoothed * config.review_days)
+
+    return Forecast(
+        medicine_ids=medicine_ids,
+        has_history=has_history,
+        moving_average=moving_average,
+        smoothed_demand=smoothed,
+        demand_std=demand_std,
+        safety_stock=safety_stock.astype(np.int64),
+        reorder_point=reorder_point.astype(np.int64),
+        order_quantity=order_quantity.astype(np.int64),
+    )
+
+
+def forecast_medicines(
+    db: Session, medicine_ids, config: ForecastSettings, end: Optional[date] = None, branch_id: Optional[int] = None
+) -> Forecast:
+    """Forecast the given medicines from the last `config.history_days` days, in one branch or all of them"""
+    start, end = history_bounds(config.history_days, end)
+    medicine_ids = np.asarray(medicine_ids, dtype=np.int64)
+    return compute_forecast(medicine_ids, load_daily_demand(db, start, end, branch_id), config.history_days, config)
+
+
+def forecast_catalog(db: Session, config: ForecastSettings, branch_id: int, end: Optional[date] = None) -> Forecast:
+    """Forecast every active medicine from the demand of one branch"""
+    medicine_ids = db.execute(
+        select(Medicine.id).where(Medicine.is_active == True).order_by(Medicine.id)
+    ).scalars().all()
+    return forecast_medicines(db, medicine_ids, config, end, branch_id=branch_id)
+
+
+def apply_reorder_points(db: Session, forecast: Forecast, branch_id: int, batch_size: int = 5000) -> int:
+    """Set a branch's min/max_stock_level from its forecast for medicines with sales history there.
+
+    Medicines without history keep their current levels in the branch (the
+    medicine's own if never set). Nothing is committed. Returns the number
+    of medicines updated.
+    """
+    selected = np.flatnonzero(forecast.has_history)
+    table = BranchStock.__table__
+    statement = (
+        update(table)
+        .where(table.c.branch_id == branch_id, table.c.medicine_id == bindparam("b_id"))
+        .values(min_stock_level=bindparam("b_min"), max_stock_level=bindparam("b_max"))
+    )
+    for offset in range(0, len(selected), batch_size):
+        chunk = selected[offset:offset + batch_size]
+        db.execute(statement, [
+            {"b_id": medicine_id, "b_min": reorder_point, "b_max": reorder_point + order_quantity}
+            for medicine_id, reorder_point, order_quantity in zip(
+                forecast.medicine_ids[chunk].tolist(),
+                forecast.reorder_point[chunk].tolist(),
+                forecast.order_quantity[chunk].tolist(),
+            )
+        ])
+    return len(selected)
@@ -0,0 +1,440 @@
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import Row, bindparam, case, func, insert, or_, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.activity_log import activity_log
+from app.core.metrics import stock_decrements
+from app.models.branch import BranchStock
+from app.models.medicine import Medicine, MedicineLot
+from app.models.order import Order, OrderItem, OrderLotAllocation
+from app.services.stock_ledger import record_cancellations, record_movements
+
+# Lot holding stock without a known lot number or expiry date
+UNTRACKED_LOT = "UNTRACKED"
+
+# (lot id, medicine id, units taken from the lot)
+Allocation = Tuple[int, int, int]
+
+# (order id, branch id, medicine id, units returned, branch stock after the restore)
+Restock = Tuple[int, int, int, int, int]
+
+MEDICINE_COLUMNS = (
+    Medicine.id,
+    Medicine.name,
+    Medicine.description,
+    Medicine.price,
+    Medicine.category,
+    Medicine.manufacturer,
+    Medicine.dosage,
+    Medicine.prescription_required,
+    Medicine.is_active,
+    Medicine.created_at,
+    Medicine.updated_at,
+)
+
+# A branch's stock of a medicine; 0 where it has no branch_stock row
+branch_stock = func.coalesce(BranchStock.stock, 0)
+# A branch's reorder thresholds; the medicine's where the branch has none
+branch_min_stock = func.coalesce(BranchStock.min_stock_level, Medicine.min_stock_level)
+branch_max_stock = func.coalesce(BranchStock.max_stock_level, Medicine.max_stock_level)
+
+
+def medicines_in_branch(db: Session, branch_id: int):
+    """Query of medicine rows with the branch's stock and thresholds, in the shape of the Medicine schema.
+
+    The join is on the (branch_id, medicine_id) key of branch_stock, one
+    index lookup per medicine.
+    """
+    return db.query(
+        *MEDICINE_COLUMNS,
+        branch_stock.label("stock"),
+        branch_min_stock.label("min_stock_level"),
+        branch_max_stock.label("max_stock_level"),
+    ).outerjoin(
+        BranchStock, (BranchStock.medicine_id == Medicine.id) & (BranchStock.branch_id == branch_id)
+    )
+
+
+def lock_branch_stock(
+    db: Session, branch_id: int, medicine_ids: Iterable[int], create: bool = False
+) -> Dict[int, BranchStock]:
+    """Lock a branch's stock rows of the given medicines, keyed by medicine id.
+
+    Rows are locked with SELECT ... FOR UPDATE in medicine id order, so
+    concurrent writers in a branch queue up in the same order instead of
+    deadlocking; other branches' rows are never touched. With `create`,
+    missing rows are inserted first with no stock. Nothing is committed.
+    """
+    ids = sorted(set(medicine_ids))
+    if create and ids:
+        dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        db.execute(
+            dialect_insert(BranchStock)
+            .values([{"branch_id": branch_id, "medicine_id": medicine_id, "stock": 0} for medicine_id in ids])
+            .on_conflict_do_nothing()
+        )
+    rows = (
+        db.query(BranchStock)
+        .filter(BranchStock.branch_id == branch_id, BranchStock.medicine_id.in_(ids))
+        .order_by(BranchStock.medicine_id)
+        .with_for_update()
+        .all()
+    )
+    return {row.medicine_id: row for row in rows}
+
+
+def allocate_lots(
+    db: Session, branch_id: int, quantities: Dict[int, int], include_expired: bool = False
+) -> List[Allocation]:
+    """Take units from a branch's lots of the medicines, first expiry first out.
+
+    One SELECT walks each medicine's lots in (expiry_date, id) order along
+    the (branch_id, medicine_id, expiry_date) index, keeping a running total
+    with a window function, and returns only the lots needed to cover the
+    requested quantity; one UPDATE then decrements them all. Lots without
+    an expiry date go last. Expired lots are skipped unless
+    `include_expired` (used when writing stock off).
+
+    The caller must hold the branch stock row locks, and branch_stock is
+    left to the caller. Nothing is committed. Raises 400 if a medicine has
+    too few usable units.
+    """
+    if not quantities:
+        return []
+    usable = [
+        MedicineLot.branch_id == branch_id,
+        MedicineLot.medicine_id.in_(quantities),
+        MedicineLot.quantity > 0,
+    ]
+    if not include_expired:
+        usable.append(or_(MedicineLot.expiry_date.is_(None), MedicineLot.expiry_date >= date.today()))
+    running = func.sum(MedicineLot.quantity).over(
+        partition_by=MedicineLot.medicine_id,
+        order_by=(MedicineLot.expiry_date.asc().nulls_last(), MedicineLot.id),
+    )
+    lots = (
+        select(
+            MedicineLot.id,
+            MedicineLot.medicine_id,
+            MedicineLot.quantity,
+            (running - MedicineLot.quantity).label("before"),
+        )
+        .where(*usable)
+        .subquery()
+    )
+    rows = db.execute(
+        select(lots.c.id, lots.c.medicine_id, lots.c.quantity, lots.c.before)
+        .where(lots.c.before < case(quantities, value=lots.c.medicine_id))
+    ).all()
+
+    allocations: List[Allocation] = []
+    allocated: Dict[int, int] = dict.fromkeys(quantities, 0)
+    for lot_id, medicine_id, available, before in rows:
+        taken = min(available, quantities[medicine_id] - before)
+        allocations.append((lot_id, medicine_id, taken))
+        allocated[medicine_id] += taken
+
+    for medicine_id, wanted in quantities.items():
+        if allocated[medicine_id] < wanted:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Insufficient unexpired stock for medicine {medicine_id}. Available: {allocated[medicine_id]}, Requested: {wanted}"
+            )
+
+    db.execute(
+        update(MedicineLot)
+        .where(MedicineLot.id.in_([lot_id for lot_id, _, _ in allocations]))
+        .values(quantity=MedicineLot.quantity - case(
+            {lot_id: taken for lot_id, _, taken in allocations}, value=MedicineLot.id
+        )),
+        execution_options={"synchronize_session": False},
+    )
+    return allocations
+
+
+def receive_lot(
+    db: Session,
+    branch_id: int,
+    medicine_id: int,
+    quantity: int,
+    lot_number: Optional[str] = None,
+    expiry_date: Optional[date] = None,
+) -> MedicineLot:
+    """Add units to a branch's lot of a medicine, creating the lot if it is new.
+
+    Without a lot number the units go to the UNTRACKED lot. The caller must
+    hold the branch stock row lock and update branch_stock. Nothing is
+    committed.
+    """
+    lot_number = lot_number or UNTRACKED_LOT
+    lot = db.query(MedicineLot).filter(
+        MedicineLot.branch_id == branch_id,
+        MedicineLot.medicine_id == medicine_id,
+        MedicineLot.lot_number == lot_number,
+    ).first()
+    if lot is None:
+        lot = MedicineLot(
+            branch_id=branch_id, medicine_id=medicine_id, lot_number=lot_number, expiry_date=expiry_date, quantity=0
+        )
+        db.add(lot)
+    elif expiry_date is not None and lot.expiry_date != expiry_date:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Lot {lot_number} already exists with expiry date {lot.expiry_date}"
+        )
+    lot.quantity += quantity
+    return lot
+
+
+def adjust_stock(
+    db: Session,
+    row: BranchStock,
+    change: int,
+    user_id: Optional[int],
+    reason: str = "adjustment",
+    lot_number: Optional[str] = None,
+    expiry_date: Optional[date] = None,
+) -> None:
+    """Change a locked branch stock row (see lock_branch_stock) by `change` units, through its lots.
+
+    Additions are received into a lot (see receive_lot); removals are
+    written off first expiry first out, expired lots included. The change is
+    recorded in the stock ledger under `reason`. Nothing is committed.
+    """
+    if change > 0:
+        receive_lot(db, row.branch_id, row.medicine_id, change, lot_number, expiry_date)
+    elif change < 0:
+        allocate_lots(db, row.branch_id, {row.medicine_id: -change}, include_expired=True)
+    row.stock += change
+    record_movements(db, row.branch_id, {row.medicine_id: change}, reason, user_id=user_id)
+
+
+def reconcile_lots(db: Session) -> int:
+    """Put branch stock that no lot accounts for into the UNTRACKED lots.
+
+    For stock written without lots (seed scripts, bulk loads, direct SQL),
+    so that every unit can be allocated. Stock is never taken away from
+    lots. Nothing is committed. Returns the number of (branch, medicine)
+    rows fixed.
+    """
+    lot_totals = (
+        select(MedicineLot.branch_id, MedicineLot.medicine_id, func.sum(MedicineLot.quantity).label("quantity"))
+        .group_by(MedicineLot.branch_id, MedicineLot.medicine_id)
+        .subquery()
+    )
+    missing = BranchStock.stock - func.coalesce(lot_totals.c.quantity, 0)
+    shortfalls = {
+        (branch_id, medicine_id): quantity
+        for branch_id, medicine_id, quantity in db.execute(
+            select(BranchStock.branch_id, BranchStock.medicine_id, missing)
+            .outerjoin(lot_totals, (lot_totals.c.branch_id == BranchStock.branch_id)
+                       & (lot_totals.c.medicine_id == BranchStock.medicine_id))
+            .where(missing > 0)
+        )
+    }
+    if not shortfalls:
+        return 0
+
+    untracked = set(db.execute(
+        select(MedicineLot.branch_id, MedicineLot.medicine_id)
+        .where(MedicineLot.lot_number == UNTRACKED_LOT)
+        .where(tuple_(MedicineLot.branch_id, MedicineLot.medicine_id).in_(list(shortfalls)))
+    ).tuples())
+    if untracked:
+        lots = MedicineLot.__table__
+        db.execute(
+            update(lots)
+            .where(
+                lots.c.branch_id == bindparam("b_branch_id"),
+                lots.c.medicine_id == bindparam("b_medicine_id"),
+                lots.c.lot_number == UNTRACKED_LOT,
+            )
+            .values(quantity=lots.c.quantity + bindparam("b_quantity")),
+            [
+                {"b_branch_id": branch_id, "b_medicine_id": medicine_id, "b_quantity": shortfalls[branch_id, medicine_id]}
+                for branch_id, medicine_id in untracked
+            ],
+        )
+    new = [key for key in shortfalls if key not in untracked]
+    if new:
+        db.execute(insert(MedicineLot), [
+            {
+                "branch_id": branch_id,
+                "medicine_id": medicine_id,
+                "lot_number": UNTRACKED_LOT,
+                "expiry_date": None,
+                "quantity": shortfalls[branch_id, medicine_id],
+            }
+            for branch_id, medicine_id in new
+        ])
+    return len(shortfalls)
+
+
+def reserve_stock(
+    db: Session, branch_id: int, quantities: Dict[int, int]
+) -> Tuple[Dict[int, Row], Dict[int, int], List[Allocation]]:
+    """Lock, check and decrement a branch's stock for several medicines at once.
+
+    `quantities` maps medicine id to the number of units to take. The
+    branch's stock rows are locked through lock_branch_stock, so the stock
+    check cannot race with another writer in the branch and other branches
+    are not blocked. All decrements are applied with a single UPDATE, and
+    the units are taken from the branch's unexpired lots through
+    allocate_lots. Nothing is committed; the caller owns the transaction.
+
+    Returns the medicines keyed by id (medicines_in_branch rows, with the
+    branch's thresholds), the branch's stock of each after the decrement,
+    and the lot allocations.
+    """
+    ids: List[int] = sorted(quantities)
+    by_id = {medicine.id: medicine for medicine in medicines_in_branch(db, branch_id).filter(Medicine.id.in_(ids))}
+    rows = lock_branch_stock(db, branch_id, ids)
+
+    for medicine_id in ids:
+        medicine = by_id.get(medicine_id)
+        if medicine is None:
+            raise HTTPException(status_code=404, detail=f"Medicine {medicine_id} not found")
+        available = rows[medicine_id].stock if medicine_id in rows else 0
+        if available < quantities[medicine_id]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Insufficient stock for {medicine.name}. Available: {available}, Requested: {quantities[medicine_id]}"
+            )
+
+    allocations = allocate_lots(db, branch_id, quantities)
+    db.execute(
+        update(BranchStock)
+        .where(BranchStock.branch_id == branch_id, BranchStock.medicine_id.in_(ids))
+        .values(stock=BranchStock.stock - case(quantities, value=BranchStock.medicine_id)),
+        execution_options={"synchronize_session": False},
+    )
+
+    stock = {medicine_id: rows[medicine_id].stock - quantities[medicine_id] for medicine_id in ids}
+    return by_id, stock, allocations
+
+
+def record_order_allocations(db: Session, order_id: int, allocations: List[Allocation]) -> None:
+    """Remember which lots an order took units from, with one bulk INSERT"""
+    db.execute(insert(OrderLotAllocation), [
+        {"order_id": order_id, "lot_id": lot_id, "medicine_id": medicine_id, "quantity": quantity}
+        for lot_id, medicine_id, quantity in allocations
+    ])
+
+
+def low_stock_event(medicine: Row, branch_id: int, stock: int) -> dict:
+    """Payload of the stock.low event for a medicine (medicines_in_branch row) in a branch"""
+    return {
+        "medicine_id": medicine.id,
+        "branch_id": branch_id,
+        "name": medicine.name,
+        "stock": stock,
+        "min_stock_level": medicine.min_stock_level,
+    }
+
+
+def low_stock_crossings(
+    medicines: Dict[int, Row], branch_id: int, stock: Dict[int, int], quantities: Dict[int, int]
+) -> List[dict]:
+    """stock.low payloads for medicines a decrement just took to or below the branch's min_stock_level.
+
+    `medicines` are medicines_in_branch rows, as returned by reserve_stock,
+    and `stock` is the branch's stock after the decrement.
+    """
+    return [
+        low_stock_event(medicine, branch_id, stock[medicine_id])
+        for medicine_id, medicine in medicines.items()
+        if stock[medicine_id] + quantities[medicine_id] > medicine.min_stock_level >= stock[medicine_id]
+    ]
+
+
+def log_stock_changes(user_id: int, changes: Dict[int, int], stock: Dict[int, int], reason: str, **references) -> None:
+    """Record a stock_changed activity per medicine and count the decrements.
+
+    `changes` maps medicine id to the signed change and `stock` to the level
+    after it. Call after committing, with values read before the commit.
+    """
+    for medicine_id, change in changes.items():
+        if change < 0:
+            stock_decrements.inc(reason, amount=-change)
+        activity_log.log(
+            "stock_changed",
+            f"Stock {change:+d} ({reason}), now {stock[medicine_id]}",
+            user_id=user_id,
+            medicine_id=medicine_id,
+            extra_data={"change": change, "stock": stock[medicine_id], "reason": reason, **references},
+        )
+
+
+def restore_order_stock(db: Session, order_ids: List[int], user_id: Optional[int] = None) -> List[Restock]:
+    """Put the items of the given orders back into their branches' stock.
+
+    Affected branch stock rows are locked in (branch, medicine) order first,
+    which within a branch is the order reserve_stock uses, then all
+    quantities are added back with one UPDATE ... FROM over the aggregated
+    order items, and the lots the orders were allocated from get their
+    units back the same way. The restocks are recorded in the stock ledger
+    as made by `user_id`. Nothing is committed. Returns what was returned
+    per order and medicine with the level it left the stock at, taking the
+    orders in id order, for log_stock_changes.
+    """
+    if not order_ids:
+        return []
+
+    returned = (
+        select(Order.branch_id, OrderItem.medicine_id, func.sum(OrderItem.quantity).label("quantity"))
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(OrderItem.order_id.in_(order_ids))
+        .group_by(Order.branch_id, OrderItem.medicine_id)
+        .subquery()
+    )
+
+    db.execute(
+        select(BranchStock.medicine_id)
+        .where(tuple_(BranchStock.branch_id, BranchStock.medicine_id).in_(
+            select(returned.c.branch_id, returned.c.medicine_id)
+        ))
+        .order_by(BranchStock.branch_id, BranchStock.medicine_id)
+        .with_for_update()
+    ).scalars().all()
+    db.execute(
+        update(BranchStock)
+        .where(BranchStock.branch_id == returned.c.branch_id, BranchStock.medicine_id == returned.c.medicine_id)
+        .values(stock=BranchStock.stock + returned.c.quantity),
+        execution_options={"synchronize_session": False},
+    )
+
+    allocated = (
+        select(OrderLotAllocation.lot_id, func.sum(OrderLotAllocation.quantity).label("quantity"))
+        .where(OrderLotAllocation.order_id.in_(order_ids))
+        .group_by(OrderLotAllocation.lot_id)
+        .subquery()
+    )
+    db.execute(
+        update(MedicineLot)
+        .where(MedicineLot.id == allocated.c.lot_id)
+        .values(quantity=MedicineLot.quantity + allocated.c.quantity),
+        execution_options={"synchronize_session": False},
+    )
+    record_cancellations(db, order_ids, user_id)
+
+    rows = db.execute(
+        select(Order.id, Order.branch_id, OrderItem.medicine_id, func.sum(OrderItem.quantity), BranchStock.stock)
+        .join(Order, Order.id == OrderItem.order_id)
+        .join(BranchStock, (BranchStock.branch_id == Order.branch_id) & (BranchStock.medicine_id == OrderItem.medicine_id))
+        .where(OrderItem.order_id.in_(order_ids))
+        .group_by(Order.id, Order.branch_id, OrderItem.medicine_id, BranchStock.stock)
+        .order_by(Order.id, OrderItem.medicine_id)
+    ).all()
+
+    # Every row carries the final level; run up from the level before the restock instead
+    levels: Dict[Tuple[int, int], int] = {}
+    for _, branch_id, medicine_id, quantity, stock in rows:
+        levels[branch_id, medicine_id] = levels.get((branch_id, medicine_id), stock) - quantity
+    restocks = []
+    for order_id, branch_id, medicine_id, quantity, _ in rows:
+        levels[branch_id, medicine_id] += quantity
+        restocks.append((order_id, branch_id, medicine_id, quantity, levels[branch_id, medicine_id]))
+    return restocks
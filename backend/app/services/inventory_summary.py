@@ -0,0 +1,287 @@
+"""
+Inventory valuation and stock-health summary.
+
+One aggregate query over the active medicines and a branch's stock of them
+gives, for the whole catalog and per category and manufacturer: medicine
+count, units in stock, stock value (stock x price), and how many medicines
+are out of stock (stock <= 0), low (stock <= the branch's min_stock_level,
+as GET /medicines/low-stock/) or overstocked (stock > its max_stock_level).
+On Postgres the groupings come from a single pass with GROUPING SETS.
+
+Each worker keeps the last result per branch. Stock changes from sales, orders and
+adjustments are sent over the event bus as per-medicine deltas and applied
+to it in every worker, so reads stay O(1) however large the catalog is.
+Changes that are not simple stock deltas (prices, thresholds, new or
+deactivated medicines, cancellations) drop every branch's summary and the
+next read recomputes.
+
+Deltas are exact. The same query returns each active medicine's stock,
+which the summary keeps, and a delta (before -> after) is applied only
+while the medicine is at `before`. A delta already counted by the recompute
+finds it at `after` and is skipped. Deltas arriving during a recompute are
+replayed onto its result under the same rule. A delta matching neither
+(lost or reordered messages) drops the branch's summary. The summary is
+also recomputed after INVENTORY_SUMMARY_MAX_AGE seconds.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+
+from sqlalchemy import Row, case, func, literal, select, tuple_, union_all
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.event_bus import EventBus, RESYNC_CHANNEL, event_bus
+from app.core.metrics import record_cache
+from app.models.branch import BranchStock
+from app.models.medicine import Medicine
+from app.services.inventory import branch_max_stock, branch_min_stock
+
+SUMMARY_CHANNEL = "inventory_summary"
+TOTAL_FIELDS = ("medicines", "units", "value", "out_of_stock", "low_stock", "overstock")
+
+
+class StockTotals:
+    __slots__ = TOTAL_FIELDS
+
+    def __init__(self, medicines=0, units=0, value=0.0, out_of_stock=0, low_stock=0, overstock=0):
+        self.medicines = medicines
+        self.units = units
+        self.value = value
+        self.out_of_stock = out_of_stock
+        self.low_stock = low_stock
+        self.overstock = overstock
+
+    def apply(self, change: dict) -> None:
+        """Move one medicine's stock from change["before"] to change["after"]"""
+        before, after = change["before"], change["after"]
+        self.units += after - before
+        self.value += (after - before) * change["price"]
+        self.out_of_stock += (after <= 0) - (before <= 0)
+        self.low_stock += (after <= change["min_stock_level"]) - (before <= change["min_stock_level"])
+        self.overstock += (after > change["max_stock_level"]) - (before > change["max_stock_level"])
+
+    def to_dict(self) -> dict:
+        totals = {field: getattr(self, field) for field in TOTAL_FIELDS}
+        totals["value"] = round(totals["value"], 2)
+        return totals
+
+
+class Summary:
+    def __init__(
+        self,
+        totals: StockTotals,
+        by_category: Dict[str, StockTotals],
+        by_manufacturer: Dict[str, StockTotals],
+        stock: Dict[int, int],
+    ):
+        self.computed_at = datetime.now(timezone.utc)
+        self.computed_monotonic = time.monotonic()
+        self.totals = totals
+        self.by_category = by_category
+        self.by_manufacturer = by_manufacturer
+        # Stock of each active medicine, as counted in the totals
+        self.stock = stock
+
+    def apply(self, change: dict) -> bool:
+        """Apply a delta unless already counted; False if it does not fit the stock counted"""
+        if not change["active"]:
+            return True  # inactive medicines are not part of the summary
+        current = self.stock.get(change["medicine_id"])
+        if current == change["after"]:
+            return True
+        if current != change["before"]:
+            return False
+        self.stock[change["medicine_id"]] = change["after"]
+        for totals in (
+            self.totals,
+            self.by_category.setdefault(change["category"], StockTotals()),
+            self.by_manufacturer.setdefault(change["manufacturer"], StockTotals()),
+        ):
+            totals.apply(change)
+        return True
+
+    def to_dict(self) -> dict:
+        def groups(by_name: Dict[str, StockTotals]) -> List[dict]:
+            return [{"name": name, **totals.to_dict()} for name, totals in sorted(by_name.items())]
+
+        return {
+            "computed_at": self.computed_at,
+            "totals": self.totals.to_dict(),
+            "by_category": groups(self.by_category),
+            "by_manufacturer": groups(self.by_manufacturer),
+        }
+
+
+def _aggregates():
+    # Medicines the branch never stocked have no branch_stock row
+    stock = func.coalesce(BranchStock.stock, 0)
+    return (
+        func.count(),
+        func.coalesce(func.sum(stock), 0),
+        func.coalesce(func.sum(stock * Medicine.price), 0.0),
+        func.count(case((stock <= 0, 1))),
+        func.count(case((stock <= branch_min_stock, 1))),
+        func.count(case((stock > branch_max_stock, 1))),
+    )
+
+
+def summary_statement(dialect: str, branch_id: int):
+    """(medicine id, category, manufacturer, *totals) rows of a branch: all NULL for the catalog, one set per grouping.
+
+    The per-medicine rows carry each medicine's stock as their units.
+    """
+    def active(statement):
+        return statement.outerjoin(
+            BranchStock, (BranchStock.medicine_id == Medicine.id) & (BranchStock.branch_id == branch_id)
+        ).where(Medicine.is_active == True)
+
+    if dialect == "postgresql":
+        return (
+            active(select(Medicine.id, Medicine.category, Medicine.manufacturer, *_aggregates()))
+            .group_by(func.grouping_sets(
+                tuple_(), tuple_(Medicine.category), tuple_(Medicine.manufacturer), tuple_(Medicine.id),
+            ))
+        )
+    none = literal(None)
+    return union_all(
+        active(select(none, none, none, *_aggregates()).select_from(Medicine)),
+        active(select(none, Medicine.category, none, *_aggregates())).group_by(Medicine.category),
+        active(select(none, none, Medicine.manufacturer, *_aggregates())).group_by(Medicine.manufacturer),
+        active(select(Medicine.id, none, none, *_aggregates())).group_by(Medicine.id),
+    )
+
+
+def compute_summary(db: Session, branch_id: int) -> Summary:
+    totals, by_category, by_manufacturer, stock = StockTotals(), {}, {}, {}
+    for medicine_id, category, manufacturer, *values in db.execute(summary_statement(db.get_bind().dialect.name, branch_id)):
+        # id, category and manufacturer are NOT NULL, so NULL marks the rolled-up level
+        if medicine_id is not None:
+            stock[medicine_id] = values[1]
+        elif category is not None:
+            by_category[category] = StockTotals(*values)
+        elif manufacturer is not None:
+            by_manufacturer[manufacturer] = StockTotals(*values)
+        else:
+            totals = StockTotals(*values)
+    return Summary(totals, by_category, by_manufacturer, stock)
+
+
+def stock_change(medicine: Row, branch_id: int, before: int, after: int) -> dict:
+    """Delta of one medicine (medicines_in_branch row) in a branch for InventorySummary.stock_changed"""
+    return {
+        "branch_id": branch_id,
+        "medicine_id": medicine.id,
+        "category": medicine.category,
+        "manufacturer": medicine.manufacturer,
+        "price": medicine.price,
+        "min_stock_level": medicine.min_stock_level,
+        "max_stock_level": medicine.max_stock_level,
+        "active": medicine.is_active,
+        "before": before,
+        "after": after,
+    }
+
+
+class InventorySummary:
+    """The summaries of this worker by branch, kept current from stock deltas on the event bus"""
+
+    def __init__(self, bus: EventBus, max_age: float, incremental: bool = True):
+        self.max_age = max_age
+        self.incremental = incremental
+        self._bus = bus
+        self._summaries: Dict[int, Summary] = {}
+        # Deltas received during each running recompute, by branch
+        self._pending: Dict[int, List[List[dict]]] = {}
+        # Bumped by full invalidations; a recompute that saw one is not kept
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.recomputed = 0
+        self.applied = 0
+        bus.subscribe(SUMMARY_CHANNEL, self._receive)
+        bus.subscribe(RESYNC_CHANNEL, self._reset)
+
+    def get(self, db: Session, branch_id: int) -> dict:
+        with self._lock:
+            summary = self._summaries.get(branch_id)
+            if summary is not None and time.monotonic() - summary.computed_monotonic < self.max_age:
+                record_cache("inventory_summary", True)
+                return summary.to_dict()
+            epoch = self._epoch
+            pending: List[dict] = []
+            self._pending.setdefault(branch_id, []).append(pending)
+        record_cache("inventory_summary", False)
+
+        try:
+            summary = compute_summary(db, branch_id)
+        finally:
+            with self._lock:
+                buffers = self._pending[branch_id]
+                buffers.remove(pending)
+                if not buffers:
+                    del self._pending[branch_id]
+        with self._lock:
+            self.recomputed += 1
+            # Changes published meanwhile may or may not be in the result;
+            # apply skips those that are
+            consistent = all([summary.apply(change) for change in pending])
+            if consistent and self._epoch == epoch:
+                self._summaries[branch_id] = summary
+            return summary.to_dict()
+
+    def stock_changed(self, changes: Iterable[dict]) -> None:
+        """Publish stock deltas (see stock_change) to every worker; call after committing"""
+        changes = [change for change in changes if change["before"] != change["after"]]
+        if not changes:
+            return
+        if self.incremental:
+            self._bus.publish(SUMMARY_CHANNEL, {"changes": changes})
+        else:
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        """Make every worker recompute on its next read; call after committing"""
+        self._bus.publish(SUMMARY_CHANNEL, {})
+
+    def _receive(self, message: dict) -> None:
+        with self._lock:
+            if "changes" not in message:
+                self._epoch += 1
+                self._summaries.clear()
+                return
+            for change in message["changes"]:
+                branch_id = change["branch_id"]
+                for pending in self._pending.get(branch_id, ()):
+                    pending.append(change)
+                summary = self._summaries.get(branch_id)
+                if summary is None:
+                    continue
+                if summary.apply(change):
+                    self.applied += 1
+                else:
+                    del self._summaries[branch_id]
+
+    def _reset(self, message: dict) -> None:
+        """Deltas may have been missed while the bus was disconnected"""
+        with self._lock:
+            self._epoch += 1
+            self._summaries.clear()
+
+    def stats(self) -> dict:
+        summaries = list(self._summaries.values())
+        oldest = min((summary.computed_monotonic for summary in summaries), default=None)
+        return {
+            "branches": len(summaries),
+            "age_seconds": round(time.monotonic() - oldest, 1) if oldest is not None else None,
+            "recomputed": self.recomputed,
+            "deltas_applied": self.applied,
+        }
+
+
+inventory_summary = InventorySummary(
+    event_bus,
+    max_age=settings.INVENTORY_SUMMARY_MAX_AGE,
+    incremental=settings.INVENTORY_SUMMARY_INCREMENTAL,
+)
@@ -0,0 +1,245 @@
+"""
+Stock movement ledger and snapshots.
+
+Every stock change is inserted into stock_movements in the transaction that
+changes branch_stock, with one bulk INSERT per request, so a branch's
+movements of a medicine always sum to its stock there. Rows are never
+updated or deleted (on Postgres a trigger rejects it).
+
+`take_snapshots` runs periodically (maintenance.py stock-snapshot). It adds
+the movements since the previous run to the previous snapshot of each
+moved (branch, medicine) pair, reading only those movements. Every movement
+up to the run's watermark id is then covered by some snapshot, so the stock
+of a medicine in a branch at time T is its latest snapshot taken by T plus
+the movements after the latest run's watermark created by T: the cost is
+bounded by the movements since one run, not by the size of the ledger.
+
+Ids are assigned on insert but become visible on commit, so the watermark
+is the newest movement older than STOCK_SNAPSHOT_SETTLE_SECONDS; transactions
+still writing movements older than that are assumed not to exist.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.branch import BranchStock
+from app.models.order import Order, OrderItem
+from app.models.stock_movement import StockMovement, StockSnapshot
+
+
+def record_movements(
+    db: Session,
+    branch_id: int,
+    changes: Dict[int, int],
+    reason: str,
+    user_id: Optional[int] = None,
+    sale_id: Optional[int] = None,
+    order_id: Optional[int] = None,
+    created_at: Optional[datetime] = None,
+) -> None:
+    """Append one movement per medicine in `changes` (medicine id -> signed change) in a branch with one INSERT.
+
+    Call in the transaction that changes the stock. Nothing is committed.
+    """
+    created_at = created_at or datetime.now(timezone.utc)
+    rows = [
+        {
+            "branch_id": branch_id,
+            "medicine_id": medicine_id,
+            "change": change,
+            "reason": reason,
+            "user_id": user_id,
+            "sale_id": sale_id,
+            "order_id": order_id,
+            "created_at": created_at,
+        }
+        for medicine_id, change in changes.items()
+        if change
+    ]
+    if rows:
+        db.execute(insert(StockMovement), rows)
+
+
+def record_cancellations(db: Session, order_ids: List[int], user_id: Optional[int]) -> None:
+    """Append the restocks of cancelled orders, one movement per order and medicine, with one INSERT ... SELECT"""
+    if not order_ids:
+        return
+    db.execute(
+        insert(StockMovement).from_select(
+            ["branch_id", "medicine_id", "change", "reason", "user_id", "order_id", "created_at"],
+            select(
+                Order.branch_id,
+                OrderItem.medicine_id,
+                func.sum(OrderItem.quantity),
+                literal("order_cancelled"),
+                literal(user_id),
+                OrderItem.order_id,
+                literal(datetime.now(timezone.utc)),
+            )
+            .join(Order, Order.id == OrderItem.order_id)
+            .where(OrderItem.order_id.in_(order_ids))
+            .group_by(Order.branch_id, OrderItem.order_id, OrderItem.medicine_id),
+        )
+    )
+
+
+def take_snapshots(db: Session, settle_seconds: float) -> int:
+    """Snapshot every (branch, medicine) pair that moved since the previous run. Nothing is committed.
+
+    Returns the number of snapshots written.
+    """
+    previous = db.execute(
+        select(StockSnapshot.movement_id, StockSnapshot.taken_at)
+        .order_by(StockSnapshot.taken_at.desc(), StockSnapshot.movement_id.desc())
+        .limit(1)
+    ).first()
+    previous_id, previous_at = previous if previous else (0, None)
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settle_seconds)
+    watermark = db.execute(
+        select(func.max(StockMovement.id))
+        .where(StockMovement.id > previous_id, StockMovement.created_at < cutoff)
+    ).scalar()
+    if watermark is None:
+        return 0
+    # Ids and creation times are not in exactly the same order; the run is
+    # taken at its newest movement so snapshots taken by T only hold
+    # movements created by T
+    newest = db.execute(
+        select(func.max(StockMovement.created_at))
+        .where(StockMovement.id > previous_id, StockMovement.id <= watermark)
+    ).scalar()
+    taken_at = max(newest, previous_at) if previous_at else newest
+
+    moved = (
+        select(StockMovement.branch_id, StockMovement.medicine_id, func.sum(StockMovement.change).label("change"))
+        .where(StockMovement.id > previous_id, StockMovement.id <= watermark)
+        .group_by(StockMovement.branch_id, StockMovement.medicine_id)
+        .subquery()
+    )
+    last_stock = (
+        select(StockSnapshot.stock)
+        .where(StockSnapshot.medicine_id == moved.c.medicine_id, StockSnapshot.branch_id == moved.c.branch_id)
+        .order_by(StockSnapshot.movement_id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    result = db.execute(
+        insert(StockSnapshot).from_select(
+            ["branch_id", "medicine_id", "movement_id", "stock", "taken_at"],
+            select(
+                moved.c.branch_id,
+                moved.c.medicine_id,
+                literal(watermark),
+                func.coalesce(last_stock, 0) + moved.c.change,
+                literal(taken_at),
+            ),
+        )
+    )
+    return result.rowcount
+
+
+def branch_stock_levels(
+    db: Session,
+    at: Optional[datetime] = None,
+    medicine_ids: Optional[Iterable[int]] = None,
+    branch_id: Optional[int] = None,
+) -> Dict[Tuple[int, int], int]:
+    """(branch id, medicine id) -> stock after the movements created by `at` (default: all).
+
+    Limited to `medicine_ids` and `branch_id` when given. Pairs that never
+    moved are left out.
+    """
+    run = (
+        select(StockSnapshot.movement_id, StockSnapshot.taken_at)
+        .order_by(StockSnapshot.taken_at.desc(), StockSnapshot.movement_id.desc())
+        .limit(1)
+    )
+    if at is not None:
+        run = run.where(StockSnapshot.taken_at <= at)
+    watermark, taken_at = db.execute(run).first() or (0, None)
+
+    ids = list(medicine_ids) if medicine_ids is not None else None
+    latest = select(
+        StockSnapshot.medicine_id, StockSnapshot.branch_id, func.max(StockSnapshot.movement_id).label("movement_id")
+    ).where(StockSnapshot.movement_id <= watermark)
+    tail = select(StockMovement.branch_id, StockMovement.medicine_id, func.sum(StockMovement.change)).where(
+        StockMovement.id > watermark
+    )
+    if ids is not None:
+        latest = latest.where(StockSnapshot.medicine_id.in_(ids))
+        tail = tail.where(StockMovement.medicine_id.in_(ids))
+    if branch_id is not None:
+        latest = latest.where(StockSnapshot.branch_id == branch_id)
+        tail = tail.where(StockMovement.branch_id == branch_id)
+    if at is not None:
+        tail = tail.where(StockMovement.created_at <= at)
+        if taken_at is not None:
+            # Movements after the watermark were created after the run's
+            # cutoff, so a past tail is a created_at range, not the rest of the ledger
+            settle = timedelta(seconds=settings.STOCK_SNAPSHOT_SETTLE_SECONDS)
+            tail = tail.where(StockMovement.created_at > taken_at - settle)
+    latest = latest.group_by(StockSnapshot.medicine_id, StockSnapshot.branch_id).subquery()
+
+    levels = {
+        (branch, medicine_id): stock
+        for branch, medicine_id, stock in db.execute(
+            select(StockSnapshot.branch_id, StockSnapshot.medicine_id, StockSnapshot.stock).join(latest, and_(
+                StockSnapshot.medicine_id == latest.c.medicine_id,
+                StockSnapshot.branch_id == latest.c.branch_id,
+                StockSnapshot.movement_id == latest.c.movement_id,
+            ))
+        )
+    }
+    for branch, medicine_id, change in db.execute(tail.group_by(StockMovement.branch_id, StockMovement.medicine_id)):
+        levels[branch, medicine_id] = levels.get((branch, medicine_id), 0) + change
+    return levels
+
+
+def stock_levels(
+    db: Session,
+    at: Optional[datetime] = None,
+    medicine_ids: Optional[Iterable[int]] = None,
+    branch_id: Optional[int] = None,
+) -> Dict[int, int]:
+    """Stock of each medicine in a branch, or across all branches, at `at` (see branch_stock_levels)"""
+    levels: Dict[int, int] = defaultdict(int)
+    for (_, medicine_id), stock in branch_stock_levels(db, at, medicine_ids, branch_id).items():
+        levels[medicine_id] += stock
+    return dict(levels)
+
+
+def ledger_drift(db: Session) -> Dict[Tuple[int, int], int]:
+    """(branch id, medicine id) -> branch stock minus ledger total, for pairs where they differ"""
+    ledger = branch_stock_levels(db)
+    stock = {
+        (branch_id, medicine_id): value
+        for branch_id, medicine_id, value in db.execute(
+            select(BranchStock.branch_id, BranchStock.medicine_id, BranchStock.stock)
+        )
+    }
+    return {
+        key: stock.get(key, 0) - ledger.get(key, 0)
+        for key in stock.keys() | ledger.keys()
+        if stock.get(key, 0) != ledger.get(key, 0)
+    }
+
+
+def reconcile_ledger(db: Session, reason: str = "correction") -> int:
+    """Append a movement for every (branch, medicine) pair whose stock its ledger does not match.
+
+    For stock written without movements (seed scripts, bulk loads, direct
+    SQL). Nothing is committed. Returns the number of pairs corrected.
+    """
+    drift = ledger_drift(db)
+    by_branch: Dict[int, Dict[int, int]] = defaultdict(dict)
+    for (branch_id, medicine_id), change in drift.items():
+        by_branch[branch_id][medicine_id] = change
+    for branch_id, changes in by_branch.items():
+        record_movements(db, branch_id, changes, reason)
+    return len(drift)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+In-process load and latency benchmark for the main API paths.
+
+Drives the FastAPI app through httpx's ASGI transport (no server, no
+network) with a number of concurrent clients, against a database seeded with
+benchmark medicines, users and orders. Scenarios:
+
+    login          POST /auth/login (includes bcrypt)
+    search         GET  /medicines/?search=...
+    catalog        GET  /medicines/?skip=...&limit=50
+    sale_10/30/100 POST /sales/ with 10, 30 and 100 lines
+    orders         GET  /orders/ as an admin
+
+For each scenario it reports p50/p95/p99 latency, throughput and SQL
+statements per request (from the app's own metrics), writes the results as
+JSON and, given a baseline file, flags regressions and exits with status 1.
+
+Runs against DATABASE_URL_TEST by default; tables are created if missing.
+
+    python -m benchmarks.bench_api --requests 200 --concurrency 8
+    python -m benchmarks.bench_api --output benchmarks/baseline.json
+    python -m benchmarks.bench_api --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+
+SCENARIOS = ["login", "search", "catalog", "sale_10", "sale_30", "sale_100", "orders"]
+BENCH_CATEGORY = "Benchmark"
+BENCH_PASSWORD = "bench-password"
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def seed(db, medicines: int, customers: int, orders: int) -> dict:
+    """Top up the benchmark medicines, users and orders; returns the ids to use"""
+    from sqlalchemy import insert, literal, select
+
+    from app.core.branches import default_branch_id
+    from app.core.security import get_password_hash
+    from app.models.branch import BranchStock
+    from app.models.medicine import Medicine
+    from app.models.order import Order, OrderItem, OrderStatus
+    from app.models.user import User, UserRole
+    from app.services.inventory import reconcile_lots
+    from app.services.stock_ledger import reconcile_ledger
+
+    if not db.query(User).filter(User.email == "bench-admin@pharmacy.com").count():
+        db.add(User(email="bench-admin@pharmacy.com", name="Benchmark Admin", role=UserRole.ADMIN,
+                    hashed_password=get_password_hash(BENCH_PASSWORD), is_active=True))
+
+    existing = db.query(User).filter(User.email.like("bench%@pharmacy.com"), User.role == UserRole.CUSTOMER).count()
+    if existing < customers:
+        db.execute(insert(User), [
+            {"email": f"bench{i}@pharmacy.com", "name": f"Benchmark User {i}", "hashed_password": "!",
+             "role": UserRole.CUSTOMER, "is_active": True}
+            for i in range(existing, customers)
+        ])
+
+    existing = db.query(Medicine).filter(Medicine.category == BENCH_CATEGORY).count()
+    if existing < medicines:
+        db.execute(insert(Medicine), [
+            {"name": f"Bench Medicine {i}", "price": 1.0 + i % 50, "category": BENCH_CATEGORY,
+             "manufacturer": "Bench Labs", "min_stock_level": 10, "max_stock_level": 100_000_000, "is_active": True}
+            for i in range(existing, medicines)
+        ])
+    branch_id = default_branch_id(db)
+    stocked = select(BranchStock.medicine_id).where(BranchStock.branch_id == branch_id)
+    db.execute(insert(BranchStock).from_select(
+        ["branch_id", "medicine_id", "stock"],
+        select(literal(branch_id), Medicine.id, literal(10_000_000))
+        .where(Medicine.category == BENCH_CATEGORY, Medicine.id.not_in(stocked)),
+    ))
+    reconcile_lots(db)
+    reconcile_ledger(db, reason="opening")
+    db.commit()
+
+    admin_id = db.query(User.id).filter(User.email == "bench-admin@pharmacy.com").scalar()
+    customer_ids = [row.id for row in db.query(User.id).filter(
+        User.email.like("bench%@pharmacy.com"), User.role == UserRole.CUSTOMER).order_by(User.id).limit(customers)]
+    medicine_ids = [row.id for row in db.query(Medicine.id).filter(
+        Medicine.category == BENCH_CATEGORY).order_by(Medicine.id).limit(medicines)]
+
+    # Order history for the listing, spread over the last year
+    existing = db.query(Order).filter(Order.order_number.like("BENCH-%")).count()
+    rng = random.Random(existing)
+    now = datetime.now(timezone.utc)
+    for start in range(existing, orders, 1000):
+        batch = []
+        for i in range(start, min(start + 1000, orders)):
+            created_at = now - timedelta(minutes=rng.randrange(365 * 24 * 60))
+            batch.append({
+                "customer_id": rng.choice(customer_ids), "branch_id": branch_id, "order_number": f"BENCH-{i}",
+                "status": OrderStatus.DELIVERED,
+                "total_amount": 0.0, "shipping_address": "1 Bench St", "created_at": created_at,
+            })
+        order_ids = db.execute(insert(Order).returning(Order.id, Order.created_at), batch).all()
+        db.execute(insert(OrderItem), [
+            {"order_id": order_id, "medicine_id": rng.choice(medicine_ids), "quantity": 1,
+             "unit_price": 1.0, "total_price": 1.0, "created_at": created_at}
+            for order_id, created_at in order_ids
+            for _ in range(rng.randint(1, 5))
+        ])
+        db.commit()
+
+    return {"admin_id": admin_id, "customer_ids": customer_ids, "medicine_ids": medicine_ids}
+
+
+def token_for(user_id: int, db) -> str:
+    from app.core.security import create_access_token
+    from app.models.user import User
+
+    return create_access_token({"sub": db.get(User, user_id).email})
+
+
+def build_requests(name: str, count: int, ids: dict, db, rng: random.Random) -> list:
+    """(method, path, kwargs) for each request of a scenario"""
+    medicine_ids = ids["medicine_ids"]
+    admin = {"Authorization": f"Bearer {token_for(ids['admin_id'], db)}"}
+
+    if name == "login":
+        form = {"username": "bench-admin@pharmacy.com", "password": BENCH_PASSWORD}
+        return [("POST", "/api/v1/auth/login", {"data": form})] * count
+    if name == "search":
+        return [("GET", "/api/v1/medicines/", {"params": {"search": f"Medicine {rng.randrange(1000)}"}, "headers": admin})
+                for _ in range(count)]
+    if name == "catalog":
+        pages = max(len(medicine_ids) // 50, 1)
+        return [("GET", "/api/v1/medicines/", {"params": {"skip": rng.randrange(pages) * 50, "limit": 50}, "headers": admin})
+                for _ in range(count)]
+    if name.startswith("sale_"):
+        lines = int(name.split("_")[1])
+        # Sale numbers are unique per user per second, so every sale gets its own seller
+        sellers = ids["sellers"][:count]
+        del ids["sellers"][:count]
+        return [
+            ("POST", "/api/v1/sales/", {
+                "json": {"payment_method": "cash", "items": [
+                    {"medicine_id": medicine_id, "quantity": 1, "unit_price": 1.0}
+                    for medicine_id in rng.sample(medicine_ids, lines)
+                ]},
+                "headers": {"Authorization": f"Bearer {token_for(seller, db)}"},
+            })
+            for seller in sellers
+        ]
+    if name == "orders":
+        return [("GET", "/api/v1/orders/", {"params": {"limit": 50}, "headers": admin})] * count
+    raise ValueError(f"Unknown scenario {name}")
+
+
+ROUTES = {
+    "login": ("/api/v1/auth/login", "POST"),
+    "search": ("/api/v1/medicines/", "GET"),
+    "catalog": ("/api/v1/medicines/", "GET"),
+    "sale_10": ("/api/v1/sales/", "POST"),
+    "sale_30": ("/api/v1/sales/", "POST"),
+    "sale_100": ("/api/v1/sales/", "POST"),
+    "orders": ("/api/v1/orders/", "GET"),
+}
+
+
+async def run_scenario(client, name: str, requests: list, concurrency: int, warmup: int) -> dict:
+    from app.core.metrics import db_queries
+
+    for method, path, kwargs in requests[:warmup]:
+        await client.request(method, path, **kwargs)
+    requests = requests[warmup:]
+
+    latencies, errors = [], 0
+    pending = iter(requests)
+
+    async def worker():
+        nonlocal errors
+        for method, path, kwargs in pending:
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    queries_before = db_queries.totals(*ROUTES[name])
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    queries_after = db_queries.totals(*ROUTES[name])
+
+    count = queries_after[0] - queries_before[0]
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentiles[49], 3),
+        "p95_ms": round(percentiles[94], 3),
+        "p99_ms": round(percentiles[98], 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "queries_per_request": round((queries_after[1] - queries_before[1]) / count, 2) if count else None,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Regressions of `results` against `baseline`, as printable lines"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if current[metric] > before[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {before[metric]:.2f} -> {current[metric]:.2f}")
+        if current["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} req/s")
+        if (current["queries_per_request"] or 0) > (before["queries_per_request"] or 0):
+            regressions.append(f"{name}: queries/request {before['queries_per_request']} -> {current['queries_per_request']}")
+        if current["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {current['errors']}")
+    return regressions
+
+
+async def run(args) -> dict:
+    import httpx
+
+    from app.core.database import SessionLocal, engine
+    from app.main import app
+
+    rng = random.Random(args.seed)
+    scenarios = args.scenarios or SCENARIOS
+    sales = sum(args.requests + args.warmup for name in scenarios if name.startswith("sale_"))
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "database": engine.dialect.name,
+        "python": platform.python_version(),
+        "options": {key: getattr(args, key) for key in ("medicines", "orders", "requests", "concurrency", "warmup", "seed")},
+        "scenarios": {},
+    }
+
+    async with app.router.lifespan_context(app):
+        db = SessionLocal()
+        try:
+            print(f"Seeding {args.medicines} medicines, {args.orders} orders...")
+            ids = seed(db, args.medicines, max(sales, 1), args.orders)
+            ids["sellers"] = list(ids["customer_ids"])
+            plans = {name: build_requests(name, args.requests + args.warmup, ids, db, rng) for name in scenarios}
+        finally:
+            db.close()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            print(f"\n{'scenario':<10} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>8} {'queries':>8} {'errors':>7}")
+            print("-" * 66)
+            for name in scenarios:
+                stats = await run_scenario(client, name, plans[name], args.concurrency, args.warmup)
+                results["scenarios"][name] = stats
+                print(f"{name:<10} {stats['p50_ms']:>7.2f}ms {stats['p95_ms']:>7.2f}ms {stats['p99_ms']:>7.2f}ms "
+                      f"{stats['throughput_rps']:>8.1f} {stats['queries_per_request'] or 0:>8} {stats['errors']:>7}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL_TEST)
+    parser.add_argument("--medicines", type=int, default=5000, help="benchmark medicines to seed")
+    parser.add_argument("--orders", type=int, default=20000, help="benchmark orders to seed")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for request parameters")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, help="subset of scenarios to run")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/api-<timestamp>.json)")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging, e.g. 0.2 = 20%%")
+    args = parser.parse_args()
+
+    # Before the app is imported: the engine, middleware and startup read these
+    settings.DATABASE_URL = args.database_url
+    settings.APP_DEBUG = False  # no SQL echo
+    settings.DB_CREATE_ALL = True
+    settings.METRICS_ENABLED = True
+    settings.RATE_LIMIT_ENABLED = False
+
+    results = asyncio.run(run(args))
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"api-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"\n✓ Results written to {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("options") != results["options"] or baseline.get("database") != results["database"]:
+            print(f"\n⚠️  {args.baseline} was recorded with different options or database; comparison is indicative only")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"✓ No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
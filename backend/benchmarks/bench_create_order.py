@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark for POST /orders/ (create_order).
+
+Times the current single-transaction implementation against the previous
+one (validate each medicine, commit the order, re-query each medicine, commit
+items and stock) for orders of 1-100 lines, and prints latency per size.
+
+Runs against DATABASE_URL_TEST by default; the tables are created if missing
+and a block of benchmark medicines is seeded with plenty of stock.
+
+    python -m benchmarks.bench_create_order --repeat 50
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, insert, literal, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.database import Base
+from app.api.v1.endpoints.orders import create_order
+from app.models.branch import Branch, BranchStock
+from app.models.medicine import Medicine
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.user import User, UserRole
+from app.schemas.order import OrderCreate
+from app.services.inventory import reconcile_lots
+from app.services.stock_ledger import reconcile_ledger
+
+LINE_COUNTS = [1, 5, 10, 30, 100]
+BENCH_CATEGORY = "Benchmark"
+
+
+def legacy_create_order(order_data: dict, db: Session, current_user: User, branch_id: int) -> dict:
+    """create_order as it was before the single-transaction rewrite (reading branch stock)"""
+    order_number = f"ORD-{datetime.now().strftime('%Y%m%d%H%M%S')}-{current_user.id}"
+
+    total_amount = 0
+    items = order_data.get("items", [])
+
+    for item in items:
+        medicine = db.query(Medicine).filter(Medicine.id == item["medicine_id"]).first()
+        stock = db.get(BranchStock, (branch_id, medicine.id))
+        if stock.stock < item["quantity"]:
+            raise RuntimeError(f"Insufficient stock for {medicine.name}")
+        total_amount += medicine.price * item["quantity"]
+
+    order = Order(
+        customer_id=current_user.id,
+        branch_id=branch_id,
+        order_number=order_number,
+        status=OrderStatus.PENDING,
+        total_amount=total_amount,
+        shipping_address=order_data["shipping_address"],
+        notes=order_data.get("notes")
+    )
+    db.add(order)
+    db.commit()
+    db.refresh(order)
+
+    for item in items:
+        medicine = db.query(Medicine).filter(Medicine.id == item["medicine_id"]).first()
+        db.add(OrderItem(
+            order_id=order.id,
+            medicine_id=item["medicine_id"],
+            quantity=item["quantity"],
+            unit_price=medicine.price,
+            total_price=medicine.price * item["quantity"]
+        ))
+        db.get(BranchStock, (branch_id, medicine.id)).stock -= item["quantity"]
+
+    db.commit()
+    return {"id": order.id}
+
+
+def seed(db: Session, medicines: int, users: int) -> tuple:
+    """Create benchmark customers and medicines, returning (user ids, medicine ids, branch id)"""
+    # Tables made by create_all have no migrated default branch
+    branch = db.query(Branch).filter(Branch.code == settings.DEFAULT_BRANCH_CODE).first()
+    if branch is None:
+        branch = Branch(code=settings.DEFAULT_BRANCH_CODE, name="Main branch", is_active=True)
+        db.add(branch)
+        db.flush()
+
+    existing = db.query(User).filter(User.email.like("bench%@pharmacy.com")).count()
+    db.add_all(
+        User(email=f"bench{i}@pharmacy.com", name=f"Benchmark User {i}",
+             hashed_password="!", role=UserRole.CUSTOMER, is_active=True)
+        for i in range(existing, users)
+    )
+
+    existing = db.query(Medicine).filter(Medicine.category == BENCH_CATEGORY).count()
+    db.add_all(
+        Medicine(name=f"Bench Medicine {i}", price=1.0 + i % 50,
+                 category=BENCH_CATEGORY, manufacturer="Bench Labs", is_active=True)
+        for i in range(existing, medicines)
+    )
+    db.flush()
+    stocked = select(BranchStock.medicine_id).where(BranchStock.branch_id == branch.id)
+    db.execute(insert(BranchStock).from_select(
+        ["branch_id", "medicine_id", "stock"],
+        select(literal(branch.id), Medicine.id, literal(10_000_000))
+        .where(Medicine.category == BENCH_CATEGORY, Medicine.id.not_in(stocked)),
+    ))
+    reconcile_lots(db)
+    reconcile_ledger(db, reason="opening")
+    db.commit()
+
+    user_ids = [u.id for u in db.query(User.id).filter(User.email.like("bench%@pharmacy.com")).order_by(User.id).limit(users)]
+    medicine_ids = [m.id for m in db.query(Medicine.id).filter(Medicine.category == BENCH_CATEGORY).order_by(Medicine.id).limit(medicines)]
+    return user_ids, medicine_ids, branch.id
+
+
+def time_call(SessionFactory, fn, user_ids) -> list:
+    """Run fn(db, user) once per user on fresh sessions, returning latencies in ms.
+
+    Order numbers are only unique per customer per second, so every timed
+    order is placed by a different customer.
+    """
+    samples = []
+    for user_id in user_ids:
+        db = SessionFactory()
+        try:
+            user = db.get(User, user_id)
+            started = time.perf_counter()
+            fn(db, user)
+            samples.append((time.perf_counter() - started) * 1000)
+        finally:
+            db.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL_TEST)
+    parser.add_argument("--repeat", type=int, default=30, help="orders per size and implementation")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    Base.metadata.create_all(bind=engine)
+    SessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    runs = args.repeat * len(LINE_COUNTS)
+    db = SessionFactory()
+    user_ids, medicine_ids, branch_id = seed(db, max(LINE_COUNTS), 2 * runs)
+    db.close()
+    legacy_users, current_users = user_ids[:runs], user_ids[runs:]
+
+    print(f"{'lines':>5} | {'before p50':>10} {'before p95':>10} | {'after p50':>10} {'after p95':>10} | speedup")
+    print("-" * 72)
+
+    def p(samples, q):
+        return statistics.quantiles(samples, n=100)[q - 1] if len(samples) > 1 else samples[0]
+
+    for n, lines in enumerate(LINE_COUNTS):
+        items = [{"medicine_id": medicine_id, "quantity": 1} for medicine_id in medicine_ids[:lines]]
+        payload = {"shipping_address": "1 Bench St", "items": items}
+        batch = slice(n * args.repeat, (n + 1) * args.repeat)
+
+        legacy = time_call(SessionFactory, lambda db, user: legacy_create_order(payload, db=db, current_user=user, branch_id=branch_id), legacy_users[batch])
+        current = time_call(SessionFactory, lambda db, user: create_order(OrderCreate(**payload), branch_id=branch_id, db=db, current_user=user), current_users[batch])
+
+        print(f"{lines:>5} | {p(legacy, 50):>8.2f}ms {p(legacy, 95):>8.2f}ms | "
+              f"{p(current, 50):>8.2f}ms {p(current, 95):>8.2f}ms | {p(legacy, 50) / p(current, 50):>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
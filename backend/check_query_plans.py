@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Query plan checks for the sales/orders list filters and the activity feed.
+
+Runs EXPLAIN for the filter combinations the frontend uses and verifies that
+each one is answered through the index declared for it in app/models.
+
+By default sequential scans are disabled for the check so it is meaningful on
+a small development database; pass --realistic to keep the planner's own
+choice (use this against a production-sized copy).
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
+
+from app.core.database import SessionLocal
+from app.api.v1.endpoints.sales import apply_sale_filters
+from app.api.v1.endpoints.orders import apply_order_filters
+from app.api.v1.endpoints.activities import apply_activity_filters
+from app.models.sale import Sale
+from app.models.order import Order, OrderStatus
+from app.models.activity import Activity
+from app.schemas.sale import SaleFilter
+from app.schemas.order import OrderFilter
+from app.schemas.activity import ActivityFilter
+
+INDEX_NODE_TYPES = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+
+
+def _used_indexes(plan: dict) -> set:
+    """Collect the names of all indexes scanned anywhere in a plan tree"""
+    found = set()
+    if plan.get("Node Type") in INDEX_NODE_TYPES and plan.get("Index Name"):
+        found.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        found |= _used_indexes(child)
+    return found
+
+
+def _sales(**filters):
+    """Build the same query GET /sales/ runs for these filters"""
+    query = apply_sale_filters(SessionLocal().query(Sale), SaleFilter(**filters))
+    return query.order_by(Sale.created_at.desc()).limit(100)
+
+
+def _orders(**filters):
+    """Build the same query GET /orders/ runs for these filters"""
+    query = apply_order_filters(SessionLocal().query(Order), OrderFilter(**filters))
+    return query.order_by(Order.created_at.desc()).limit(100)
+
+
+def _activities(**filters):
+    """Build the same query GET /activities/ runs for these filters"""
+    query = apply_activity_filters(SessionLocal().query(Activity), ActivityFilter(**filters))
+    return query.order_by(Activity.created_at.desc(), Activity.id.desc()).limit(51)
+
+
+def _cases():
+    now = datetime.now()
+    yesterday = dict(created_from=now - timedelta(days=1), created_to=now)
+    sales, orders, activities = _sales, _orders, _activities
+
+    return [
+        ("Sales in date range", sales(**yesterday), "ix_sales_created_at"),
+        ("Sales by pharmacist in date range", sales(user_id=1, **yesterday), "ix_sales_user_id_created_at"),
+        ("Branch sales in date range", sales(branch_id=1, **yesterday), "ix_sales_branch_id_created_at"),
+        ("Card sales in date range", sales(payment_method="card", **yesterday), "ix_sales_payment_method_created_at"),
+        ("Sales by customer name prefix", sales(customer_name="ali"), "ix_sales_customer_name_prefix"),
+        ("Sales containing medicine", sales(medicine_id=1), "ix_sale_items_medicine_id_sale_id"),
+        ("Orders by customer in date range", orders(customer_id=1, **yesterday), "ix_orders_customer_id_created_at"),
+        ("Orders by branch in date range", orders(branch_id=1, **yesterday), "ix_orders_branch_id_created_at"),
+        ("Orders by status in date range", orders(status=OrderStatus.PENDING, **yesterday), "ix_orders_status_created_at"),
+        ("Orders containing medicine", orders(medicine_id=1), "ix_order_items_medicine_id_order_id"),
+        ("Activity feed", activities(), "ix_activities_created_at_id"),
+        ("Activity feed for user", activities(user_id=1), "ix_activities_user_id_created_at"),
+        ("Activity feed for medicine", activities(medicine_id=1), "ix_activities_medicine_id_created_at"),
+        ("Activity feed by type", activities(activity_type="user_login"), "ix_activities_activity_type_created_at"),
+    ]
+
+
+def plan_indexes(query, realistic: bool = False) -> set:
+    """EXPLAIN one query and return the indexes its plan scans"""
+    db = query.session
+    try:
+        if not realistic:
+            db.connection().exec_driver_sql("SET LOCAL enable_seqscan = off")
+
+        # Render values inline so enum/date bind processing matches the endpoint
+        compiled = query.statement.compile(
+            dialect=db.bind.dialect, compile_kwargs={"literal_binds": True}
+        )
+        result = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), {})
+        return _used_indexes(result.scalar()[0]["Plan"])
+    finally:
+        db.rollback()
+        db.close()
+
+
+def check_plan(name: str, query, expected_index: str, realistic: bool) -> bool:
+    """EXPLAIN one query and check the expected index shows up in the plan"""
+    try:
+        used = plan_indexes(query, realistic)
+    except Exception as e:
+        print(f"❌ {name}: {e}")
+        return False
+
+    if expected_index in used:
+        print(f"✅ {name}: {expected_index}")
+        return True
+    print(f"❌ {name}: expected {expected_index}, plan used {sorted(used) or 'no index'}")
+    return False
+
+
+def main():
+    """Run all plan checks"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--realistic", action="store_true", help="do not disable sequential scans")
+    args = parser.parse_args()
+
+    print("🧪 Checking query plans for list filters...")
+    print("=" * 50)
+
+    cases = _cases()
+    passed = sum(check_plan(name, query, index, args.realistic) for name, query, index in cases)
+
+    print("\n" + "=" * 50)
+    print(f"📊 Results: {passed}/{len(cases)} plans use their index")
+    sys.exit(0 if passed == len(cases) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator for performance work.
+
+Runs init_db.py first (schema migrations, admin and sample accounts), then
+adds generated medicines, users and a history of sales and orders with
+skewed, realistic-looking distributions:
+
+- medicine popularity, staff workload and customer activity follow a Zipf
+  distribution (--skew), so a few medicines make up most sale lines
+- sales follow a daily and weekly rhythm and grow slowly over the period
+- items per sale and quantities are geometric-ish, most sales are small
+- order statuses follow --order-mix; recent orders are still open
+- with --branches, every branch stocks every medicine; staff work at one
+  branch and ring up its sales, orders are spread over all branches
+
+Rows are streamed in chunks with COPY on PostgreSQL (multi-row INSERTs
+elsewhere), so millions of sale_items load in minutes. Output is fully
+determined by the options and --seed; pass --end-date as well to reproduce
+a data set on another day. Generated users log in with --password.
+Stock levels are random and not reconciled with the generated history.
+
+    python generate_data.py --medicines 5000 --users 2000 --days 365 --sales-per-day 3000
+    python generate_data.py --days 30 --sales-per-day 200 --orders-per-day 50   # small dev set
+"""
+
+import argparse
+import csv
+import enum
+import io
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.core.partitions import PARTITIONED_TABLES, ensure_partitions, is_partitioned, month_start
+from app.core.branches import default_branch_id
+from app.core.security import get_password_hash
+from app.models.branch import Branch, BranchStock
+from app.models.medicine import Medicine
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.sale import Sale, SaleItem
+from app.models.user import User, UserRole
+from app.services.inventory import reconcile_lots
+from app.services.stock_ledger import reconcile_ledger
+from init_db import init_db
+
+# Load order: parents before children
+MODELS = [Medicine, BranchStock, User, Sale, SaleItem, Order, OrderItem]
+
+COLUMNS = {
+    Medicine: ["id", "name", "description", "price", "category", "manufacturer", "dosage",
+               "prescription_required", "min_stock_level", "max_stock_level", "is_active", "created_at"],
+    BranchStock: ["branch_id", "medicine_id", "stock"],
+    User: ["id", "email", "name", "hashed_password", "role", "branch_id", "is_active", "created_at"],
+    Sale: ["id", "sale_number", "user_id", "branch_id", "customer_name", "total_amount", "payment_method",
+           "created_at"],
+    SaleItem: ["sale_id", "medicine_id", "quantity", "unit_price", "total_price", "discount", "created_at"],
+    Order: ["id", "customer_id", "branch_id", "order_number", "status", "total_amount", "shipping_address",
+            "created_at"],
+    OrderItem: ["order_id", "medicine_id", "quantity", "unit_price", "total_price", "created_at"],
+}
+
+# (category, share of the catalogue, price range, prescription share)
+CATEGORIES = [
+    ("Pain Relief", 14, (2, 15), 0.1),
+    ("Antibiotics", 10, (8, 60), 1.0),
+    ("Cardiovascular", 9, (10, 90), 0.9),
+    ("Diabetes", 7, (12, 120), 0.8),
+    ("Respiratory", 8, (6, 70), 0.5),
+    ("Digestive Health", 9, (3, 25), 0.2),
+    ("Allergy", 8, (4, 30), 0.1),
+    ("Vitamins", 12, (3, 40), 0.0),
+    ("Dermatology", 8, (5, 45), 0.3),
+    ("Mental Health", 6, (15, 110), 1.0),
+    ("First Aid", 9, (1, 20), 0.0),
+]
+INGREDIENTS = [
+    "Paracetamol", "Ibuprofen", "Amoxicillin", "Azithromycin", "Atorvastatin", "Lisinopril", "Metformin",
+    "Omeprazole", "Cetirizine", "Loratadine", "Salbutamol", "Sertraline", "Amlodipine", "Losartan",
+    "Simvastatin", "Levothyroxine", "Prednisolone", "Ciprofloxacin", "Doxycycline", "Fluoxetine",
+    "Ranitidine", "Diclofenac", "Naproxen", "Montelukast", "Vitamin C", "Vitamin D3", "Zinc", "Folic Acid",
+    "Hydrocortisone", "Clotrimazole", "Insulin Glargine", "Gliclazide", "Bisoprolol", "Warfarin",
+]
+FORMS = ["Tablets", "Capsules", "Syrup", "Cream", "Drops", "Inhaler", "Gel", "Injection"]
+STRENGTHS = ["5mg", "10mg", "20mg", "25mg", "50mg", "100mg", "250mg", "500mg", "1g"]
+MANUFACTURERS = [
+    "MedPharm Ltd", "PharmaCorp", "HealthGen", "BioCure", "NovaMed", "Apex Labs", "GreenLeaf Pharma",
+    "Unity Health", "Zenith Pharmaceuticals", "Crescent Labs",
+]
+FIRST_NAMES = [
+    "Alice", "Bob", "Carla", "David", "Emma", "Farid", "Grace", "Hiro", "Ines", "Jamal", "Kate", "Luis",
+    "Maya", "Noah", "Olga", "Priya", "Quinn", "Rosa", "Sam", "Tariq", "Uma", "Victor", "Wen", "Yusuf", "Zoe",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Garcia", "Chen", "Patel", "Kim", "Nguyen", "Martinez", "Brown", "Okafor",
+    "Rossi", "Müller", "Silva", "Cohen", "Ivanova", "Tanaka", "Haddad", "Dubois", "Novak", "Ali",
+]
+STREETS = ["High St", "Station Rd", "Church Ln", "Park Ave", "Mill Rd", "King St", "Queen St", "Bridge Rd"]
+
+PAYMENT_METHODS = (["cash", "card", "insurance"], [40, 48, 12])
+# Share of sales per hour of the day (local opening hours, peaks at lunch and after work)
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 0, 1, 4, 7, 9, 10, 11, 10, 8, 7, 8, 10, 11, 8, 5, 3, 1, 0]
+# Monday .. Sunday
+WEEKDAY_WEIGHTS = [1.0, 0.95, 0.95, 1.0, 1.15, 1.25, 0.6]
+QUANTITIES = ([1, 2, 3, 4, 5, 10], [58, 20, 9, 6, 4, 3])
+DEFAULT_ORDER_MIX = "delivered=70,shipped=5,processing=4,confirmed=4,pending=5,cancelled=12"
+OPEN_STATUSES = {OrderStatus.PENDING, OrderStatus.CONFIRMED, OrderStatus.PROCESSING, OrderStatus.SHIPPED}
+# Orders younger than this are still open
+OPEN_DAYS = 3
+
+
+def parse_mix(value: str) -> Dict[OrderStatus, float]:
+    """"delivered=70,cancelled=10,..." -> {OrderStatus: weight}"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        try:
+            mix[OrderStatus(name.strip().lower())] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid order mix entry: {part!r}")
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("Order mix needs at least one positive weight")
+    return mix
+
+
+def zipf_weights(count: int, skew: float) -> List[float]:
+    """Cumulative Zipf weights for ranks 1..count"""
+    return list(accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+class Loader:
+    """Buffers generated rows and writes them in chunks, parents first.
+
+    On PostgreSQL every chunk is one COPY per table; elsewhere one multi-row
+    INSERT per table. Each flush is its own transaction.
+    """
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.copy = engine.dialect.name == "postgresql"
+        self.rows: Dict[type, List[Sequence]] = {model: [] for model in MODELS}
+        self.loaded: Dict[type, int] = {model: 0 for model in MODELS}
+        self.pending = 0
+
+    def add(self, model: type, row: Sequence) -> None:
+        self.rows[model].append(row)
+        self.pending += 1
+
+    def maybe_flush(self) -> None:
+        """Flush if a chunk is full; call only once a parent and its children are added"""
+        if self.pending >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        with engine.begin() as conn:
+            for model in MODELS:
+                rows = self.rows[model]
+                if not rows:
+                    continue
+                if self.copy:
+                    self._copy(conn, model, rows)
+                else:
+                    columns = COLUMNS[model]
+                    conn.execute(insert(model), [dict(zip(columns, row)) for row in rows])
+                self.loaded[model] += len(rows)
+                self.rows[model] = []
+        self.pending = 0
+
+    def _copy(self, conn: Connection, model: type, rows: List[Sequence]) -> None:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["\\N" if value is None else _copy_value(value) for value in row])
+        buffer.seek(0)
+        columns = ", ".join(COLUMNS[model])
+        cursor = conn.connection.cursor()
+        cursor.copy_expert(f"COPY {model.__tablename__} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+        cursor.close()
+
+
+def _copy_value(value):
+    if isinstance(value, enum.Enum):
+        # SQLAlchemy stores Enum columns by member name
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def next_id(conn: Connection, model: type) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def ensure_branches(count: int) -> List[int]:
+    """Ids of the default branch and of generated branches GEN-02 .. GEN-<count>, creating missing ones"""
+    with SessionLocal() as db:
+        branch_ids = [default_branch_id(db)]
+        for n in range(2, count + 1):
+            code = f"GEN-{n:02d}"
+            branch = db.query(Branch).filter(Branch.code == code).first()
+            if branch is None:
+                branch = Branch(code=code, name=f"Generated branch {n}", is_active=True)
+                db.add(branch)
+                db.flush()
+            branch_ids.append(branch.id)
+        db.commit()
+    return branch_ids
+
+
+def generate(args) -> Loader:
+    rng = random.Random(args.seed)
+    end = args.end_date
+    start = end - timedelta(days=args.days)
+    loader = Loader(args.chunk_size)
+    branch_ids = ensure_branches(args.branches)
+
+    with engine.begin() as conn:
+        ids = {model: next_id(conn, model) for model in (Medicine, User, Sale, Order)}
+        if engine.dialect.name == "postgresql":
+            for table in PARTITIONED_TABLES:
+                if is_partitioned(conn, table):
+                    ensure_partitions(conn, table, settings.PARTITION_MONTHS_AHEAD, first_month=month_start(start))
+
+    def at(day: date, hour: int) -> datetime:
+        return datetime(day.year, day.month, day.day, hour, rng.randrange(60), rng.randrange(60), tzinfo=timezone.utc)
+
+    # Medicines: popularity rank is independent of id order
+    print(f"Generating {args.medicines} medicines...")
+    category_weights = list(accumulate(share for _, share, _, _ in CATEGORIES))
+    medicines = []
+    for n in range(args.medicines):
+        category, _, (low, high), prescription_share = rng.choices(CATEGORIES, cum_weights=category_weights)[0]
+        strength = rng.choice(STRENGTHS)
+        price = round(rng.uniform(low, high), 2)
+        medicine_id = ids[Medicine] + n
+        medicines.append((medicine_id, price))
+        loader.add(Medicine, (
+            medicine_id, f"{rng.choice(INGREDIENTS)} {strength} {rng.choice(FORMS)} #{medicine_id}", None, price,
+            category, rng.choice(MANUFACTURERS), strength, rng.random() < prescription_share,
+            10, 500, rng.random() > 0.02, at(start, 9),
+        ))
+        for branch_id in branch_ids:
+            loader.add(BranchStock, (branch_id, medicine_id, rng.randint(0, 500)))
+        loader.maybe_flush()
+    rng.shuffle(medicines)
+    medicine_weights = zipf_weights(len(medicines), args.skew)
+
+    # Users: a few pharmacists and staff who make the sales, the rest customers
+    print(f"Generating {args.users} users...")
+    password = get_password_hash(args.password)
+    sellers, customers = [], []
+    for n in range(args.users):
+        user_id = ids[User] + n
+        role = UserRole.PHARMACIST if n % 50 == 0 else UserRole.STAFF if n % 50 < 4 else UserRole.CUSTOMER
+        branch_id = None
+        if role == UserRole.CUSTOMER:
+            customers.append(user_id)
+        else:
+            branch_id = branch_ids[len(sellers) % len(branch_ids)]
+            sellers.append((user_id, branch_id))
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        loader.add(User, (
+            user_id, f"{first.lower()}.{last.lower()}.{user_id}@generated.example", f"{first} {last}", password,
+            role, branch_id, True, at(start, 9),
+        ))
+        loader.maybe_flush()
+    if not sellers or not customers:
+        raise SystemExit("--users is too small to have both staff and customers")
+    rng.shuffle(customers)
+    seller_weights = zipf_weights(len(sellers), args.skew / 2)
+    customer_weights = zipf_weights(len(customers), args.skew)
+    loader.flush()
+
+    def pick_items(mean_items: float) -> Dict[int, tuple]:
+        count = min(1 + int(rng.expovariate(1 / max(mean_items - 1, 0.01))), args.max_items)
+        picked = {}
+        for medicine_id, price in rng.choices(medicines, cum_weights=medicine_weights, k=count):
+            if medicine_id not in picked:
+                picked[medicine_id] = (price, rng.choices(*QUANTITIES)[0])
+        return picked
+
+    sale_id, order_id = ids[Sale], ids[Order]
+    hours = list(range(24))
+    statuses = list(args.order_mix)
+    status_weights = list(accumulate(args.order_mix.values()))
+    open_statuses = [status for status in statuses if status in OPEN_STATUSES] or [OrderStatus.PENDING]
+    started = time.perf_counter()
+
+    print(f"Generating {args.days} days of history from {start} to {end}...")
+    for offset in range(args.days):
+        day = start + timedelta(days=offset)
+        # Slow growth over the period, plus day-to-day noise
+        volume = WEEKDAY_WEIGHTS[day.weekday()] * (0.85 + 0.3 * offset / max(args.days, 1)) * rng.uniform(0.9, 1.1)
+
+        for _ in range(round(args.sales_per_day * volume)):
+            created_at = at(day, rng.choices(hours, weights=HOUR_WEIGHTS)[0])
+            total = 0.0
+            for medicine_id, (price, quantity) in pick_items(args.items_per_sale).items():
+                discount = round(price * quantity * rng.choice((0.05, 0.1, 0.15)), 2) if rng.random() < 0.08 else 0.0
+                line_total = round(price * quantity - discount, 2)
+                total += line_total
+                loader.add(SaleItem, (sale_id, medicine_id, quantity, price, line_total, discount, created_at))
+            customer_name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" if rng.random() < 0.3 else None
+            seller_id, branch_id = rng.choices(sellers, cum_weights=seller_weights)[0]
+            loader.add(Sale, (
+                sale_id, f"GEN-S-{sale_id}", seller_id, branch_id, customer_name,
+                round(total, 2), rng.choices(*PAYMENT_METHODS)[0], created_at,
+            ))
+            sale_id += 1
+            loader.maybe_flush()
+
+        for _ in range(round(args.orders_per_day * volume)):
+            created_at = at(day, rng.choices(hours, weights=HOUR_WEIGHTS)[0])
+            status = rng.choices(statuses, cum_weights=status_weights)[0]
+            if (end - day).days < OPEN_DAYS and status not in (OrderStatus.CANCELLED,):
+                status = rng.choice(open_statuses)
+            total = 0.0
+            for medicine_id, (price, quantity) in pick_items(args.items_per_order).items():
+                line_total = round(price * quantity, 2)
+                total += line_total
+                loader.add(OrderItem, (order_id, medicine_id, quantity, price, line_total, created_at))
+            loader.add(Order, (
+                order_id, rng.choices(customers, cum_weights=customer_weights)[0], rng.choice(branch_ids),
+                f"GEN-O-{order_id}", status, round(total, 2), f"{rng.randint(1, 300)} {rng.choice(STREETS)}",
+                created_at,
+            ))
+            order_id += 1
+            loader.maybe_flush()
+
+        if (offset + 1) % 30 == 0 or offset + 1 == args.days:
+            loaded = loader.loaded[SaleItem] + len(loader.rows[SaleItem])
+            print(f"  day {offset + 1}/{args.days}: {loaded:,} sale items ({time.perf_counter() - started:.0f}s)")
+
+    loader.flush()
+    # Generated stock has no lot numbers (it is sold as UNTRACKED lots) and
+    # enters the ledger as opening stock
+    with SessionLocal() as db:
+        reconcile_lots(db)
+        reconcile_ledger(db, reason="opening")
+        db.commit()
+    finish()
+    return loader
+
+
+def finish() -> None:
+    """Move the id sequences past the explicit ids and refresh planner statistics"""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for model in (Medicine, User, Sale, SaleItem, Order, OrderItem):
+            table = model.__tablename__
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+            ))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for model in MODELS:
+            conn.execute(text(f"ANALYZE {model.__tablename__}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--medicines", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=1000, help="generated users; about 1 in 12 are staff")
+    parser.add_argument("--days", type=int, default=365, help="days of history")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today(), help="last day of history (YYYY-MM-DD)")
+    parser.add_argument("--sales-per-day", type=float, default=500)
+    parser.add_argument("--items-per-sale", type=float, default=3, help="average lines per sale")
+    parser.add_argument("--orders-per-day", type=float, default=100)
+    parser.add_argument("--items-per-order", type=float, default=2, help="average lines per order")
+    parser.add_argument("--branches", type=int, default=1, help="branches stocking the catalog, the default one included")
+    parser.add_argument("--max-items", type=int, default=100, help="most lines on one sale or order")
+    parser.add_argument("--order-mix", type=parse_mix, default=parse_mix(DEFAULT_ORDER_MIX),
+                        help=f"order status weights (default: {DEFAULT_ORDER_MIX})")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for medicine and customer popularity")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--password", default="generated123", help="password of every generated user")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="rows per COPY/INSERT transaction")
+    parser.add_argument("--skip-init", action="store_true", help="do not run init_db.py first")
+    args = parser.parse_args()
+
+    if not args.skip_init:
+        init_db()
+
+    started = time.perf_counter()
+    loader = generate(args)
+    print(f"\n✓ Generated data in {time.perf_counter() - started:.0f}s")
+    for model, count in loader.loaded.items():
+        print(f"  • {model.__tablename__}: {count:,}")
+
+
+if __name__ == "__main__":
+    main()
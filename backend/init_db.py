@@ -11,24 +11,35 @@ from pathlib import Path
 # Add the backend directory to the path
 sys.path.append(str(Path(__file__).parent))
 
+from alembic import command
 from sqlalchemy.orm import Session
-from app.core.database import engine, SessionLocal, Base
+from app.core.branches import default_branch_id
+from app.core.database import SessionLocal
+from app.core.startup import alembic_config
 from app.core.security import get_password_hash
 from app.models.user import User, UserRole
+from app.models.branch import BranchStock
 from app.models.medicine import Medicine
 from app.models.order import Order, OrderItem, OrderStatus
 from app.models.activity import Activity
+from app.services.inventory import reconcile_lots
+from app.services.stock_ledger import reconcile_ledger
 from decimal import Decimal
 from datetime import datetime, timedelta
 import random
 
 
+def migrate():
+    """Bring the schema to the latest Alembic revision"""
+    print("Migrating database schema...")
+    command.upgrade(alembic_config(), "head")
+    print("✓ Database schema at latest revision")
+
+
 def init_db():
     """Initialize the database with tables and initial data"""
     
-    print("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
-    print("✓ Database tables created")
+    migrate()
     
     db: Session = SessionLocal()
     
@@ -89,6 +100,8 @@ def init_db():
                     name=user_data["name"],
                     hashed_password=get_password_hash(user_data["password"]),
                     role=user_data["role"],
+                    # Staff work at the default branch; customers have none
+                    branch_id=None if user_data["role"] == UserRole.CUSTOMER else default_branch_id(db),
                     is_active=True
                 )
                 db.add(user)
@@ -261,11 +274,18 @@ def init_db():
                 }
             ]
             
+            branch_id = default_branch_id(db)
             for med_data in sample_medicines:
+                stock = med_data.pop("stock")
                 medicine = Medicine(**med_data)
                 db.add(medicine)
+                db.flush()
+                db.add(BranchStock(branch_id=branch_id, medicine_id=medicine.id, stock=stock))
                 print(f"✓ Added medicine: {med_data['name']}")
             
+            db.flush()
+            reconcile_lots(db)  # initial stock goes into UNTRACKED lots
+            reconcile_ledger(db, reason="opening")
             db.commit()
             db.refresh(medicine)  # Refresh to get IDs
             print(f"✓ Created {len(sample_medicines)} sample medicines")
@@ -296,6 +316,7 @@ def init_db():
                     # Create order
                     order = Order(
                         customer_id=customer.id,
+                        branch_id=default_branch_id(db),
                         order_number=order_number,
                         status=status,
                         total_amount=0,  # Will be calculated
@@ -322,7 +343,8 @@ def init_db():
                             medicine_id=medicine.id,
                             quantity=quantity,
                             unit_price=unit_price,
-                            total_price=total_price
+                            total_price=total_price,
+                            created_at=order.created_at
                         )
                         db.add(order_item)
                     
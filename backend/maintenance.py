@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Partition maintenance for the monthly partitioned history tables, and the
+reorder point update and stock ledger upkeep.
+
+Meant to run from cron (e.g. daily); every command is safe to repeat. The
+partition commands do nothing for tables that are not partitioned (see the
+0003 migration).
+
+    python maintenance.py partitions             # create the next months' partitions
+    python maintenance.py detach --older-than 24 # detach sales/orders partitions older than 24 months
+    python maintenance.py archive --older-than 24 --dest archive/
+    python maintenance.py retention --days 365   # delete old activities
+    python maintenance.py status                 # list partitions and row estimates
+    python maintenance.py reorder-points         # set each branch's min/max stock levels from its forecast
+    python maintenance.py reconcile-lots         # put stock no lot accounts for into UNTRACKED lots
+    python maintenance.py stock-snapshot         # snapshot stock of medicines that moved (e.g. hourly)
+    python maintenance.py reconcile-ledger       # record stock the movement ledger does not account for
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.cache import response_cache
+from app.core.database import SessionLocal, engine
+from app.core.event_bus import event_bus
+from app.core.partitions import (
+    DETACH_ORDER,
+    PARTITIONED_TABLES,
+    add_months,
+    archive_table,
+    detach_partition,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+    month_start,
+    partitions_before,
+    purge_activities,
+)
+from app.models.branch import Branch
+from app.services.forecasting import ForecastSettings, apply_reorder_points, forecast_catalog
+from app.services.inventory import reconcile_lots
+from app.services.inventory_summary import inventory_summary
+from app.services.stock_ledger import ledger_drift, reconcile_ledger, take_snapshots
+
+# Activities are governed by the retention command instead
+HISTORY_TABLES = [table for table in DETACH_ORDER if table != "activities"]
+
+
+def _cutoff(months: int):
+    return add_months(month_start(datetime.now(timezone.utc).date()), -months)
+
+
+def create_partitions(args) -> None:
+    """Create partitions for this month and the next --months-ahead months"""
+    with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            for name in ensure_partitions(conn, table, args.months_ahead):
+                print(f"✓ Created {name}")
+    print("✓ Partitions up to date")
+
+
+def detach(args) -> None:
+    """Detach old sales/orders partitions, keeping them as standalone tables"""
+    cutoff = _cutoff(args.older_than)
+    for table in HISTORY_TABLES:
+        with engine.begin() as conn:
+            for partition in partitions_before(conn, table, cutoff):
+                detach_partition(conn, table, partition.name)
+                print(f"✓ Detached {partition.name}")
+
+
+def archive(args) -> None:
+    """Detach old sales/orders partitions, dump each to a gzipped CSV and drop it"""
+    cutoff = _cutoff(args.older_than)
+    dest = Path(args.dest)
+    for table in HISTORY_TABLES:
+        with engine.connect() as conn:
+            partitions = partitions_before(conn, table, cutoff)
+        for partition in partitions:
+            # Detach and archive in separate transactions: if the dump fails the
+            # data stays in the detached table
+            with engine.begin() as conn:
+                detach_partition(conn, table, partition.name)
+            with engine.begin() as conn:
+                path = archive_table(conn, partition.name, dest)
+            print(f"✓ Archived {partition.name} to {path}")
+
+
+def retention(args) -> None:
+    """Delete activities older than --days"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=args.days)
+    deleted = purge_activities(engine, cutoff)
+    print(f"✓ Deleted {deleted} activities older than {cutoff:%Y-%m-%d}")
+
+
+def status(args) -> None:
+    """Print the partitions of each table with estimated row counts"""
+    with engine.connect() as conn:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(conn, table):
+                print(f"{table}: not partitioned")
+                continue
+            print(f"{table}:")
+            for partition in list_partitions(conn, table):
+                rows = conn.execute(
+                    text("SELECT reltuples::bigint FROM pg_class WHERE relname = :name"),
+                    {"name": partition.name},
+                ).scalar()
+                span = f"{partition.start} .. {partition.end}" if partition.start else "default"
+                print(f"  {partition.name:<28} {span:<26} ~{max(rows, 0)} rows")
+
+
+def reorder_points(args) -> None:
+    """Set each active branch's min/max stock levels of active medicines from its demand forecast"""
+    config = ForecastSettings.resolve(history_days=args.history_days, lead_time_days=args.lead_time_days)
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        branches = db.query(Branch.id, Branch.code).filter(Branch.is_active == True).order_by(Branch.id).all()
+        for branch_id, code in branches:
+            forecast = forecast_catalog(db, config, branch_id)
+            if args.dry_run:
+                changed = int(forecast.has_history.sum())
+                print(f"✓ {code}: forecast {len(forecast.medicine_ids)} medicines; {changed} would be updated (dry run)")
+                continue
+            updated = apply_reorder_points(db, forecast, branch_id)
+            db.commit()
+            print(f"✓ {code}: updated {updated} of {len(forecast.medicine_ids)} medicines")
+        if args.dry_run:
+            return
+    # Tell the API workers (over the event bus) to drop cached medicines
+    event_bus.start()
+    response_cache.invalidate("medicines")
+    inventory_summary.invalidate()
+    event_bus.stop()
+    print(f"✓ Updated reorder points of {len(branches)} branches in {time.perf_counter() - started:.1f}s")
+
+
+def reconcile_lots_command(args) -> None:
+    """Put medicine stock that no lot accounts for into UNTRACKED lots"""
+    with SessionLocal() as db:
+        fixed = reconcile_lots(db)
+        db.commit()
+    print(f"✓ Reconciled lots of {fixed} medicines")
+
+
+def stock_snapshot(args) -> None:
+    """Snapshot the stock of every medicine that moved since the previous snapshot"""
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        written = take_snapshots(db, args.settle_seconds)
+        db.commit()
+    print(f"✓ Wrote {written} stock snapshots in {time.perf_counter() - started:.1f}s")
+
+
+def reconcile_ledger_command(args) -> None:
+    """Record a correction movement for every branch stock the ledger does not match"""
+    with SessionLocal() as db:
+        if args.dry_run:
+            for (branch_id, medicine_id), difference in sorted(ledger_drift(db).items()):
+                print(f"  branch {branch_id}, medicine {medicine_id}: stock is {difference:+d} from the ledger")
+            return
+        corrected = reconcile_ledger(db)
+        db.commit()
+    print(f"✓ Corrected the ledger of {corrected} branch stocks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("partitions", help=create_partitions.__doc__)
+    command.add_argument("--months-ahead", type=int, default=settings.PARTITION_MONTHS_AHEAD)
+    command.set_defaults(run=create_partitions)
+
+    for name, handler in (("detach", detach), ("archive", archive)):
+        command = commands.add_parser(name, help=handler.__doc__)
+        command.add_argument("--older-than", type=int, default=settings.ARCHIVE_AFTER_MONTHS, metavar="MONTHS")
+        command.set_defaults(run=handler)
+    commands.choices["archive"].add_argument("--dest", default=settings.ARCHIVE_DIR)
+
+    command = commands.add_parser("retention", help=retention.__doc__)
+    command.add_argument("--days", type=int, default=settings.ACTIVITY_RETENTION_DAYS)
+    command.set_defaults(run=retention)
+
+    command = commands.add_parser("status", help=status.__doc__)
+    command.set_defaults(run=status)
+
+    command = commands.add_parser("reorder-points", help=reorder_points.__doc__)
+    command.add_argument("--history-days", type=int, default=settings.FORECAST_HISTORY_DAYS)
+    command.add_argument("--lead-time-days", type=float, default=settings.FORECAST_LEAD_TIME_DAYS)
+    command.add_argument("--dry-run", action="store_true")
+    command.set_defaults(run=reorder_points)
+
+    command = commands.add_parser("reconcile-lots", help=reconcile_lots_command.__doc__)
+    command.set_defaults(run=reconcile_lots_command)
+
+    command = commands.add_parser("stock-snapshot", help=stock_snapshot.__doc__)
+    command.add_argument("--settle-seconds", type=int, default=settings.STOCK_SNAPSHOT_SETTLE_SECONDS)
+    command.set_defaults(run=stock_snapshot)
+
+    command = commands.add_parser("reconcile-ledger", help=reconcile_ledger_command.__doc__)
+    command.add_argument("--dry-run", action="store_true", help="only list the differences")
+    command.set_defaults(run=reconcile_ledger_command)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
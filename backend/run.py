@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 LIPMS Backend Server
-Run this script to start the FastAPI development server
+Run this script to start the FastAPI development server (auto-reload,
+single process). For production use `python -m app.serve`.
 """
 
 import uvicorn
@@ -0,0 +1,117 @@
+"""
+Fixtures for the API and service tests.
+
+Each test gets a fresh in-memory SQLite database with the default branch
+(MAIN, id 1), an admin, a customer and five medicines stocked at 50 units
+(min 10, max 100) in untracked lots with an opening movement each. The
+app's get_db and authentication are overridden, so requests run as
+`login(user)` chose (the admin by default) without tokens.
+"""
+
+import os
+
+os.environ.setdefault("DB_SCHEMA_CHECK", "off")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+from app.core import auth
+from app.core.cache import response_cache
+from app.core.database import Base, get_db
+from app.main import app
+from app.models import Branch, BranchStock, Medicine, User, UserRole
+from app.services.inventory import reconcile_lots
+from app.services.inventory_summary import inventory_summary
+from app.services.stock_ledger import reconcile_ledger
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine, autoflush=False)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    branch = Branch(id=1, code="MAIN", name="Main", is_active=True)
+    session.add(branch)
+    session.add_all([
+        User(id=1, email="admin@example.com", name="Admin", hashed_password="!", role=UserRole.ADMIN),
+        User(id=2, email="customer@example.com", name="Customer", hashed_password="!", role=UserRole.CUSTOMER),
+    ])
+    for i in range(5):
+        medicine = Medicine(
+            name=f"Medicine {i}", price=2.0 + i, category="General", manufacturer="Acme",
+            min_stock_level=10, max_stock_level=100, is_active=True,
+        )
+        session.add(medicine)
+        session.flush()
+        session.add(BranchStock(branch_id=1, medicine_id=medicine.id, stock=50))
+    session.flush()
+    reconcile_lots(session)
+    reconcile_ledger(session, reason="opening")
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def current_user():
+    return {"id": 1}
+
+
+@pytest.fixture
+def login(current_user):
+    """Make the following requests as `user` (a User or an id)"""
+    def login(user):
+        current_user["id"] = user if isinstance(user, int) else user.id
+    return login
+
+
+@pytest.fixture
+def make_user(db):
+    """Add a user with `role`, optionally assigned to a branch"""
+    def make_user(role: UserRole, branch_id=None) -> User:
+        user = User(
+            email=f"{role.value}{db.query(User).count()}@example.com", name=role.value.title(),
+            hashed_password="!", role=role, branch_id=branch_id,
+        )
+        db.add(user)
+        db.commit()
+        return user
+    return make_user
+
+
+@pytest.fixture
+def client(db, session_factory, current_user):
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def override_current_user():
+        with session_factory() as session:
+            return session.get(User, current_user["id"])
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[auth.get_current_active_user] = override_current_user
+    if response_cache.enabled:
+        response_cache.backend.clear()
+    inventory_summary.invalidate()
+    yield TestClient(app, base_url="http://localhost")
+    app.dependency_overrides.clear()
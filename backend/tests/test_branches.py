@@ -0,0 +1,188 @@
+import pytest
+from sqlalchemy import func
+
+from app.models import BranchStock, MedicineLot, UserRole
+from app.services.stock_ledger import ledger_drift
+
+
+@pytest.fixture
+def second_branch(client):
+    """Branch B2 (id 2) holding 30 units of medicine 1 and nothing else"""
+    response = client.post("/api/v1/branches/", json={"code": "B2", "name": "Second"})
+    assert response.status_code == 200
+    assert client.patch(
+        "/api/v1/medicines/1/stock", params={"branch_id": 2},
+        json={"medicine_id": 1, "quantity": 30, "operation": "add"},
+    ).status_code == 200
+    return response.json()["id"]
+
+
+@pytest.fixture
+def pharmacist(make_user, second_branch):
+    """A pharmacist assigned to branch B2"""
+    return make_user(UserRole.PHARMACIST, branch_id=second_branch)
+
+
+def stock(client, medicine_id: int, branch_id: int) -> int:
+    return client.get(f"/api/v1/medicines/{medicine_id}", params={"branch_id": branch_id}).json()["stock"]
+
+
+def test_create_branch(client, second_branch):
+    assert second_branch == 2
+    assert client.post("/api/v1/branches/", json={"code": "B2", "name": "Again"}).status_code == 400
+    assert [branch["code"] for branch in client.get("/api/v1/branches/").json()] == ["B2", "MAIN"]
+
+
+def test_stock_is_kept_per_branch(client, second_branch):
+    assert stock(client, 1, 1) == 50
+    assert stock(client, 1, 2) == 30
+    assert stock(client, 2, 2) == 0
+    assert [(level["code"], level["stock"]) for level in client.get("/api/v1/medicines/1/branches").json()] == [
+        ("B2", 30), ("MAIN", 50),
+    ]
+
+
+def test_assign_user_to_branch(client, make_user, second_branch):
+    user = make_user(UserRole.PHARMACIST)
+
+    response = client.put(f"/api/v1/users/{user.id}", json={"branch_id": second_branch})
+
+    assert response.status_code == 200
+    assert response.json()["branch_id"] == second_branch
+    assert client.put(f"/api/v1/users/{user.id}", json={"branch_id": 99}).status_code == 404
+
+
+def test_staff_act_for_their_branch(client, login, pharmacist):
+    login(pharmacist)
+
+    response = client.post("/api/v1/sales/", json={
+        "items": [{"medicine_id": 1, "quantity": 25, "unit_price": 2.0}], "payment_method": "cash",
+    })
+
+    assert response.status_code == 200
+    assert response.json()["branch_id"] == 2
+    assert [medicine["stock"] for medicine in client.get("/api/v1/medicines/").json()] == [5, 0, 0, 0, 0]
+    assert [medicine["id"] for medicine in client.get("/api/v1/medicines/low-stock/").json()] == [1, 2, 3, 4, 5]
+    assert client.get("/api/v1/medicines/summary/").json()["totals"]["units"] == 5
+    assert client.get("/api/v1/stock-movements/levels/").json()["items"] == [{"medicine_id": 1, "stock": 5}]
+    login(1)
+    assert stock(client, 1, 1) == 50
+    assert client.get("/api/v1/medicines/summary/").json()["totals"]["units"] == 250
+
+
+def test_staff_change_status_of_their_branch_orders_only(client, login, make_user, pharmacist):
+    orders = {}
+    for user, branch_id in ((2, 1), (make_user(UserRole.CUSTOMER), 2)):
+        login(user)
+        orders[branch_id] = client.post("/api/v1/orders/", params={"branch_id": branch_id}, json={
+            "items": [{"medicine_id": 1, "quantity": 5}], "shipping_address": "x",
+        }).json()["id"]
+    login(pharmacist)
+
+    response = client.patch(f"/api/v1/orders/{orders[1]}/status", json={"status": "cancelled"})
+    bulk = client.patch("/api/v1/orders/bulk/status", json={"order_ids": [orders[1], orders[2]], "status": "confirmed"})
+
+    assert response.status_code == 404
+    assert bulk.json()["updated"] == 1
+    assert [(result["order_id"], result["status"]) for result in bulk.json()["results"]] == [
+        (orders[1], None), (orders[2], "confirmed"),
+    ]
+    login(1)
+    assert client.get(f"/api/v1/orders/{orders[1]}").json()["status"] == "pending"
+    assert stock(client, 1, 1) == 45
+    assert client.patch(f"/api/v1/orders/{orders[1]}/status", json={"status": "cancelled"}).status_code == 200
+    assert stock(client, 1, 1) == 50
+
+
+def test_sale_limited_to_branch_stock(client, login, pharmacist):
+    login(pharmacist)
+
+    response = client.post("/api/v1/sales/", json={
+        "items": [{"medicine_id": 2, "quantity": 1, "unit_price": 2.0}], "payment_method": "cash",
+    })
+
+    assert response.status_code == 400
+
+
+def test_staff_cannot_act_for_another_branch(client, login, pharmacist):
+    login(pharmacist)
+
+    assert client.get("/api/v1/medicines/", params={"branch_id": 1}).status_code == 403
+    assert client.post("/api/v1/sales/", params={"branch_id": 1}, json={
+        "items": [{"medicine_id": 1, "quantity": 1, "unit_price": 2.0}], "payment_method": "cash",
+    }).status_code == 403
+    assert client.get("/api/v1/medicines/", params={"branch_id": 2}).status_code == 200
+
+
+def test_unknown_branch(client, second_branch):
+    assert client.get("/api/v1/medicines/1", params={"branch_id": 77}).status_code == 404
+    assert client.get("/api/v1/medicines/batch", params={"ids": [1], "branch_id": 77}).status_code == 404
+    client.put(f"/api/v1/branches/{second_branch}", json={"is_active": False})
+    assert client.get("/api/v1/medicines/1", params={"branch_id": second_branch}).status_code == 404
+
+
+def test_cancelled_order_restocks_its_branch(client, db, login, second_branch):
+    login(2)
+    order = client.post("/api/v1/orders/", params={"branch_id": 2}, json={
+        "items": [{"medicine_id": 1, "quantity": 5}], "shipping_address": "x",
+    }).json()
+    login(1)
+    assert client.get(f"/api/v1/orders/{order['id']}").json()["branch_id"] == 2
+    assert stock(client, 1, 2) == 25
+
+    assert client.patch(f"/api/v1/orders/{order['id']}/status", json={"status": "cancelled"}).status_code == 200
+
+    assert (stock(client, 1, 1), stock(client, 1, 2)) == (50, 30)
+    db.expire_all()
+    assert ledger_drift(db) == {}
+    for row in db.query(BranchStock):
+        lots = db.query(func.sum(MedicineLot.quantity)).filter_by(branch_id=row.branch_id, medicine_id=row.medicine_id)
+        assert row.stock == (lots.scalar() or 0), (row.branch_id, row.medicine_id)
+
+
+@pytest.fixture
+def branch_records(client, login, make_user, pharmacist):
+    """A sale and an order in each branch, made by different users so their numbers differ"""
+    login(1)
+    sales = [client.post("/api/v1/sales/", json={
+        "items": [{"medicine_id": 1, "quantity": 1, "unit_price": 2.0}], "payment_method": "cash",
+    }).json()]
+    login(pharmacist)
+    sales.append(client.post("/api/v1/sales/", json={
+        "items": [{"medicine_id": 1, "quantity": 1, "unit_price": 2.0}], "payment_method": "cash",
+    }).json())
+    orders = []
+    for branch_id in (1, 2):
+        login(make_user(UserRole.CUSTOMER))
+        orders.append(client.post("/api/v1/orders/", params={"branch_id": branch_id}, json={
+            "items": [{"medicine_id": 1, "quantity": 1}], "shipping_address": "x",
+        }).json())
+    login(1)
+    assert [sale["branch_id"] for sale in sales] == [1, 2]
+    assert [client.get(f"/api/v1/orders/{order['id']}").json()["branch_id"] for order in orders] == [1, 2]
+    return sales, orders
+
+
+def test_admin_reads_every_branch(client, branch_records):
+    sales, orders = branch_records
+
+    assert sorted(sale["branch_id"] for sale in client.get("/api/v1/sales/").json()) == [1, 2]
+    assert sorted(order["branch_id"] for order in client.get("/api/v1/orders/").json()) == [1, 2]
+    assert [sale["branch_id"] for sale in client.get("/api/v1/sales/", params={"branch_id": 2}).json()] == [2]
+    assert client.get(f"/api/v1/sales/{sales[1]['id']}").status_code == 200
+    assert client.get(f"/api/v1/sales/{sales[1]['id']}", params={"branch_id": 1}).status_code == 404
+    assert client.get("/api/v1/sales/", params={"branch_id": 9}).status_code == 404
+
+
+def test_staff_read_their_branch_only(client, login, make_user, branch_records):
+    sales, orders = branch_records
+    login(make_user(UserRole.PHARMACIST, branch_id=1))
+
+    assert [sale["id"] for sale in client.get("/api/v1/sales/").json()] == [sales[0]["id"]]
+    assert [order["id"] for order in client.get("/api/v1/orders/").json()] == [orders[0]["id"]]
+    assert client.get(f"/api/v1/sales/{sales[0]['id']}").status_code == 200
+    assert client.get(f"/api/v1/orders/{orders[0]['id']}").status_code == 200
+    assert client.get(f"/api/v1/sales/{sales[1]['id']}").status_code == 404
+    assert client.get(f"/api/v1/orders/{orders[1]['id']}").status_code == 404
+    assert client.get("/api/v1/sales/", params={"branch_id": 2}).status_code == 403
+    assert client.get("/api/v1/orders/", params={"branch_id": 2}).status_code == 403
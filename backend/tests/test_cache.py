@@ -0,0 +1,119 @@
+from app.core.cache import MemoryBackend, ResponseCache, response_cache
+from app.core.event_bus import RESYNC_CHANNEL, InMemoryEventBus
+from app.models import User
+
+
+def cache_header(client, path: str, **params) -> str:
+    response = client.get(path, params=params)
+    assert response.status_code == 200
+    return response.headers["x-cache"]
+
+
+def test_hit_until_tag_invalidated(client):
+    assert [cache_header(client, "/api/v1/medicines/1") for _ in range(2)] == ["MISS", "HIT"]
+    assert cache_header(client, "/api/v1/medicines/2") == "MISS"
+
+    response_cache.invalidate("medicine:1")
+
+    assert cache_header(client, "/api/v1/medicines/1") == "MISS"
+    assert cache_header(client, "/api/v1/medicines/2") == "HIT"
+
+
+def test_stock_change_invalidates_medicine(client):
+    cache_header(client, "/api/v1/medicines/1")
+
+    client.patch("/api/v1/medicines/1/stock", json={"medicine_id": 1, "quantity": 5, "operation": "add"})
+
+    response = client.get("/api/v1/medicines/1")
+    assert response.headers["x-cache"] == "MISS"
+    assert response.json()["stock"] == 55
+
+
+def test_user_scope_keys_entries_per_user(client, login):
+    assert cache_header(client, "/api/v1/users/me") == "MISS"
+    login(2)
+    me = client.get("/api/v1/users/me")
+
+    assert me.headers["x-cache"] == "MISS"
+    assert me.json()["id"] == 2
+    assert cache_header(client, "/api/v1/users/me") == "HIT"
+    login(1)
+    assert client.get("/api/v1/users/me").json()["id"] == 1
+
+
+def test_shared_scope_serves_every_caller(client, login):
+    assert cache_header(client, "/api/v1/medicines/1") == "MISS"
+    login(2)
+
+    assert cache_header(client, "/api/v1/medicines/1") == "HIT"
+
+
+def test_set_refused_after_invalidation_during_compute():
+    backend = MemoryBackend(max_entries=10, max_tags=10)
+    versions = backend.versions(["medicine:1"])
+
+    backend.invalidate(["medicine:1"])
+    backend.set("key", b"{}", ["medicine:1"], versions, ttl=60)
+
+    assert backend.get("key") is None
+    backend.set("key", b"{}", ["medicine:1"], backend.versions(["medicine:1"]), ttl=60)
+    assert backend.get("key") == b"{}"
+
+
+def test_cached_endpoint_not_stored_when_invalidated_while_computing():
+    cache = ResponseCache(InMemoryEventBus(), MemoryBackend(max_entries=10, max_tags=10), ttl=60)
+    calls = []
+
+    @cache.cached(dict, tags=("medicine:{medicine_id}",), scope="shared")
+    def endpoint(medicine_id: int, current_user: User):
+        calls.append(medicine_id)
+        if len(calls) == 1:
+            cache.invalidate(f"medicine:{medicine_id}")
+        return {"id": medicine_id}
+
+    user = User(id=1)
+    assert [endpoint(medicine_id=1, current_user=user).headers["x-cache"] for _ in range(3)] == ["MISS", "MISS", "HIT"]
+    assert calls == [1, 1]
+
+
+def test_least_recently_used_entry_evicted():
+    backend = MemoryBackend(max_entries=2, max_tags=10)
+    for key in ("a", "b"):
+        backend.set(key, key.encode(), [], (), ttl=60)
+
+    backend.get("a")
+    backend.set("c", b"c", [], (), ttl=60)
+
+    assert backend.get_many(["a", "b", "c"]) == [b"a", None, b"c"]
+
+
+def test_expired_entry_is_a_miss():
+    backend = MemoryBackend(max_entries=2, max_tags=10)
+
+    backend.set("a", b"a", [], (), ttl=0)
+
+    assert backend.get("a") is None
+
+
+def test_forgotten_tag_versions_count_as_changed():
+    backend = MemoryBackend(max_entries=10, max_tags=1)
+    backend.set("a", b"a", ["t1"], backend.versions(["t1"]), ttl=60)
+    backend.set("b", b"b", ["t2"], backend.versions(["t2"]), ttl=60)
+
+    # t2 is forgotten when t3 is bumped, which moves the horizon past every older version
+    backend.invalidate(["t2"])
+    backend.invalidate(["t3"])
+
+    assert backend.get_many(["a", "b"]) == [None, None]
+    assert backend.stats()["tags"] == 1
+
+
+def test_resync_clears_entries():
+    bus = InMemoryEventBus()
+    cache = ResponseCache(bus, MemoryBackend(max_entries=10, max_tags=10), ttl=60)
+    cache.backend.set("a", b"a", [], (), ttl=60)
+
+    bus.publish(RESYNC_CHANNEL, {})
+
+    assert cache.backend.get("a") is None
+    assert cache.stats()["entries"] == 0
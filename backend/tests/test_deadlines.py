@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+from app.core import deadlines
+from app.core.deadlines import DeadlineMiddleware, statement_timeout_handler, timeouts
+
+
+class DriverError(Exception):
+    def __init__(self, pgcode: str):
+        super().__init__(f"pgcode {pgcode}")
+        self.pgcode = pgcode
+
+
+def deadline_app(default: float = 0.05) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow_read():
+        await asyncio.sleep(1)
+        return {}
+
+    @app.post("/slow")
+    async def slow_write():
+        await asyncio.sleep(0.1)
+        return {"left": deadlines.remaining()}
+
+    @app.get("/fast")
+    async def fast_read():
+        return {"left": deadlines.remaining()}
+
+    @app.get("/query/{pgcode}")
+    def query(pgcode: str):
+        raise OperationalError("SELECT 1", {}, DriverError(pgcode))
+
+    app.add_middleware(DeadlineMiddleware, default=default, routes={"GET /fast": 5}, exempt_paths=["/health"])
+    app.add_exception_handler(OperationalError, statement_timeout_handler)
+    return app
+
+
+def test_read_past_deadline_gets_504():
+    before = timeouts.value("/slow", "deadline")
+
+    response = TestClient(deadline_app()).get("/slow")
+
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Request took too long"}
+    assert timeouts.value("/slow", "deadline") == before + 1
+
+
+def test_write_is_not_cut_off():
+    response = TestClient(deadline_app()).post("/slow")
+
+    assert response.status_code == 200
+    assert response.json()["left"] < 0
+
+
+def test_route_budget_sets_remaining_time():
+    left = TestClient(deadline_app()).get("/fast").json()["left"]
+
+    assert 4 < left <= 5
+    assert deadlines.remaining() is None
+
+
+def test_statement_timeout_maps_to_504():
+    before = timeouts.value("/query/{pgcode}", "statement")
+
+    response = TestClient(deadline_app()).get(f"/query/{deadlines.QUERY_CANCELED}")
+
+    assert response.status_code == 504
+    assert timeouts.value("/query/{pgcode}", "statement") == before + 1
+
+
+def test_other_operational_errors_pass_through():
+    with pytest.raises(OperationalError):
+        TestClient(deadline_app()).get("/query/08006")
+
+    assert TestClient(deadline_app(), raise_server_exceptions=False).get("/query/08006").status_code == 500
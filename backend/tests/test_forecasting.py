@@ -0,0 +1,140 @@
+from datetime import datetime, time, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.models import Branch, BranchStock, Order, OrderItem, Sale, SaleItem, UserRole
+from app.models.order import OrderStatus
+from app.services.forecasting import (
+    ForecastSettings,
+    compute_forecast,
+    history_bounds,
+    load_daily_demand,
+)
+
+SETTINGS = ForecastSettings(
+    history_days=30, window_days=10, smoothing=0.5, lead_time_days=4, review_days=7, service_level=0.95
+)
+
+
+def days_ago(days: int) -> datetime:
+    return datetime.combine(datetime.now(timezone.utc).date(), time(12), tzinfo=timezone.utc) - timedelta(days=days)
+
+
+def sell(db, branch_id: int, medicine_id: int, quantity: int, days: int) -> None:
+    sale = Sale(
+        sale_number=f"S-{branch_id}-{medicine_id}-{days}-{db.query(Sale).count()}", user_id=1, branch_id=branch_id,
+        total_amount=quantity, payment_method="cash", created_at=days_ago(days),
+    )
+    db.add(sale)
+    db.flush()
+    db.add(SaleItem(
+        sale_id=sale.id, medicine_id=medicine_id, quantity=quantity, unit_price=1, total_price=quantity,
+        created_at=days_ago(days),
+    ))
+    db.commit()
+
+
+def test_compute_forecast_constant_demand():
+    # 5 units a day for the whole history of medicine 1; nothing for medicine 2
+    demand = np.array([(1, day, 5) for day in range(30)], dtype=np.int64)
+    forecast = compute_forecast(np.array([1, 2]), demand, 30, SETTINGS)
+
+    assert forecast.has_history.tolist() == [True, False]
+    assert forecast.moving_average.tolist() == [5.0, 0.0]
+    assert forecast.demand_std.tolist() == [0.0, 0.0]
+    assert forecast.smoothed_demand[0] == pytest.approx(5 * (1 - 0.5 ** 30))
+    # No variability, so no safety stock: ceil(5 * 4) and ceil(5 * 7)
+    assert forecast.safety_stock.tolist() == [0, 0]
+    assert forecast.reorder_point.tolist() == [20, 0]
+    assert forecast.order_quantity.tolist() == [35, 0]
+
+
+def test_compute_forecast_safety_stock_from_variability():
+    # 10 units every other day in the window: mean 5, deviation 5
+    demand = np.array([(1, day, 10) for day in range(20, 30, 2)], dtype=np.int64)
+    forecast = compute_forecast(np.array([1]), demand, 30, SETTINGS)
+
+    assert forecast.moving_average[0] == 5.0
+    assert forecast.demand_std[0] == 5.0
+    assert forecast.safety_stock[0] == int(np.ceil(1.6448536 * 5 * 2))
+
+
+def test_compute_forecast_ignores_unknown_medicines():
+    demand = np.array([(1, 29, 3), (7, 29, 100)], dtype=np.int64)
+    forecast = compute_forecast(np.array([1]), demand, 30, SETTINGS)
+
+    assert forecast.moving_average.tolist() == [0.3]
+
+
+def test_load_daily_demand_skips_cancelled_orders_and_other_branches(db):
+    db.add(Branch(id=2, code="B2", name="Second", is_active=True))
+    db.commit()
+    sell(db, 1, 1, 4, days=1)
+    sell(db, 2, 1, 9, days=1)
+    for status, quantity in ((OrderStatus.PENDING, 2), (OrderStatus.CANCELLED, 50)):
+        order = Order(
+            customer_id=2, branch_id=1, order_number=f"O-{status.value}", status=status, total_amount=quantity,
+            shipping_address="x", created_at=days_ago(2),
+        )
+        db.add(order)
+        db.flush()
+        db.add(OrderItem(
+            order_id=order.id, medicine_id=1, quantity=quantity, unit_price=1, total_price=quantity,
+            created_at=days_ago(2),
+        ))
+    db.commit()
+    start, end = history_bounds(30)
+
+    assert sorted(load_daily_demand(db, start, end, branch_id=1).tolist()) == [[1, 28, 2], [1, 29, 4]]
+    assert sorted(load_daily_demand(db, start, end).tolist()) == [[1, 28, 2], [1, 29, 13]]
+
+
+def test_get_forecast(client, db):
+    for days in range(1, 31):
+        sell(db, 1, 1, 20, days=days)
+
+    response = client.get("/api/v1/forecasts/", params={"history_days": 30, "window_days": 10, "needs_reorder": True})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["window_days"] == 10
+    assert [item["medicine_id"] for item in body["items"]] == [1]
+    assert body["items"][0]["moving_average"] == 20.0
+    assert body["items"][0]["reorder_point"] >= 80
+
+
+def test_get_forecast_requires_pharmacist(client, login):
+    login(2)
+
+    assert client.get("/api/v1/forecasts/").status_code == 403
+
+
+def test_apply_forecast_sets_levels_in_the_branch_only(client, db):
+    db.add(Branch(id=2, code="B2", name="Second", is_active=True))
+    db.add_all([BranchStock(branch_id=2, medicine_id=medicine_id, stock=0) for medicine_id in (1, 2)])
+    db.commit()
+    for days in range(1, 31):
+        sell(db, 2, 1, 5, days=days)
+
+    response = client.post("/api/v1/forecasts/apply", params={"branch_id": 2, "history_days": 30})
+
+    assert response.status_code == 200
+    assert response.json() == {"updated": 1, "skipped": 4}
+    levels = dict(
+        ((row.branch_id, row.medicine_id), (row.min_stock_level, row.max_stock_level))
+        for row in db.query(BranchStock).all()
+    )
+    assert levels[2, 1][0] > 10
+    assert levels[2, 2] == (None, None)
+    assert all(levels[1, medicine_id] == (None, None) for medicine_id in range(1, 6))
+    # The branch's thresholds are served there; other branches keep the medicine's
+    in_branch = client.get("/api/v1/medicines/1", params={"branch_id": 2}).json()
+    assert (in_branch["min_stock_level"], in_branch["max_stock_level"]) == levels[2, 1]
+    assert client.get("/api/v1/medicines/1").json()["min_stock_level"] == 10
+
+
+def test_apply_forecast_requires_admin(client, login, make_user):
+    login(make_user(UserRole.PHARMACIST))
+
+    assert client.post("/api/v1/forecasts/apply").status_code == 403
@@ -0,0 +1,145 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import app.services.inventory_summary as summaries
+from app.core.event_bus import InMemoryEventBus
+from app.models import BranchStock, Medicine
+from app.services.inventory import medicines_in_branch
+from app.services.inventory_summary import InventorySummary, compute_summary, inventory_summary, stock_change
+
+
+def without_time(summary: dict) -> dict:
+    summary.pop("computed_at")
+    return summary
+
+
+@pytest.fixture
+def inventory():
+    return InventorySummary(InMemoryEventBus(), max_age=300)
+
+
+@pytest.fixture
+def set_stock(db):
+    """Write a stock level directly and return its delta for the summaries"""
+    def set_stock(medicine_id: int, after: int, branch_id: int = 1) -> dict:
+        row = db.query(BranchStock).filter_by(branch_id=branch_id, medicine_id=medicine_id).one()
+        before, row.stock = row.stock, after
+        db.commit()
+        medicine = medicines_in_branch(db, branch_id).filter(Medicine.id == medicine_id).one()
+        return stock_change(medicine, branch_id, before, after)
+    return set_stock
+
+
+def test_summary_statement_groups_every_level_in_one_query():
+    sql = str(summaries.summary_statement("postgresql", 1).compile(dialect=postgresql.dialect()))
+
+    assert "GROUPING SETS" in sql
+    assert sql.count("SELECT") == 1
+
+
+def test_compute_summary(db):
+    summary = compute_summary(db, 1).to_dict()
+
+    assert summary["totals"]["medicines"] == 5
+    assert summary["totals"]["units"] == 250
+    assert summary["totals"]["value"] == 50 * (2 + 3 + 4 + 5 + 6)
+    assert [category["name"] for category in summary["by_category"]] == ["General"]
+
+
+def test_delta_applied_to_cached_summary(db, inventory, set_stock):
+    inventory.get(db, 1)
+
+    inventory.stock_changed([set_stock(1, 5), set_stock(2, 0)])
+
+    assert inventory.applied == 2
+    assert without_time(inventory.get(db, 1)) == without_time(compute_summary(db, 1).to_dict())
+    assert inventory.recomputed == 1
+
+
+def test_delta_already_in_summary_is_not_counted_twice(db, inventory, set_stock):
+    # Committed before the recompute but delivered after it
+    change = set_stock(1, 40)
+    inventory.get(db, 1)
+
+    inventory.stock_changed([change])
+
+    assert without_time(inventory.get(db, 1)) == without_time(compute_summary(db, 1).to_dict())
+    assert 1 in inventory._summaries
+
+
+def test_delta_during_recompute_is_replayed(db, inventory, set_stock, monkeypatch):
+    compute = summaries.compute_summary
+
+    def racing(session, branch_id):
+        summary = compute(session, branch_id)
+        inventory.stock_changed([set_stock(2, 30)])
+        return summary
+
+    monkeypatch.setattr(summaries, "compute_summary", racing)
+    served = inventory.get(db, 1)
+    monkeypatch.setattr(summaries, "compute_summary", compute)
+
+    assert without_time(served) == without_time(compute_summary(db, 1).to_dict())
+    assert 1 in inventory._summaries
+
+
+def test_mismatched_delta_drops_summary(db, inventory):
+    inventory.get(db, 1)
+    medicine = medicines_in_branch(db, 1).filter(Medicine.id == 3).one()
+
+    inventory.stock_changed([stock_change(medicine, 1, 7, 8)])
+
+    assert 1 not in inventory._summaries
+
+
+def test_delta_of_other_branch_keeps_summary(db, inventory):
+    inventory.get(db, 1)
+    medicine = medicines_in_branch(db, 1).filter(Medicine.id == 1).one()
+
+    inventory.stock_changed([stock_change(medicine, 2, 1, 2)])
+
+    assert 1 in inventory._summaries
+    assert inventory.applied == 0
+
+
+def test_invalidate_during_recompute_discards_result(db, inventory, monkeypatch):
+    compute = summaries.compute_summary
+
+    def racing(session, branch_id):
+        summary = compute(session, branch_id)
+        inventory.invalidate()
+        return summary
+
+    monkeypatch.setattr(summaries, "compute_summary", racing)
+    inventory.get(db, 1)
+
+    assert 1 not in inventory._summaries
+
+
+def test_served_summary_follows_writes(client, db, login):
+    def served():
+        return without_time(client.get("/api/v1/medicines/summary/").json())
+
+    def fresh():
+        db.expire_all()
+        return without_time(compute_summary(db, 1).to_dict())
+
+    assert served() == fresh()
+    applied = inventory_summary.applied
+    client.post("/api/v1/sales/", json={
+        "items": [{"medicine_id": 1, "quantity": 45, "unit_price": 2.0}, {"medicine_id": 2, "quantity": 50, "unit_price": 3.0}],
+        "payment_method": "cash",
+    })
+    assert served() == fresh()
+    assert served()["totals"]["out_of_stock"] == 1
+    assert inventory_summary.applied == applied + 2
+    client.patch("/api/v1/medicines/3/stock", json={"medicine_id": 3, "quantity": 100, "operation": "add"})
+    assert served() == fresh()
+    client.put("/api/v1/medicines/4", json={"price": 100})
+    assert served() == fresh()
+    login(2)
+    order = client.post("/api/v1/orders/", json={"items": [{"medicine_id": 5, "quantity": 3}], "shipping_address": "x"}).json()
+    login(1)
+    assert served() == fresh()
+    client.patch(f"/api/v1/orders/{order['id']}/status", json={"status": "cancelled"})
+    assert served() == fresh()
@@ -0,0 +1,186 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func
+
+from app.models import BranchStock, MedicineLot, UserRole
+from app.services.inventory import allocate_lots, reconcile_lots, restore_order_stock
+
+TODAY = date.today()
+
+
+def lots(db, medicine_id: int, branch_id: int = 1) -> dict:
+    db.expire_all()
+    return {
+        lot.lot_number: lot.quantity
+        for lot in db.query(MedicineLot).filter_by(branch_id=branch_id, medicine_id=medicine_id)
+    }
+
+
+@pytest.fixture
+def receive(client):
+    """Add units of medicine 1 to a lot through the stock endpoint"""
+    def receive(quantity: int, lot_number: str, expiry_date: date):
+        response = client.patch("/api/v1/medicines/1/stock", json={
+            "medicine_id": 1, "quantity": quantity, "operation": "add",
+            "lot_number": lot_number, "expiry_date": str(expiry_date),
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+    return receive
+
+
+@pytest.fixture
+def dated_lots(db):
+    """Medicine 1: 50 untracked units plus an expired, a soon and a later lot"""
+    db.add_all([
+        MedicineLot(branch_id=1, medicine_id=1, lot_number="EXPIRED", expiry_date=TODAY - timedelta(days=1), quantity=10),
+        MedicineLot(branch_id=1, medicine_id=1, lot_number="LATER", expiry_date=TODAY + timedelta(days=100), quantity=30),
+        MedicineLot(branch_id=1, medicine_id=1, lot_number="SOON", expiry_date=TODAY + timedelta(days=10), quantity=20),
+    ])
+    db.commit()
+
+
+def test_allocate_first_expiry_first_out(db, dated_lots):
+    allocations = allocate_lots(db, 1, {1: 25, 2: 5})
+    db.commit()
+
+    by_lot = {lot_id: (medicine_id, quantity) for lot_id, medicine_id, quantity in allocations}
+    assert sorted(by_lot.values()) == [(1, 5), (1, 20), (2, 5)]
+    assert lots(db, 1) == {"UNTRACKED": 50, "EXPIRED": 10, "SOON": 0, "LATER": 25}
+    assert lots(db, 2) == {"UNTRACKED": 45}
+
+
+def test_allocate_undated_lots_last(db, dated_lots):
+    allocate_lots(db, 1, {1: 60})
+    db.commit()
+
+    assert lots(db, 1) == {"UNTRACKED": 40, "EXPIRED": 10, "SOON": 0, "LATER": 0}
+
+
+def test_allocate_skips_expired_lots(db, dated_lots):
+    with pytest.raises(HTTPException) as raised:
+        allocate_lots(db, 1, {1: 101})
+
+    assert raised.value.status_code == 400
+    assert "Available: 100" in raised.value.detail
+
+
+def test_allocate_expired_lots_when_writing_off(db, dated_lots):
+    allocate_lots(db, 1, {1: 15}, include_expired=True)
+    db.commit()
+
+    assert lots(db, 1) == {"UNTRACKED": 50, "EXPIRED": 0, "SOON": 15, "LATER": 30}
+
+
+def test_receive_into_lots(client, db, receive):
+    assert receive(20, "SOON", TODAY + timedelta(days=10))["stock"] == 70
+    assert receive(5, "SOON", TODAY + timedelta(days=10))["stock"] == 75
+
+    response = client.patch("/api/v1/medicines/1/stock", json={
+        "medicine_id": 1, "quantity": 1, "operation": "add", "lot_number": "SOON", "expiry_date": str(TODAY),
+    })
+
+    assert response.status_code == 400
+    assert lots(db, 1) == {"UNTRACKED": 50, "SOON": 25}
+
+
+def test_lots_listed_in_sale_order(client, receive):
+    receive(30, "LATER", TODAY + timedelta(days=100))
+    receive(20, "SOON", TODAY + timedelta(days=10))
+
+    response = client.get("/api/v1/medicines/1/lots")
+
+    assert [lot["lot_number"] for lot in response.json()] == ["SOON", "LATER", "UNTRACKED"]
+
+
+def test_sale_rejected_when_only_expired_units_remain(client, db, receive):
+    receive(10, "EXPIRED", TODAY - timedelta(days=1))
+
+    response = client.post("/api/v1/sales/", json={
+        "items": [{"medicine_id": 1, "quantity": 55, "unit_price": 2.0}], "payment_method": "cash",
+    })
+
+    # Stock 60 covers it, but 10 of those units are expired
+    assert response.status_code == 400
+    assert lots(db, 1) == {"UNTRACKED": 50, "EXPIRED": 10}
+    assert client.get("/api/v1/medicines/1").json()["stock"] == 60
+
+
+def test_subtract_writes_off_expired_lots_first(client, db, receive):
+    receive(10, "EXPIRED", TODAY - timedelta(days=1))
+
+    response = client.patch("/api/v1/medicines/1/stock", json={"medicine_id": 1, "quantity": 15, "operation": "subtract"})
+
+    assert response.json()["stock"] == 45
+    assert lots(db, 1) == {"UNTRACKED": 45, "EXPIRED": 0}
+
+
+def test_cancelled_order_restores_its_lots(client, db, login, receive):
+    receive(20, "SOON", TODAY + timedelta(days=10))
+    receive(30, "LATER", TODAY + timedelta(days=100))
+    login(2)
+    order = client.post("/api/v1/orders/", json={
+        "items": [{"medicine_id": 1, "quantity": 40}, {"medicine_id": 1, "quantity": 5}, {"medicine_id": 2, "quantity": 3}],
+        "shipping_address": "x",
+    }).json()
+    assert lots(db, 1) == {"UNTRACKED": 50, "SOON": 0, "LATER": 5}
+    # Units taken since then come from other lots and stay taken
+    login(1)
+    client.post("/api/v1/sales/", json={"items": [{"medicine_id": 1, "quantity": 10, "unit_price": 2.0}], "payment_method": "cash"})
+    assert lots(db, 1) == {"UNTRACKED": 45, "SOON": 0, "LATER": 0}
+
+    response = client.patch(f"/api/v1/orders/{order['id']}/status", json={"status": "cancelled"})
+
+    assert response.status_code == 200
+    assert lots(db, 1) == {"UNTRACKED": 45, "SOON": 20, "LATER": 25}
+    assert lots(db, 2) == {"UNTRACKED": 50}
+    assert client.get("/api/v1/medicines/1").json()["stock"] == 90
+
+
+def test_branch_stock_matches_lots(client, db, login, receive):
+    receive(20, "SOON", TODAY + timedelta(days=10))
+    client.post("/api/v1/sales/", json={"items": [{"medicine_id": 1, "quantity": 25, "unit_price": 2.0}], "payment_method": "cash"})
+    client.put("/api/v1/medicines/3", json={"stock": 20})
+    created = client.post("/api/v1/medicines/", json={"name": "New", "price": 1, "stock": 7, "category": "General", "manufacturer": "Acme"})
+    login(2)
+    order = client.post("/api/v1/orders/", json={"items": [{"medicine_id": 1, "quantity": 30}], "shipping_address": "x"}).json()
+    login(1)
+    client.patch(f"/api/v1/orders/{order['id']}/status", json={"status": "cancelled"})
+
+    assert lots(db, created.json()["id"]) == {"UNTRACKED": 7}
+    for row in db.query(BranchStock):
+        total = db.query(func.sum(MedicineLot.quantity)).filter_by(branch_id=row.branch_id, medicine_id=row.medicine_id).scalar()
+        assert row.stock == total, row.medicine_id
+    assert reconcile_lots(db) == 0
+
+
+def test_restore_order_stock_returns_restocks(client, db, login):
+    login(2)
+    order = client.post("/api/v1/orders/", json={
+        "items": [{"medicine_id": 1, "quantity": 4}, {"medicine_id": 1, "quantity": 1}, {"medicine_id": 3, "quantity": 2}],
+        "shipping_address": "x",
+    }).json()
+
+    restocks = restore_order_stock(db, [order["id"]], user_id=1)
+    db.commit()
+
+    assert sorted(restocks) == [(order["id"], 1, 1, 5, 50), (order["id"], 1, 3, 2, 50)]
+    assert lots(db, 1) == {"UNTRACKED": 50}
+    assert restore_order_stock(db, []) == []
+
+
+def test_restore_order_stock_reports_running_levels(client, db, login, make_user):
+    orders = []
+    for user, items in ((2, [(1, 4)]), (make_user(UserRole.CUSTOMER), [(1, 6), (3, 2)])):
+        login(user)
+        orders.append(client.post("/api/v1/orders/", json={
+            "items": [{"medicine_id": medicine_id, "quantity": quantity} for medicine_id, quantity in items],
+            "shipping_address": "x",
+        }).json()["id"])
+
+    restocks = restore_order_stock(db, orders, user_id=1)
+    db.commit()
+
+    assert restocks == [(orders[0], 1, 1, 4, 44), (orders[1], 1, 1, 6, 50), (orders[1], 1, 3, 2, 50)]
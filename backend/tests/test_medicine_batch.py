@@ -0,0 +1,66 @@
+from sqlalchemy import event
+
+from app.schemas.medicine import MEDICINE_BATCH_MAX_IDS
+
+
+def test_batch_in_request_order_with_missing_ids(client):
+    response = client.get("/api/v1/medicines/batch", params={"ids": [3, 1, 99, 3, 98]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [medicine["id"] for medicine in body["items"]] == [3, 1]
+    assert body["items"][0]["stock"] == 50
+    assert body["missing"] == [99, 98]
+
+
+def test_batch_by_post(client):
+    response = client.post("/api/v1/medicines/batch", json={"ids": [2, 4, 98, 1]})
+
+    assert response.status_code == 200
+    assert [medicine["id"] for medicine in response.json()["items"]] == [2, 4, 1]
+    assert response.json()["missing"] == [98]
+
+
+def test_batch_only_missing_ids(client):
+    response = client.post("/api/v1/medicines/batch", json={"ids": [97, 98]})
+
+    assert response.json() == {"items": [], "missing": [97, 98]}
+
+
+def test_batch_limits(client):
+    assert client.post("/api/v1/medicines/batch", json={"ids": []}).status_code == 422
+    assert client.post("/api/v1/medicines/batch", json={"ids": list(range(MEDICINE_BATCH_MAX_IDS + 1))}).status_code == 422
+    assert client.get("/api/v1/medicines/batch").status_code == 400
+    too_many = "&".join(f"ids={i}" for i in range(MEDICINE_BATCH_MAX_IDS + 1))
+    assert client.get(f"/api/v1/medicines/batch?{too_many}").status_code == 400
+
+
+def test_batch_shares_single_medicine_cache(client, engine):
+    client.get("/api/v1/medicines/2")
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    client.post("/api/v1/medicines/batch", json={"ids": [2, 1, 99]})
+
+    # Medicine 2 came from the cache; 1 and 99 from one query
+    assert len([sql for sql in statements if "medicines.id IN" in sql]) == 1
+    assert client.get("/api/v1/medicines/1").headers.get("X-Cache") == "HIT"
+
+
+def test_batch_sees_stock_changes(client):
+    client.post("/api/v1/medicines/batch", json={"ids": [2, 1]})
+
+    client.patch("/api/v1/medicines/2/stock", json={"medicine_id": 2, "quantity": 5, "operation": "add"})
+
+    items = client.post("/api/v1/medicines/batch", json={"ids": [2, 1]}).json()["items"]
+    assert [(medicine["id"], medicine["stock"]) for medicine in items] == [(2, 55), (1, 50)]
+
+
+def test_batch_uses_branch_stock(client):
+    client.post("/api/v1/branches/", json={"code": "B2", "name": "Second"})
+    client.patch("/api/v1/medicines/1/stock", params={"branch_id": 2}, json={"medicine_id": 1, "quantity": 7, "operation": "add"})
+
+    items = client.get("/api/v1/medicines/batch", params={"ids": [1, 2], "branch_id": 2}).json()["items"]
+
+    assert [(medicine["id"], medicine["stock"]) for medicine in items] == [(1, 7), (2, 0)]
+    assert client.get("/api/v1/medicines/batch", params={"ids": [1], "branch_id": 77}).status_code == 404
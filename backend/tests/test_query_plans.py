@@ -0,0 +1,22 @@
+"""
+The list filter and activity feed plan checks of check_query_plans.py.
+
+EXPLAIN needs PostgreSQL with the migrated schema, so the module only runs
+when DATABASE_URL points at one (e.g. the curtin_test database).
+"""
+
+import os
+
+import pytest
+
+if not os.environ.get("DATABASE_URL", "").startswith("postgresql"):
+    pytest.skip("query plans are checked on PostgreSQL only", allow_module_level=True)
+
+from check_query_plans import _cases, plan_indexes  # noqa: E402
+
+CASES = _cases()
+
+
+@pytest.mark.parametrize("query, expected_index", [case[1:] for case in CASES], ids=[case[0] for case in CASES])
+def test_filter_uses_its_index(query, expected_index):
+    assert expected_index in plan_indexes(query)
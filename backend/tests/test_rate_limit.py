@@ -0,0 +1,114 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app.core.rate_limit import MemoryBuckets, RateLimitMiddleware, throttled
+
+
+def limited_app(release: asyncio.Event = None, **options) -> FastAPI:
+    """An app behind the rate limiter; /slow answers once `release` is set"""
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        return {"id": item_id}
+
+    @app.get("/slow")
+    async def slow():
+        await release.wait()
+        return {}
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    options = {"user_rate": 0.01, "user_burst": 100, "routes": {}, "exempt_paths": ["/health"], **options}
+    app.add_middleware(RateLimitMiddleware, buckets=MemoryBuckets(), **options)
+    return app
+
+
+async def request(app, path: str = "/items/1") -> int:
+    """Run one GET through an ASGI app and return its status"""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "headers": [], "client": ("127.0.0.1", 1234), "server": ("localhost", 80), "scheme": "http",
+        "http_version": "1.1", "root_path": "",
+    }
+    await app(scope, receive, send)
+    return sent[0]["status"]
+
+
+def test_empty_bucket_gets_429_with_retry_after():
+    client = TestClient(limited_app(user_burst=2))
+    before = throttled.value("user")
+
+    assert [client.get("/items/1").status_code for _ in range(2)] == [200, 200]
+    response = client.get("/items/1")
+
+    assert response.status_code == 429
+    # One token at 0.01 per second
+    assert int(response.headers["retry-after"]) == 100
+    assert throttled.value("user") == before + 1
+    assert client.get("/health").status_code == 200
+
+
+def test_route_rule_limits_its_route_only():
+    client = TestClient(limited_app(routes={"GET /items/{item_id}": "0.01/1"}))
+
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/2").status_code == 429
+    assert client.get("/health").status_code == 200
+
+
+def test_in_flight_limit_gets_503():
+    async def scenario():
+        release = asyncio.Event()
+        app = limited_app(release, max_in_flight=1)
+        first = asyncio.create_task(request(app, "/slow"))
+        await asyncio.sleep(0.01)
+        second = await request(app)
+        exempt = await request(app, "/health")
+        release.set()
+        return await first, second, exempt, await request(app)
+
+    before = throttled.value("overload_in_flight")
+
+    assert asyncio.run(scenario()) == (200, 503, 200, 200)
+    assert throttled.value("overload_in_flight") == before + 1
+
+
+def test_pool_threshold_gets_503():
+    class Pool:
+        checked_out = 0
+
+        def size(self):
+            return 4
+
+        def checkedout(self):
+            return self.checked_out
+
+    pool = Pool()
+    client = TestClient(limited_app(pool=pool, pool_overflow=6, pool_threshold=0.9))
+
+    pool.checked_out = 8
+    assert client.get("/items/1").status_code == 200
+    pool.checked_out = 9
+    assert client.get("/items/1").status_code == 503
+
+
+def test_pool_without_checkout_counts_is_not_watched():
+    # SQLite's in-memory databases get a SingletonThreadPool
+    pool = create_engine("sqlite://").pool
+
+    assert RateLimitMiddleware(None, MemoryBuckets(), 1, 1, {}, [], pool=pool, pool_threshold=0.9).pool is None
+    assert TestClient(limited_app(pool=pool, pool_threshold=0.9)).get("/items/1").status_code == 200
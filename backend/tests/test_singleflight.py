@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.singleflight import SingleFlight, coalesced_requests
+
+WAITERS = 5
+
+
+class Harness:
+    """A coalesced endpoint whose first run blocks until `release` is set"""
+
+    def __init__(self, wait_timeout: float = 5, error: HTTPException = None):
+        self.flights = SingleFlight()
+        self.release = threading.Event()
+        self.running = threading.Event()
+        self.calls = 0
+        self.waiting = threading.Semaphore(0)
+        # Called by each waiter right before it waits for the shared call
+        self.flights._wait_timeout = lambda: self.waiting.release() or wait_timeout
+
+        @self.flights.coalesced(dict, scope="shared")
+        def lookup_medicine(medicine_id: int):
+            self.calls += 1
+            run = self.calls
+            if run == 1:
+                self.running.set()
+                assert self.release.wait(5)
+            if error:
+                raise error
+            return {"id": medicine_id, "run": run}
+
+        self.endpoint = lookup_medicine
+
+    def run(self, waiters: int = WAITERS, release: bool = True) -> list:
+        """Outcomes (response bodies or HTTP errors) of the leader, then each waiter"""
+        outcomes = [None] * (waiters + 1)
+
+        def call(i):
+            try:
+                outcomes[i] = self.endpoint(medicine_id=1).body
+            except HTTPException as exc:
+                outcomes[i] = exc
+
+        threads = [threading.Thread(target=call, args=(0,))]
+        threads[0].start()
+        assert self.running.wait(5)
+        threads += [threading.Thread(target=call, args=(i,)) for i in range(1, waiters + 1)]
+        for thread in threads[1:]:
+            thread.start()
+        for _ in range(waiters):
+            assert self.waiting.acquire(timeout=5)
+        if release:
+            self.release.set()
+        for thread in threads[1:]:
+            thread.join(5)
+        self.release.set()
+        threads[0].join(5)
+        return outcomes
+
+
+def test_waiters_share_one_run():
+    harness = Harness()
+    before = coalesced_requests.value("lookup_medicine")
+
+    outcomes = harness.run()
+
+    assert harness.calls == 1
+    assert outcomes == [b'{"id":1,"run":1}'] * (WAITERS + 1)
+    assert coalesced_requests.value("lookup_medicine") == before + WAITERS
+    assert harness.flights.stats()["in_flight"] == 0
+
+
+def test_http_error_raised_for_every_waiter():
+    harness = Harness(error=HTTPException(404, "Medicine not found"))
+
+    outcomes = harness.run()
+
+    assert harness.calls == 1
+    assert [(exc.status_code, exc.detail) for exc in outcomes] == [(404, "Medicine not found")] * (WAITERS + 1)
+
+
+def test_waiter_runs_endpoint_itself_after_timeout():
+    harness = Harness(wait_timeout=0.05)
+    before = coalesced_requests.value("lookup_medicine")
+
+    # The leader is still blocked when the waiter gives up
+    outcomes = harness.run(waiters=1, release=False)
+
+    assert harness.calls == 2
+    assert outcomes == [b'{"id":1,"run":1}', b'{"id":1,"run":2}']
+    assert coalesced_requests.value("lookup_medicine") == before
+
+
+def test_unknown_scope():
+    with pytest.raises(ValueError):
+        SingleFlight().coalesced(dict, scope="everyone")
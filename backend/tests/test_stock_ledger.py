@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models import Branch, StockMovement, StockSnapshot
+from app.services.stock_ledger import ledger_drift, record_movements, stock_levels, take_snapshots
+
+NOW = datetime.now(timezone.utc)
+
+
+def hours_ago(hours: float) -> datetime:
+    return NOW - timedelta(hours=hours)
+
+
+@pytest.fixture
+def history(db):
+    """Medicine 1 in the main branch: 50 opened 3h ago, -5 at 2h, +10 at 1h and -3 at 30 minutes ago.
+
+    A snapshot run follows the 2h and the 1h movements; the last one is only
+    in the tail.
+    """
+    db.query(StockMovement).update({"created_at": hours_ago(3)})
+    record_movements(db, 1, {1: -5}, "sale", created_at=hours_ago(2))
+    assert take_snapshots(db, 0) == 5
+    record_movements(db, 1, {1: 10}, "adjustment", created_at=hours_ago(1))
+    assert take_snapshots(db, 0) == 1
+    record_movements(db, 1, {1: -3}, "sale", created_at=hours_ago(0.5))
+    db.commit()
+
+
+def test_snapshots_hold_the_ledger_totals(db, history):
+    latest = dict(
+        db.query(StockSnapshot.medicine_id, StockSnapshot.stock).order_by(StockSnapshot.movement_id)
+    )
+
+    assert latest == {1: 55, 2: 50, 3: 50, 4: 50, 5: 50}
+    assert db.query(StockSnapshot).filter_by(medicine_id=1).count() == 2
+
+
+def test_stock_levels_at_a_time(db, history):
+    assert stock_levels(db, hours_ago(4)) == {}
+    # Before the first run, from the movements alone
+    assert stock_levels(db, hours_ago(2.5), [1]) == {1: 50}
+    # From the first run's snapshot
+    assert stock_levels(db, hours_ago(1.5), [1, 2]) == {1: 45, 2: 50}
+    # From the second run's snapshot
+    assert stock_levels(db, hours_ago(0.75), [1]) == {1: 55}
+    # Snapshot plus the tail after it
+    assert stock_levels(db, None, [1]) == {1: 52}
+    assert stock_levels(db) == {1: 52, 2: 50, 3: 50, 4: 50, 5: 50}
+
+
+def test_stock_levels_in_the_past_match_the_ledger(db):
+    """Levels at past times, read from snapshots and a bounded tail, equal the sums of all movements by then"""
+    db.query(StockMovement).update({"created_at": hours_ago(10)})
+    for step in range(36):
+        record_movements(db, 1, {1 + step % 3: (-1) ** step * (step + 1)}, "adjustment", created_at=hours_ago(9 - step / 4))
+        if step % 7 == 6:
+            take_snapshots(db, 0)
+    db.commit()
+
+    for at in [hours_ago(9.5 - step / 8) for step in range(76)]:
+        expected = {}
+        for medicine_id, change in db.query(StockMovement.medicine_id, StockMovement.change).filter(
+            StockMovement.created_at <= at
+        ):
+            expected[medicine_id] = expected.get(medicine_id, 0) + change
+        assert stock_levels(db, at) == expected, at
+
+
+def test_stock_levels_by_branch(db, history):
+    db.add(Branch(id=2, code="B2", name="Second", is_active=True))
+    record_movements(db, 2, {1: 7}, "adjustment", created_at=hours_ago(0.25))
+    db.commit()
+
+    assert stock_levels(db, None, [1], branch_id=1) == {1: 52}
+    assert stock_levels(db, None, [1], branch_id=2) == {1: 7}
+    assert stock_levels(db, None, [1]) == {1: 59}
+    assert take_snapshots(db, 0) == 2
+    assert stock_levels(db, None, [1], branch_id=2) == {1: 7}
+    assert stock_levels(db, hours_ago(0.4), [1], branch_id=2) == {}
+
+
+def test_take_snapshots_waits_for_recent_movements_to_settle(db, history):
+    take_snapshots(db, 0)
+    record_movements(db, 1, {2: -1}, "sale")
+    db.commit()
+
+    assert take_snapshots(db, 60) == 0
+    assert take_snapshots(db, 0) == 1
+
+
+def test_reconciled_seed_has_no_drift(db):
+    assert ledger_drift(db) == {}
+
+
+def test_writes_keep_ledger_in_step(client, db, login):
+    client.post("/api/v1/sales/", json={"items": [{"medicine_id": 1, "quantity": 5, "unit_price": 2.0}], "payment_method": "cash"})
+    client.patch("/api/v1/medicines/3/stock", json={"medicine_id": 3, "quantity": 7, "operation": "add"})
+    client.put("/api/v1/medicines/4", json={"stock": 10})
+    client.post("/api/v1/medicines/", json={"name": "New", "price": 1, "stock": 3, "category": "General", "manufacturer": "Acme"})
+    login(2)
+    order = client.post("/api/v1/orders/", json={"items": [{"medicine_id": 2, "quantity": 4}], "shipping_address": "x"}).json()
+    login(1)
+    client.patch(f"/api/v1/orders/{order['id']}/status", json={"status": "cancelled"})
+    db.expire_all()
+
+    assert ledger_drift(db) == {}
+    movements = client.get("/api/v1/stock-movements/", params={"order_id": order["id"]}).json()["items"]
+    assert [(m["medicine_id"], m["change"], m["reason"]) for m in movements] == [(2, 4, "order_cancelled"), (2, -4, "order")]
+
+
+def test_movement_pages(client):
+    first = client.get("/api/v1/stock-movements/", params={"limit": 3}).json()
+    rest = client.get("/api/v1/stock-movements/", params={"limit": 3, "cursor": first["next_cursor"]}).json()
+
+    ids = [m["id"] for m in first["items"] + rest["items"]]
+    assert len(first["items"]) == 3
+    assert first["next_cursor"] == ids[2]
+    assert ids == sorted(ids, reverse=True)
+    assert sorted(m["medicine_id"] for m in first["items"] + rest["items"]) == [1, 2, 3, 4, 5]
+    assert rest["next_cursor"] is None
+
+
+def test_levels_endpoint(client, db, history):
+    response = client.get("/api/v1/stock-movements/levels/", params={"at": hours_ago(1.5).isoformat(), "medicine_id": [1, 99]})
+
+    assert response.status_code == 200
+    assert response.json()["items"] == [{"medicine_id": 1, "stock": 45}, {"medicine_id": 99, "stock": 0}]
+
+
+def test_report(client, db, history):
+    response = client.get("/api/v1/stock-movements/report/", params={"start": hours_ago(1.5).isoformat(), "limit": 2})
+
+    assert response.status_code == 200
+    first, second = response.json()["items"]
+    assert first == {
+        "medicine_id": 1, "name": "Medicine 0", "opening": 45, "received": 10, "removed": 3, "closing": 52,
+        "by_reason": {"adjustment": 10, "sale": -3},
+    }
+    assert (second["opening"], second["closing"], second["by_reason"]) == (50, 50, {})
+
+
+def test_report_rejects_reversed_period(client):
+    response = client.get("/api/v1/stock-movements/report/", params={
+        "start": hours_ago(1).isoformat(), "end": hours_ago(2).isoformat(),
+    })
+
+    assert response.status_code == 400
+
+
+def test_ledger_requires_pharmacist(client, login):
+    login(2)
+
+    assert client.get("/api/v1/stock-movements/").status_code == 403
+    assert client.get("/api/v1/stock-movements/levels/").status_code == 403